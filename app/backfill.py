@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from app.utils.logging import get_logger
+from app.utils.logging import setup_logging
+from app.fyers.client import fyersClient
+from app.nifty_tf.archive import archive, ARCHIVE_SYMBOLS
+
+logger = get_logger("BACKFILL")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fill the local candle archive (DATA_DIR/history) from the broker")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="First session to archive, YYYY-MM-DD. Without it only the past week is topped up.")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Last session to archive, default the last complete one")
+    parser.add_argument("--names", nargs="+", choices=list(ARCHIVE_SYMBOLS), help="Archives to fill, default all")
+    parser.add_argument("--resolutions", nargs="+", choices=["1", "1D"], default=["1", "1D"])
+    parser.add_argument("--concurrency", type=int, default=4, help="History calls in flight, the gateway rate limit still applies")
+    return parser.parse_args()
+
+async def main(args):
+    # Setup logging first
+    setup_logging()
+
+    try:
+        # Initialize Fyers client
+        logger.info("Initializing Fyers client...")
+        fyers = await fyersClient.connect()
+        if fyers is None:
+            logger.error("Fyers client initialization failed")
+            return 1
+
+        if args.start is None:
+            logger.info("Topping up the archive with the past week")
+            failed = await archive.append()
+        else:
+            logger.info(f"Backfilling {args.start} to {args.end or 'the last complete session'}")
+            failed = await archive.backfill(args.start, args.end, names=args.names, resolutions=args.resolutions, concurrency=args.concurrency)
+        if failed:
+            logger.error(f"{failed} chunks failed, run again to resume")
+            return 1
+        logger.info("Archive up to date")
+    except Exception as e:
+        logger.error(f"Error in main function: {str(e)}", exc_info=True)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        exit_code = asyncio.run(main(args))
+        sys.exit(exit_code)
+    except KeyboardInterrupt:
+        logger.info("Interrupted, run again to resume")
+    except Exception as e:
+        logger.error(f"Unhandled exception: {str(e)}", exc_info=True)
+        sys.exit(1)
@@ -37,6 +37,9 @@ class FyersSettings(BaseSettings):
     FYERS_2FA: str = os.getenv("FYERS_2FA")
     FYERS_PIN: str = os.getenv("FYERS_PIN")
     FYERS_RESPONSE_TYPE: str = os.getenv("FYERS_RESPONSE_TYPE")
+    # REST gateway, 10/s and 200/min broker limits
+    FYERS_RATE_PER_SEC: float = float(os.getenv("FYERS_RATE_PER_SEC") or 3)
+    FYERS_BURST: int = int(os.getenv("FYERS_BURST") or 10)
 
     model_config = {
         "extra": "ignore"
@@ -94,6 +97,9 @@ class AppSettings(BaseSettings):
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT: str = os.getenv("LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     LOG_FILE: Optional[str] = os.getenv("LOG_FILE", None)
+
+    # Local data (instrument master, archives ...)
+    DATA_DIR: str = os.getenv("DATA_DIR", str(BASE_DIR / "data"))
     
     # Nested settings
     postgres: PostgresSettings = PostgresSettings()
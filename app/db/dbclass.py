@@ -6,6 +6,7 @@ import urllib.parse
 
 from app.utils.logging import get_logger
 from app.config import settings
+from app.utils.singleflight import singleflight
 
 class LibertyDB:
     def __init__(self):
@@ -42,14 +43,14 @@ class LibertyDB:
             self.logger.error(f"Error executing execute_query: {e}")
 
     ### Get results from the database
-    async def fetch_query(self, sql=None):
+    async def fetch_query(self, sql=None, *args):
         try:
             if sql is None:
                 return None
             self.logger.info(f"Executing fetch SQL query: {sql}")
             # Executing the SQL query 
             async with self.pool.acquire() as connection:
-                result = await connection.fetch(sql)
+                result = await connection.fetch(sql, *args)
                 return result
         except Exception as e:
             self.logger.error(f"Error executing fetch_query: {e}")
@@ -103,40 +104,35 @@ class LibertyDB:
         except Exception as e:
             self.logger.error(f"Error executing execute_query: {e}")
 
+    async def _fetch_trigger_status_row(self):
+        sql = '''
+                SELECT * FROM nifty.trigger_status
+                where date = CURRENT_DATE
+                order by ctid DESC
+                limit 1                
+            '''
+        async with self.pool.acquire() as connection:
+            return await connection.fetch(sql)
+
     async def fetch_swing_trigger_time(self,swing):
         try:
-            sql = f'''
-                    SELECT "{swing}" FROM nifty.trigger_status
-                    where date = CURRENT_DATE
-                    order by ctid DESC
-                    limit 1                
-                '''                 
-            # Executing the SQL query 
-            async with self.pool.acquire() as connection:
-                result = await connection.fetch(sql)
-                if result is not None:
-                    return str(result[0][swing])
-                else:
-                    return None
+            # SWH and SWL poll together, concurrent reads share one query of today's row
+            result = await singleflight.do(("trigger_status",), self._fetch_trigger_status_row)
+            if result is not None:
+                return str(result[0][swing])
+            else:
+                return None
         except Exception as e:
             self.logger.error(f"Error Fetching Trigger Time: {e}")            
             return None
         
     async def fetch_swing_price(self,swing):
         try:
-            sql = f'''
-                    SELECT "{swing}" FROM nifty.trigger_status
-                    where date = CURRENT_DATE
-                    order by ctid DESC
-                    limit 1                
-                '''                 
-            # Executing the SQL query 
-            async with self.pool.acquire() as connection:
-                result = await connection.fetch(sql)
-                if result is not None:
-                    return float(result[0][swing])
-                else:
-                    return None
+            result = await singleflight.do(("trigger_status",), self._fetch_trigger_status_row)
+            if result is not None:
+                return float(result[0][swing])
+            else:
+                return None
         except Exception as e:
             self.logger.error(f"Error Fetching Swing Price: {e}")
             return None
@@ -0,0 +1,81 @@
+import asyncio
+from collections import OrderedDict
+
+from app.utils.logging import get_logger
+from app.utils.metrics import metrics
+from app.db.dbclass import db
+
+class LibertyWriteBehind:
+    """
+        Persists in-memory state to Postgres off the hot path.
+        submit() only queues the statement, a background task runs them one at a time in order.
+        Writes are keyed: a newer write for a key that hasn't gone out yet replaces the queued one
+        (it goes to the back of the queue), so only the latest state is written.
+        A failed write is retried at the front of the queue a few times, unless a newer write
+        for the same key has been queued meanwhile.
+        flush() waits until everything queued so far is written, call it before db.close().
+    """
+    def __init__(self, db):
+        self.logger = get_logger("WriteBehind")
+        self.db = db
+        self.max_attempts = 3
+        self._pending = OrderedDict() # key -> (sql, args, attempts)
+        self._loop = None
+        self._worker = None
+        self._wakeup = None
+        self._idle = None
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    def submit(self, key, sql, *args):
+        """Queue sql (with $n args) for key. Call from the event loop."""
+        self._start()
+        if self._pending.pop(key, None) is not None:
+            metrics.incr("write_behind.coalesced")
+        self._pending[key] = (sql, args, 0)
+        self._idle.clear()
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key, (sql, args, attempts) = self._pending.popitem(last=False)
+            result = await self.db.execute_query(sql, *args) # None on error
+            if result is not None:
+                metrics.incr("write_behind.written")
+                continue
+            attempts += 1
+            if key in self._pending:
+                continue # Newer state already queued
+            if attempts < self.max_attempts:
+                self._pending[key] = (sql, args, attempts)
+                self._pending.move_to_end(key, last=False)
+                await asyncio.sleep(attempts)
+            else:
+                metrics.incr("write_behind.failed")
+                self.logger.error(f"_run(): Giving up on write for {key} after {attempts} attempts")
+
+    async def flush(self, timeout=10):
+        """Wait for queued writes to land, False if they didn't within timeout"""
+        if self._worker is None or self._worker.done():
+            return not self._pending
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.logger.error(f"flush(): {len(self._pending)} writes still pending after {timeout}s")
+            return False
+
+
+write_behind = LibertyWriteBehind(db)
@@ -10,6 +10,7 @@ from app.nifty_tf.strategy_main import LibertyFlow
 from app.nifty_tf.range import LibertyRange
 from app.slack import slack
 from app.fyers.oms.nifty_tf_oms import Nifty_OMS
+from app.fyers.order_stream import order_stream
 
 
 logger = get_logger("EXIT POSITION MAIN")
@@ -36,6 +37,9 @@ async def main():
             logger.error("Fyers client initialization failed")
             return 1
         
+        # Fills come off the order stream while the exits are chased
+        order_stream.start()
+
         # Initializing & Running Strategy
         place_order = Nifty_OMS(db, fyers)
         await place_order.exit_position()
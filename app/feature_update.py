@@ -0,0 +1,89 @@
+import asyncio
+import sys
+import signal
+import os
+
+from app.utils.logging import get_logger
+from app.utils.logging import setup_logging
+from app.utils.calendar import trading_calendar
+from app.db.dbclass import db
+from app.fyers.client import fyersClient
+from app.config import settings
+from app.slack import slack
+from app.nifty_tf.session_features import session_features
+from app.nifty_tf.archive import archive
+
+logger = get_logger("FEATURE_UPDATE")
+
+async def shutdown(signal_name=None):
+    """Cancel the job on SIGINT/SIGTERM, main() closes the DB pool on its way out"""
+    logger.info(f"Received {signal_name}, shutting down")
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+
+async def main():
+    # Setup logging first
+    setup_logging()
+    logger.info("Updating session features for tomorrow's triggers")
+
+    try:
+        if not trading_calendar.is_trading_day():
+            logger.info("Today is a holiday. No session to compute features from.")
+            return 0
+        # Initialize database connection
+        logger.info("Connecting to database...")
+        await db.connect()
+        logger.info("Database connection established")
+
+        # Initialize Fyers client
+        logger.info("Initializing Fyers client...")
+        fyers = await fyersClient.connect()
+        if fyers is not None:
+            logger.info("Fyers client initialized")
+        else:
+            logger.error("Fyers client initialization failed")
+            return 1
+
+        # Today's bars into the local archive first, the features are then read from disk
+        failed_chunks = await archive.append()
+        if failed_chunks:
+            await slack.send_message(f"Archive append: {failed_chunks} chunks failed, run app.backfill to retry")
+
+        failed = []
+        for symbol in (settings.trade.NIFTY_SYMBOL, settings.trade.BANKNIFTY_SYMBOL):
+            features = await session_features.compute(symbol)
+            if features is None:
+                failed.append(symbol)
+                continue
+            await session_features.store(symbol, features)
+            logger.info(f"Stored features for {symbol}: {features}")
+        if failed:
+            await slack.send_message(f"Feature update failed for {', '.join(failed)}, triggers will fetch previous day candles at the open")
+            return 1
+        await slack.send_message("Updated session features")
+    except Exception as e:
+        logger.error(f"Error in main function: {str(e)}", exc_info=True)
+        return 1
+    finally:
+        if getattr(db, "pool", None) is not None:
+            await db.close()
+
+    return 0 
+
+if __name__ == "__main__":
+    # Set up signal handlers
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda s, f: asyncio.create_task(shutdown(signal.Signals(s).name)))
+    
+    try:
+        exit_code = asyncio.run(main())
+        sys.exit(exit_code)
+    except KeyboardInterrupt:
+        logger.info("Application interrupted by user")
+    except asyncio.CancelledError:
+        logger.info("Feature update cancelled")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Unhandled exception: {str(e)}", exc_info=True)
+        sys.exit(1)
\ No newline at end of file
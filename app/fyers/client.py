@@ -3,11 +3,12 @@ import functools
 import os
 from dotenv import set_key, find_dotenv
 from datetime import datetime
-import pandas as pd
 
 from app.config import settings
 from app.utils.logging import get_logger
 from app.db.dbclass import db
+from app.fyers.gateway import fyers_gateway
+from app.fyers.instruments import instruments
 
 from fyers_apiv3 import fyersModel
 
@@ -26,8 +27,9 @@ class FyersClient:
             self.fyers = fyersModel.FyersModel(
                 client_id=self.client_id,
                 token=self.access_token)
+            fyers_gateway.bind(self.fyers)
             logger.info("connect():Fyers client initialized successfully")
-            if await self._validate_token() and await self._update_nifty_symbol() and await self._update_banknifty_symbol():
+            if await self._validate_token() and await instruments.refresh() and await self._update_nifty_symbol() and await self._update_banknifty_symbol():
                 return self.fyers
             else:
                 return None
@@ -37,7 +39,7 @@ class FyersClient:
     async def _validate_token(self) -> bool:
         try:
             # Use get_profile API to validate token
-            response = await self._run_sync(self.fyers.get_profile)
+            response = await fyers_gateway.get_profile()
             
             # Check if response is valid
             if isinstance(response, dict) and response.get("code") == 200:
@@ -61,14 +63,9 @@ class FyersClient:
     
     async def _update_nifty_symbol(self) -> bool:
         try:
-            url = 'https://public.fyers.in/sym_details/NSE_FO.csv'
-            df = pd.read_csv(url, header=None)
-            df_filtered = df[df[9].str.startswith(f"NSE:NIFTY") & df[9].str.contains(f"FUT") & ~df[9].str.contains(f"NXT")]
-            expiry_date = datetime.strptime(f"{df_filtered.iloc[0][1].split(" ")[3]} {df_filtered.iloc[0][1].split(" ")[2]} {datetime.now().year}", "%d %b %Y").date()
-            if expiry_date != datetime.today().date():
-                symbol = str(df_filtered.iloc[0][9])
-            else:
-                symbol = str(df_filtered.iloc[1][9])
+            symbol = instruments.future("NIFTY")
+            if symbol is None:
+                raise Exception("NIFTY future not found in instrument master")
             dotenv_path = find_dotenv() 
             set_key(dotenv_path, 'NIFTY_SYMBOL', symbol)
             logger.info(f"_update_nifty_symbol(): Setting Nifty Symbol: {symbol}")
@@ -79,14 +76,9 @@ class FyersClient:
         
     async def _update_banknifty_symbol(self) -> bool:
         try:
-            url = 'https://public.fyers.in/sym_details/NSE_FO.csv'
-            df = pd.read_csv(url, header=None)
-            df_filtered = df[df[9].str.startswith(f"NSE:BANKNIFTY") & df[9].str.contains(f"FUT") & ~df[9].str.contains(f"NXT")]
-            expiry_date = datetime.strptime(f"{df_filtered.iloc[0][1].split(" ")[3]} {df_filtered.iloc[0][1].split(" ")[2]} {datetime.now().year}", "%d %b %Y").date()
-            if expiry_date != datetime.today().date():
-                symbol = str(df_filtered.iloc[0][9])
-            else:
-                symbol = str(df_filtered.iloc[1][9])
+            symbol = instruments.future("BANKNIFTY")
+            if symbol is None:
+                raise Exception("BANKNIFTY future not found in instrument master")
             dotenv_path = find_dotenv() 
             set_key(dotenv_path, 'BANKNIFTY_SYMBOL', symbol)
             logger.info(f"_update_banknifty_symbol(): Setting Nifty Symbol: {symbol}")
@@ -0,0 +1,186 @@
+import asyncio
+import functools
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.logging import get_logger
+from app.config import settings
+
+# Priority lanes, lower goes first
+ORDER, QUOTES, HISTORY = 0, 1, 2
+LANE_NAMES = {ORDER: "order", QUOTES: "quotes", HISTORY: "history"}
+
+# endpoint -> (lane, timeout in seconds)
+ENDPOINTS = {
+    "place_order": (ORDER, 5),
+    "modify_order": (ORDER, 5),
+    "cancel_order": (ORDER, 5),
+    "get_orders": (ORDER, 3),
+    "positions": (ORDER, 5),
+    "quotes": (QUOTES, 3),
+    "get_profile": (QUOTES, 5),
+    "history": (HISTORY, 10),
+}
+
+class CircuitOpenError(Exception):
+    """Raised without calling the broker while an endpoint's circuit is open"""
+
+class LibertyFyersGateway:
+    """
+        Every Fyers REST call goes through here instead of hitting the SDK from coroutines.
+        - The blocking SDK call runs off-loop, each lane on its own thread pool, so an order
+          never waits for a free thread behind a history poll.
+        - A token bucket keeps us under the broker rate limit. The last few tokens are reserved
+          for order traffic and queued requests are served order > quotes > history.
+        - Per endpoint timeouts. A timed out order may still reach the exchange, callers
+          check the order book like they do for any other failure.
+        - Per endpoint circuit breaker: after max_failures transport errors/timeouts in a row
+          calls fail fast with CircuitOpenError for cooldown seconds, then one call is let
+          through to probe. Broker rejections (s == "error") don't count, the API is up.
+        The SDK method names are kept: await fyers_gateway.history(data) etc.
+    """
+    def __init__(self):
+        self.logger = get_logger("FyersGateway")
+        self.fyers = None
+        self.rate = settings.fyers.FYERS_RATE_PER_SEC
+        self.burst = settings.fyers.FYERS_BURST
+        self.order_reserve = 2 # Tokens only order traffic may use
+        self.max_failures = 5
+        self.cooldown = 30
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._seq = itertools.count()
+        self._loop = None
+        self._queue = None
+        self._arrived = None
+        self._dispatcher = None
+        self._executors = {
+            ORDER: ThreadPoolExecutor(max_workers=4, thread_name_prefix="fyers-order"),
+            QUOTES: ThreadPoolExecutor(max_workers=4, thread_name_prefix="fyers-quotes"),
+            HISTORY: ThreadPoolExecutor(max_workers=2, thread_name_prefix="fyers-history"),
+        }
+        self._breakers = {} # endpoint -> {"failures": int, "opened_at": monotonic or None, "probing": bool}
+
+    def bind(self, fyers):
+        """Use this FyersModel for all calls. Called from FyersClient.connect()"""
+        self.fyers = fyers
+
+    def _start(self):
+        # asyncio.run() may be called more than once per process (scripts), rebuild per loop
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._dispatcher is not None and not self._dispatcher.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._arrived = asyncio.Event()
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    def _token_wait(self, lane):
+        """Seconds until lane may take a token, 0 if it can go now"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        available = self._tokens - (0 if lane == ORDER else self.order_reserve)
+        if available >= 1:
+            return 0
+        return (1 - available) / self.rate
+
+    async def _dispatch(self):
+        while True:
+            item = await self._queue.get()
+            lane, _, endpoint, func, future = item
+            if future.done(): # Caller gave up
+                continue
+            wait = self._token_wait(lane)
+            if wait > 0:
+                # Put it back and sleep until a token frees up or something (maybe an order) arrives
+                self._queue.put_nowait(item)
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._tokens -= 1
+            self._loop.create_task(self._execute(lane, endpoint, func, future))
+
+    async def _execute(self, lane, endpoint, func, future):
+        timeout = ENDPOINTS[endpoint][1]
+        try:
+            result = await asyncio.wait_for(
+                self._loop.run_in_executor(self._executors[lane], func),
+                timeout=timeout
+            )
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = asyncio.TimeoutError(f"{endpoint} timed out after {timeout}s")
+            self._record(endpoint, ok=False)
+            if not future.done():
+                future.set_exception(e)
+            return
+        self._record(endpoint, ok=True)
+        if not future.done():
+            future.set_result(result)
+
+    def _check_circuit(self, endpoint):
+        breaker = self._breakers.setdefault(endpoint, {"failures": 0, "opened_at": None, "probing": False})
+        if breaker["opened_at"] is None:
+            return
+        if breaker["probing"] or time.monotonic() - breaker["opened_at"] < self.cooldown:
+            raise CircuitOpenError(f"{endpoint} circuit open after {breaker['failures']} failures")
+        breaker["probing"] = True # Half open, let this one through
+
+    def _record(self, endpoint, ok):
+        breaker = self._breakers[endpoint]
+        if ok:
+            if breaker["opened_at"] is not None:
+                self.logger.info(f"_record(): {endpoint} recovered, closing circuit")
+            breaker.update(failures=0, opened_at=None, probing=False)
+            return
+        breaker["failures"] += 1
+        breaker["probing"] = False
+        if breaker["failures"] >= self.max_failures:
+            if breaker["opened_at"] is None:
+                self.logger.error(f"_record(): {endpoint} failed {breaker['failures']} times in a row, opening circuit for {self.cooldown}s")
+            breaker["opened_at"] = time.monotonic()
+
+    async def call(self, endpoint, *args, **kwargs):
+        """Queue a call to fyers.<endpoint>(*args, **kwargs) and await its response"""
+        if self.fyers is None:
+            raise RuntimeError("Fyers gateway is not bound to a client")
+        self._check_circuit(endpoint)
+        self._start()
+        lane = ENDPOINTS[endpoint][0]
+        func = functools.partial(getattr(self.fyers, endpoint), *args, **kwargs)
+        future = self._loop.create_future()
+        self._queue.put_nowait((lane, next(self._seq), endpoint, func, future))
+        self._arrived.set()
+        return await future
+
+    async def place_order(self, data):
+        return await self.call("place_order", data=data)
+
+    async def modify_order(self, data):
+        return await self.call("modify_order", data=data)
+
+    async def cancel_order(self, data):
+        return await self.call("cancel_order", data=data)
+
+    async def get_orders(self, data):
+        return await self.call("get_orders", data=data)
+
+    async def positions(self):
+        return await self.call("positions")
+
+    async def quotes(self, data):
+        return await self.call("quotes", data=data)
+
+    async def get_profile(self):
+        return await self.call("get_profile")
+
+    async def history(self, data):
+        return await self.call("history", data=data)
+
+
+fyers_gateway = LibertyFyersGateway()
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from app.utils.logging import get_logger
+from app.config import settings
+
+MASTER_URL = 'https://public.fyers.in/sym_details/NSE_FO.csv'
+
+# NSE_FO.csv column -> (array name, dtype)
+COLUMNS = {
+    9: ("ticker", "S"),
+    13: ("underlying", "S"),
+    8: ("expiry", np.int64),
+    15: ("strike", np.float64),
+    16: ("option_type", "S"), # CE/PE, XX for futures
+}
+
+class LibertyInstruments:
+    """
+        NSE F&O instrument master.
+        NSE_FO.csv is downloaded once a day and stored as one .npy file per column under
+        DATA_DIR/instruments/<date>/. Every process then loads those memory-mapped and builds
+        dict indexes once, so resolving a contract is a dict lookup instead of a CSV download + scan.
+        - option(underlying, strike, "CE"/"PE") -> ticker for the nearest non-expiring expiry
+        - future(underlying) -> ticker of the nearest non-expiring future
+        "Non-expiring" keeps the old behaviour of skipping a contract on its expiry day.
+    """
+    def __init__(self):
+        self.logger = get_logger("Instruments")
+        self._lock = threading.Lock()
+        self.root = Path(settings.DATA_DIR) / "instruments"
+        self._session = None
+        self._arrays = {}
+        self._options = {} # (underlying, expiry, strike, option_type) -> row
+        self._futures = {} # (underlying, expiry) -> row
+        self._expiries = {} # (underlying, "OPT"/"FUT") -> sorted expiries
+        self._nearest = {} # (underlying, "OPT"/"FUT") -> nearest non-expiring expiry
+
+    async def refresh(self):
+        """Make sure today's master is on disk and loaded, off the event loop"""
+        try:
+            await asyncio.to_thread(self.load)
+            return True
+        except Exception as e:
+            self.logger.error(f"refresh(): Error loading instrument master: {e}", exc_info=True)
+            return False
+
+    def load(self):
+        today = datetime.now().date()
+        with self._lock:
+            if self._session == today:
+                return
+            path = self.root / today.isoformat()
+            if not (path / "ticker.npy").exists():
+                try:
+                    self._download(path)
+                except Exception as e:
+                    path = self._latest()
+                    if path is None:
+                        raise
+                    self.logger.error(f"load(): Download failed ({e}), using stale master from {path.name}")
+            self._arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name, _ in COLUMNS.values()}
+            self._index()
+            self._session = today
+            self.logger.info(f"load(): Loaded {len(self._arrays['ticker'])} instruments from {path}")
+
+    def _download(self, path):
+        self.logger.info(f"_download(): Downloading instrument master to {path}")
+        df = pd.read_csv(MASTER_URL, header=None, usecols=list(COLUMNS))
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        tmp.mkdir(parents=True, exist_ok=True)
+        for column, (name, dtype) in COLUMNS.items():
+            values = df[column]
+            if dtype == "S":
+                values = values.fillna("").astype(str).str.encode("ascii")
+            else:
+                values = values.fillna(0)
+            np.save(tmp / f"{name}.npy", values.to_numpy().astype(dtype))
+        try:
+            tmp.rename(path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True) # Another process got there first
+        # Only the latest copy is ever needed
+        for old in self.root.iterdir():
+            if old.name < path.name and ".tmp" not in old.name:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def _latest(self):
+        if not self.root.exists():
+            return None
+        copies = sorted(p for p in self.root.iterdir() if (p / "ticker.npy").exists())
+        return copies[-1] if copies else None
+
+    def _index(self):
+        options, futures, expiries = {}, {}, {}
+        underlyings = self._arrays["underlying"].tolist()
+        expiry = self._arrays["expiry"].tolist()
+        strike = self._arrays["strike"].tolist()
+        option_type = self._arrays["option_type"].tolist()
+        for row, underlying in enumerate(underlyings):
+            underlying = underlying.decode()
+            opt = option_type[row].decode()
+            if opt in ("CE", "PE"):
+                options[(underlying, expiry[row], strike[row], opt)] = row
+                expiries.setdefault((underlying, "OPT"), set()).add(expiry[row])
+            else:
+                futures[(underlying, expiry[row])] = row
+                expiries.setdefault((underlying, "FUT"), set()).add(expiry[row])
+        self._options = options
+        self._futures = futures
+        self._expiries = {key: sorted(values) for key, values in expiries.items()}
+        self._nearest = {}
+
+    def _ensure_loaded(self):
+        if self._session != datetime.now().date():
+            self.load()
+
+    def expiries(self, underlying, kind="OPT"):
+        """Sorted expiry epochs of underlying's options (OPT) or futures (FUT)"""
+        self._ensure_loaded()
+        return self._expiries.get((underlying, kind), [])
+
+    def nearest_expiry(self, underlying, kind="OPT"):
+        """Nearest expiry epoch that isn't today, None if there is none"""
+        key = (underlying, kind)
+        if key in self._nearest and self._session == datetime.now().date():
+            return self._nearest[key]
+        today = datetime.now().date()
+        nearest = None
+        for expiry in self.expiries(underlying, kind):
+            if datetime.fromtimestamp(expiry).date() > today:
+                nearest = expiry
+                break
+        self._nearest[key] = nearest
+        return nearest
+
+    def ticker(self, row):
+        return self._arrays["ticker"][row].decode()
+
+    def option(self, underlying, strike, option_type, expiry=None):
+        """Ticker of the underlying's strike CE/PE, nearest non-expiring expiry unless expiry is given"""
+        if expiry is None:
+            expiry = self.nearest_expiry(underlying, "OPT")
+        row = self._options.get((underlying, expiry, float(strike), option_type))
+        return None if row is None else self.ticker(row)
+
+    def future(self, underlying, expiry=None):
+        """Ticker of the underlying's nearest non-expiring future unless expiry is given"""
+        if expiry is None:
+            expiry = self.nearest_expiry(underlying, "FUT")
+        row = self._futures.get((underlying, expiry))
+        return None if row is None else self.ticker(row)
+
+
+instruments = LibertyInstruments()
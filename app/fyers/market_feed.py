@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+from app.utils.logging import get_logger
+from app.config import settings
+from fyers_apiv3.FyersWebsocket import data_ws
+
+class LibertyMarketFeed:
+    """
+        Process wide market data hub.
+        Owns a single FyersDataSocket (on its own thread) and reference counts SymbolUpdate
+        subscriptions per symbol, so NIFTY, BANKNIFTY, breakout, SL and candles all share one feed.
+        Two kinds of consumers:
+        - subscribe(): bounded asyncio queue per consumer, filled on the event loop. When a
+          consumer falls behind the oldest tick is dropped (latest price is what matters).
+        - add_listener(): plain callback run on the socket thread for every tick. Must be quick,
+          it holds up every other consumer.
+    """
+    def __init__(self):
+        self.logger = get_logger("MarketFeed")
+        self.access_token = settings.fyers.FYERS_ACCESS_TOKEN
+        self._lock = threading.Lock()
+        self._ws = None
+        self._thread = None
+        self._connected = False
+        self._loop = None
+        self._refcount = {} # symbol -> number of listeners + queues
+        self._listeners = {} # symbol -> list of callbacks
+        self._queues = {} # symbol -> list of asyncio.Queue
+        self.dropped = 0 # Ticks dropped from full queues
+
+    def start(self):
+        """Connect the shared socket, only the first call does anything"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.logger.info("start(): Market feed thread started")
+
+    def _run(self):
+        self._ws = data_ws.FyersDataSocket(
+            access_token=self.access_token,
+            log_path="",
+            litemode=False,
+            write_to_file=False,
+            reconnect=True,
+            on_connect=self._on_connect,
+            on_message=self._on_message,
+            on_error=self._on_error,
+            on_close=self._on_close,
+            reconnect_retry=10
+        )
+        self._ws.connect() # blocks until closed
+
+    def _on_connect(self):
+        # Also called on reconnect, so (re)subscribe everything that's currently wanted
+        with self._lock:
+            self._connected = True
+            symbols = list(self._refcount)
+        self.logger.info(f"Market feed connected—subscribing {symbols}")
+        if symbols:
+            self._ws.subscribe(symbols=symbols, data_type="SymbolUpdate")
+        self._ws.keep_running()
+
+    def is_connected(self):
+        with self._lock:
+            return self._connected
+
+    def _on_error(self, err):
+        self.logger.error(f"Market feed error: {err}")
+
+    def _on_close(self, msg):
+        with self._lock:
+            self._connected = False
+        self.logger.info(f"Market feed closed: {msg}")
+
+    def _on_message(self, msg):
+        if not isinstance(msg, dict) or msg.get("type") != "sf":
+            return
+        msg["received_at"] = time.monotonic() # Start of the trade latency timeline
+        symbol = msg.get("symbol")
+        with self._lock:
+            listeners = list(self._listeners.get(symbol, ()))
+            queues = list(self._queues.get(symbol, ()))
+        for callback in listeners:
+            try:
+                callback(msg)
+            except Exception as e:
+                self.logger.error(f"_on_message(): Listener {callback} failed for {symbol}: {e}", exc_info=True)
+        if queues and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._fan_out, queues, msg)
+
+    def _fan_out(self, queues, msg):
+        """Runs on the loop"""
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(msg)
+
+    def _acquire(self, symbol):
+        with self._lock:
+            self._refcount[symbol] = self._refcount.get(symbol, 0) + 1
+            subscribe = self._refcount[symbol] == 1 and self._connected
+        if subscribe:
+            self.logger.info(f"_acquire(): Subscribing {symbol}")
+            self._ws.subscribe(symbols=[symbol], data_type="SymbolUpdate")
+        self.start()
+
+    def _release(self, symbol):
+        with self._lock:
+            count = self._refcount.get(symbol, 0) - 1
+            if count > 0:
+                self._refcount[symbol] = count
+                return
+            self._refcount.pop(symbol, None)
+            unsubscribe = self._connected
+        if unsubscribe:
+            self.logger.info(f"_release(): Unsubscribing {symbol}")
+            try:
+                self._ws.unsubscribe(symbols=[symbol], data_type="SymbolUpdate")
+            except Exception as e:
+                self.logger.error(f"_release(): Error unsubscribing {symbol}: {e}")
+
+    def add_listener(self, symbol, callback):
+        """Run callback(msg) on the socket thread for every tick of symbol"""
+        with self._lock:
+            self._listeners.setdefault(symbol, []).append(callback)
+        self._acquire(symbol)
+
+    def remove_listener(self, symbol, callback):
+        with self._lock:
+            listeners = self._listeners.get(symbol, [])
+            if callback not in listeners:
+                return
+            listeners.remove(callback)
+        self._release(symbol)
+
+    def subscribe(self, symbol, maxsize=1000):
+        """Bounded queue receiving every tick of symbol. Call from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=maxsize)
+        with self._lock:
+            self._queues.setdefault(symbol, []).append(queue)
+        self._acquire(symbol)
+        return queue
+
+    def unsubscribe(self, symbol, queue):
+        with self._lock:
+            queues = self._queues.get(symbol, [])
+            if queue not in queues:
+                return
+            queues.remove(queue)
+        self._release(symbol)
+
+
+market_feed = LibertyMarketFeed()
@@ -0,0 +1,283 @@
+import math
+import time
+import asyncio
+from typing import Optional, List
+from pydantic import BaseModel
+
+from app.utils.logging import get_logger
+from app.utils.metrics import metrics
+from app.config import settings
+from app.nifty_tf.market_data import LibertyMarketData
+from app.fyers.gateway import fyers_gateway
+from app.fyers.market_feed import market_feed
+from app.fyers.option_chain import option_chain
+from app.fyers.order_stream import order_stream, FINAL_STATUSES, FILLED, CANCELLED
+
+# How each strategy chases its limit order.
+# pct: limit is touch ± touch * pct * step (step 1 for the first order, +1 per reprice)
+# first_wait / step_wait: seconds to give the first order / every reprice before moving it again
+# reprices: limit reprices before converting to market, market_wait: seconds given to the market order
+# The order is also repriced straight away whenever the touch moves through our limit.
+CHASE_SCHEDULES = {
+    "nifty_entry": {"pct": 0.005, "first_wait": 3.5, "reprices": 5, "step_wait": 5, "market_wait": 2, "tag": "NiftyTF"},
+    "banknifty_entry": {"pct": 0.005, "first_wait": 3.5, "reprices": 5, "step_wait": 5, "market_wait": 2, "tag": "BankNiftyTF"},
+    "exit": {"pct": 0.005, "first_wait": 3.5, "reprices": 5, "step_wait": 5, "market_wait": 2, "tag": "NiftyTF"},
+    "exit_all": {"pct": 0.005, "first_wait": 1.5, "reprices": 5, "step_wait": 5, "market_wait": 2, "tag": "NiftyTF"},
+}
+CANCEL_WAIT = 3 # Seconds we give the broker to confirm a cancel
+
+class FillReport(BaseModel):
+    schedule: str
+    symbol: str
+    side: int
+    qty: int
+    order_id: Optional[str] = None
+    status: str = "failed" # filled / unfilled (we cancelled it) / rejected / open (cancel not confirmed) / failed (order never placed)
+    reference_price: Optional[float] = None # Touch when we started (ask for Buy, bid for Sell)
+    limit_prices: List[float] = []
+    reprices: int = 0
+    market: bool = False # Went to market
+    fill_price: Optional[float] = None
+    filled_qty: int = 0 # Of a cancelled order, what filled before the cancel
+    slippage: Optional[float] = None # Against reference_price, positive is worse for us
+    time_to_fill: Optional[float] = None # Seconds from placing to fill
+    response: Optional[dict] = None # place_order response
+
+    @property
+    def filled(self):
+        return self.status == "filled"
+
+    @property
+    def caution(self):
+        """What to check before acting by hand on an order that didn't fill"""
+        if self.status == "open":
+            return f"Order {self.order_id} couldn't be confirmed cancelled and may still fill, check the order book first."
+        if self.filled_qty:
+            return f"Order {self.order_id} was cancelled with {self.filled_qty}/{self.qty} filled, check the position first."
+        return ""
+
+class LibertyExecution:
+    """
+        Limit chase for every order the OMS sends.
+        Places a limit just through the touch, then listens to the symbol's ticks on the market feed
+        and its updates on the order stream together: a fill or reject ends the chase at once, the
+        touch moving through our limit reprices at once, otherwise the limit is moved when the
+        schedule's wait runs out. After the last reprice the order goes to market, and if even that
+        isn't final in time it is cancelled and the cancel confirmed before we call it unfilled.
+        Returns a FillReport, time to fill and slippage also go to metrics per schedule.
+    """
+    def __init__(self, db, fyers):
+        self.logger = get_logger("Execution")
+        self.LibertyMarketData = LibertyMarketData(db, fyers)
+        self.buy_side = settings.trade.BUY_TYPE
+        self.product_type = settings.trade.NIFTY_PRODUCT_TYPE
+        self.limit_type = settings.trade.LIMIT_TYPE
+        self.market_type = settings.trade.MARKET_TYPE
+
+    @staticmethod
+    def round_to_nearest_half(value):
+        return math.ceil(value * 2) / 2
+
+    def _limit(self, side, touch, pct, step):
+        if side == self.buy_side:
+            return self.round_to_nearest_half(touch + touch * pct * step)
+        return self.round_to_nearest_half(touch - touch * pct * step)
+
+    def _ran_away(self, side, touch, limit):
+        """Touch has moved through our limit, resting there won't fill"""
+        return touch > limit if side == self.buy_side else touch < limit
+
+    async def _touch(self, side, symbol):
+        """Ask for Buy, bid for Sell, from the option chain if it's watching symbol, else quotes"""
+        quote = option_chain.top(symbol) or await self.LibertyMarketData.fetch_quick_quote(symbol)
+        return quote.get('ask') if side == self.buy_side else quote.get('bid')
+
+    async def _order_status(self, order_id):
+        """Latest status from the order stream, REST if the stream hasn't seen the order"""
+        order = order_stream.order(order_id) if order_stream.is_connected() else None
+        if order is not None:
+            return order.get("status")
+        return await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
+
+    async def _final_status(self, order_id, timeout):
+        """Final status of order_id off the order stream, None if it isn't final within timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while order_stream.is_connected():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            order = await order_stream.wait(order_id, remaining)
+            if order is not None and order.get("status") in FINAL_STATUSES:
+                return order.get("status")
+            # Woken by a partial fill (or timed out), keep waiting for the rest
+        await asyncio.sleep(max(0, deadline - loop.time())) # Stream down, ticks or the deadline it is
+        return None
+
+    async def _step(self, order_id, ticks, side, limit, timeout):
+        """
+            One chase step. Returns (status, touch) as soon as the order is final or the touch moves
+            through limit, at the latest after timeout. touch is the last bid/ask ticked, None if none came.
+        """
+        final = asyncio.ensure_future(self._final_status(order_id, timeout))
+        field = "ask_price" if side == self.buy_side else "bid_price"
+        touch = None
+        try:
+            while not final.done():
+                tick = asyncio.ensure_future(ticks.get())
+                done, _ = await asyncio.wait({final, tick}, return_when=asyncio.FIRST_COMPLETED)
+                if tick not in done:
+                    tick.cancel()
+                    break
+                touch = tick.result().get(field) or touch
+                if touch is not None and self._ran_away(side, touch, limit):
+                    break
+        finally:
+            status = final.result() if final.done() else None
+            final.cancel()
+        if status is None:
+            status = await self._order_status(order_id)
+        return status, touch
+
+    async def _modify(self, order_id, data):
+        """modify_order, True if the broker accepted it"""
+        try:
+            response = await fyers_gateway.modify_order(data={"id": order_id, **data})
+        except Exception as e:
+            self.logger.error(f"_modify(): Error modifying {order_id} with {data}: {e}")
+            return False
+        if response.get('s') != "ok":
+            self.logger.error(f"_modify(): Modify of {order_id} with {data} not accepted, code {response.get('code')}: {response}")
+            return False
+        return True
+
+    async def _cancel(self, order_id):
+        """Cancel order_id and wait for the broker to confirm, returns its final status, None if it isn't final"""
+        try:
+            response = await fyers_gateway.cancel_order(data={"id": order_id})
+            if response.get('s') != "ok":
+                # Usually a fill racing the cancel, the status below tells
+                self.logger.error(f"_cancel(): Cancel of {order_id} not accepted, code {response.get('code')}: {response}")
+        except Exception as e:
+            self.logger.error(f"_cancel(): Error cancelling {order_id}: {e}")
+        status = await self._final_status(order_id, CANCEL_WAIT) or await self._order_status(order_id)
+        return status if status in FINAL_STATUSES else None
+
+    async def _filled_qty(self, order_id):
+        order = order_stream.order(order_id)
+        if order is not None and order.get("status") in FINAL_STATUSES:
+            return order.get("filledQty") or 0
+        try:
+            response = await fyers_gateway.get_orders({'id': str(order_id)})
+            if response.get('code') == 200 and len(response['orderBook']) > 0:
+                return response['orderBook'][0].get('filledQty') or 0
+        except Exception as e:
+            self.logger.error(f"_filled_qty(): Error fetching filled qty for {order_id}: {e}")
+        return 0
+
+    async def _fill_price(self, order_id):
+        order = order_stream.order(order_id)
+        if order is not None and order.get("tradedPrice"):
+            return order.get("tradedPrice")
+        try:
+            response = await fyers_gateway.get_orders({'id': str(order_id)})
+            if response.get('code') == 200 and len(response['orderBook']) > 0:
+                return response['orderBook'][0].get('tradedPrice')
+        except Exception as e:
+            self.logger.error(f"_fill_price(): Error fetching traded price for {order_id}: {e}")
+        return None
+
+    async def execute(self, side, symbol, qty, schedule, quote=None, product_type=None, timeline=None):
+        """Chase a side/qty order for symbol with CHASE_SCHEDULES[schedule], returns a FillReport"""
+        plan = CHASE_SCHEDULES[schedule]
+        report = FillReport(schedule=schedule, symbol=symbol, side=side, qty=qty)
+        ticks = market_feed.subscribe(symbol)
+        try:
+            if quote is not None:
+                touch = quote['ask'] if side == self.buy_side else quote['bid']
+            else:
+                touch = await self._touch(side, symbol)
+            if touch is None:
+                raise Exception(f"No quote for {symbol}")
+            report.reference_price = touch
+            limit = self._limit(side, touch, plan['pct'], 1)
+            data = {
+                'productType': product_type or self.product_type,
+                'side': side,
+                'symbol': symbol,
+                'qty': qty,
+                'type': self.limit_type,
+                'validity': 'DAY',
+                'limitPrice': limit,
+                'orderTag': plan['tag']
+            }
+            if timeline is not None:
+                timeline.symbol = symbol
+                timeline.mark("build")
+            self.logger.info(f"execute(): {schedule} sending {data}")
+            started = time.monotonic()
+            if timeline is not None:
+                timeline.mark("submit", started)
+            response = await fyers_gateway.place_order(data)
+            report.response = response
+            if timeline is not None:
+                timeline.mark("ack")
+            if response.get('s') != "ok":
+                self.logger.error(f"execute(): {schedule} order for {symbol} not placed: {response}")
+                return report
+            report.order_id = order_id = str(response['id'])
+            if timeline is not None:
+                timeline.order_id = order_id
+            report.limit_prices.append(limit)
+
+            status, latest = await self._step(order_id, ticks, side, limit, plan['first_wait'])
+            while status not in FINAL_STATUSES and report.reprices < plan['reprices']:
+                report.reprices += 1
+                touch = latest if latest is not None else await self._touch(side, symbol)
+                new_limit = self._limit(side, touch, plan['pct'], report.reprices + 1)
+                self.logger.info(f"execute(): {schedule} {symbol} reprice {report.reprices} at {new_limit} (touch {touch})")
+                if await self._modify(order_id, {"type": self.limit_type, "limitPrice": new_limit}):
+                    limit = new_limit
+                    report.limit_prices.append(limit)
+                # Not accepted: the order still rests at limit (or went final, the step sees that)
+                status, tick_touch = await self._step(order_id, ticks, side, limit, plan['step_wait'])
+                latest = tick_touch if tick_touch is not None else latest
+
+            if status not in FINAL_STATUSES:
+                self.logger.info(f"execute(): {schedule} {symbol} going for Market Order")
+                if await self._modify(order_id, {"type": self.market_type}):
+                    report.market = True
+                    status = await self._final_status(order_id, plan['market_wait']) or await self._order_status(order_id)
+                else:
+                    status = await self._order_status(order_id)
+
+            cancelled = False
+            if status not in FINAL_STATUSES:
+                self.logger.warning(f"execute(): {schedule} {symbol} order {order_id} still not final (status {status}), cancelling")
+                cancelled = True
+                status = await self._cancel(order_id)
+
+            if status == FILLED:
+                filled_at = time.monotonic()
+                if timeline is not None:
+                    timeline.mark("fill", filled_at)
+                report.status = "filled"
+                report.time_to_fill = filled_at - started
+                report.fill_price = await self._fill_price(order_id)
+                if report.fill_price is not None:
+                    report.slippage = (report.fill_price - report.reference_price) if side == self.buy_side else (report.reference_price - report.fill_price)
+                    metrics.observe(f"execution.{schedule}.slippage", report.slippage)
+                metrics.observe(f"execution.{schedule}.time_to_fill", report.time_to_fill)
+            elif status in FINAL_STATUSES: # We cancelled it / rejected / expired
+                report.status = "unfilled" if cancelled and status == CANCELLED else "rejected"
+                report.filled_qty = await self._filled_qty(order_id)
+            else:
+                report.status = "open"
+            metrics.incr(f"execution.{schedule}.{report.status}")
+            self.logger.info(f"execute(): {schedule} {symbol} {report.status} after {report.reprices} reprices, market: {report.market}, fill: {report.fill_price}, slippage: {report.slippage}, time to fill: {report.time_to_fill}")
+            return report
+        except Exception as e:
+            self.logger.error(f"execute(): {schedule} {symbol} error: {e}", exc_info=True)
+            return report
+        finally:
+            market_feed.unsubscribe(symbol, ticks)
@@ -1,17 +1,18 @@
 import math
 from datetime import datetime
-import pandas as pd
 import asyncio
-import threading
-import time
 import os
-from dotenv import load_dotenv, set_key, find_dotenv
 
 from app.utils.logging import get_logger
 from app.nifty_tf.market_data import LibertyMarketData
 from app.config import settings
 from app.slack import slack
-from fyers_apiv3.FyersWebsocket import order_ws
+from app.fyers.gateway import fyers_gateway
+from app.fyers.instruments import instruments
+from app.fyers.option_chain import option_chain
+from app.nifty_tf.symbol_registry import symbol_registry
+from app.nifty_tf.playbook import entry_playbooks
+from app.fyers.oms.execution import LibertyExecution
 
 class Nifty_OMS:
     def __init__(self, db, fyers):
@@ -24,11 +25,11 @@ class Nifty_OMS:
         self.nifty_symbol = settings.trade.NIFTY_SYMBOL
         self.nifty_product_type = settings.trade.NIFTY_PRODUCT_TYPE
         self.max_price_pct = 0.05
-        self.limit_price_pct = 0.005
         self.buy_side = settings.trade.BUY_TYPE
         self.sell_side = settings.trade.SELL_TYPE
         self.limit_type = settings.trade.LIMIT_TYPE
         self.market_type = settings.trade.MARKET_TYPE
+        self.execution = LibertyExecution(db, fyers)
 
     @staticmethod
     def round_to_nearest_half(value):
@@ -57,7 +58,7 @@ class Nifty_OMS:
                 'type': 2,
                 'validity':'DAY'
             }
-            response = self.fyers.place_order(data)
+            response = await fyers_gateway.place_order(data)
             self.logger.info(f"Order Placed. Response:{response}\n")
         except Exception as e:
             print(f"Error: {e}")
@@ -81,227 +82,83 @@ class Nifty_OMS:
 
             else:
                 raise Exception
-            url = 'https://public.fyers.in/sym_details/NSE_FO.csv'
-            df = pd.read_csv(url, header=None)
             if side == "Buy":
                 optionType="CE"
             else:
                 optionType="PE"
-            df_filtered = df[df[9].str.startswith(f"NSE:NIFTY") & df[9].str.contains(f"{ATM}{optionType}")]
-            expiry_date = datetime.strptime(f"{df_filtered.iloc[0][1].split(" ")[3]} {df_filtered.iloc[0][1].split(" ")[2]} {datetime.now().year}", "%d %b %Y").date()
-            if expiry_date != datetime.today().date():
-                return str(df_filtered.iloc[0][9])
-            else:
-                return str(df_filtered.iloc[1][9])
+            symbol = instruments.option("NIFTY", ATM, optionType)
+            if symbol is None:
+                raise Exception(f"{ATM}{optionType} not found in instrument master")
+            return symbol
         except Exception as e:
             self.logger.error(f"get_symbol(): Error Getting Symbol for {side} {ATM}. Error: {e}")
             return None
 
-    async def place_nifty_order_new(self,side) -> str:
+    async def _order_symbol(self, side):
+        # Picked at swing formation
+        symbol = symbol_registry.get("nifty", side)
+        if symbol is None:
+            self.logger.error(f"place_nifty_order_new(): No {side} symbol in the registry")
+            return await self.get_symbol(side)
+        return symbol
+
+    async def place_nifty_order_new(self,side,ltp=None,playbook=None,timeline=None) -> str:
         # This returns symbol and order date time, both in string
         try:
-            try:
-                from app.config import settings
-                # dotenv_path = find_dotenv(filename="/mnt/LibertyFlow/LibertyFlow_v002/.env")
-                dotenv_path = "/mnt/LibertyFlow/LibertyFlow_v002/.env"
-                load_dotenv(dotenv_path, override=True)
-                if side == "Buy":
-                    symbol = os.getenv("NIFTY_BUY_SYMBOL")
+            if playbook is not None:
+                # The strike armed at swing time, only its first quote comes from the live option chain
+                symbol, initial_quote = playbook.symbol, option_chain.top(playbook.symbol)
+            else:
+                # Strike and ask straight from the live option chain when we have it
+                chain = option_chain.select("NIFTY", side, ltp, 50, 100) if ltp is not None else None
+                if chain is not None:
+                    symbol, initial_quote = chain
+                    self.logger.info(f"place_nifty_order_new(): {symbol} picked from live option chain")
                 else:
-                    symbol = os.getenv("NIFTY_SELL_SYMBOL")
-                if symbol is None or symbol == "":
-                    raise Exception("Symbol not found in .env file")
-            except Exception as e:
-                self.logger.error(f"place_nifty_order_new(): Failed to Get Symbol from .env file. Error: {e}")
-                symbol = await self.get_symbol(side)
+                    symbol, initial_quote = await self._order_symbol(side), None
+            if playbook is not None:
+                qty, product_type, schedule = playbook.qty, playbook.product_type, playbook.schedule
+            else:
+                qty, product_type, schedule = self.qty, self.nifty_product_type, "nifty_entry"
             #Debugging settings
             # symbol='NSE:SBIN-EQ' # Comment this later
             # self.qty = 1 # Comment this later
             self.logger.info(f"Placing order for: {symbol}")
-            initial_quote = await self.LibertyMarketData.fetch_quick_quote(symbol)
-            ask_price = initial_quote['ask']
-            limit_price = self.round_to_nearest_half(ask_price + ask_price * self.limit_price_pct) # Setting Limit Price at 1% of ask price
-            counter = 1
-            data={
-                'productType':self.nifty_product_type,
-                'side': self.buy_side,
-                'symbol': symbol,
-                'qty': self.qty,
-                'type': self.limit_type,
-                'validity':'DAY',
-                'limitPrice': limit_price,
-                'orderTag': 'NiftyTF'
-            }
-            response = self.fyers.place_order(data)
-            print(response)
-            if response['s'] == "ok":
-                order_id = response['id']
-                asyncio.create_task(self.LibertyMarketData.insert_order_data(orderID=order_id))
-            else:
+            report = await self.execution.execute(self.buy_side, symbol, qty, schedule, quote=initial_quote, product_type=product_type, timeline=timeline)
+            if report.order_id is None:
                 self.logger.error("place_nifty_order_new(): Failed to Place Order")
-                await slack.send_message(f"place_nifty_order_new(): Failed to Place Order \n Place order manually for {symbol} Response: {response}")
+                await slack.send_message(f"place_nifty_order_new(): Failed to Place Order \n Place order manually for {symbol} Response: {report.response}")
                 return None, None
-            
-            self.logger.info(f"Order Placed. Response:{response}\n")
-
-            await asyncio.sleep(3.5)  # Waiting for a second for order to process, maybe will need to increase later
-            placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-            print(f"placed_order_status:{placed_order_status}, {type(placed_order_status)}")
-            if placed_order_status == 2:
-                await slack.send_message(f"place_nifty_order_new(): Order Filled Successfully for {symbol} Response: {response}")
-                return symbol,order_id
-            else:
-                while counter < 6:
-                    counter += 1
-                    placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)                         
-                    if placed_order_status == 2:
-                        await slack.send_message(f"place_nifty_order_new(): Order Filled Successfully for {symbol}")
-                        return symbol,order_id
-                    fresh_quote = await self.LibertyMarketData.fetch_quick_quote(symbol) ### Getting new quote
-                    ask_price = fresh_quote['ask']                                        
-                    limit_price = self.round_to_nearest_half(ask_price + ask_price * (self.limit_price_pct * counter))
-                    data = {
-                            "id":order_id, 
-                            "type":self.limit_type, 
-                            "limitPrice": limit_price
-                        }
-                    self.fyers.modify_order(data=data) ### Not Error Checking here
-                    await asyncio.sleep(5)
-                # Going for Market Order
-                self.logger.info("place_nifty_order_new(): Going for Market Order")
-                data = {
-                        "id":order_id, 
-                        "type":self.market_type # <- Market Order
-                    }  
-                self.fyers.modify_order(data=data) ### Not Error Checking here
-                await asyncio.sleep(2)
-                placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                if placed_order_status == 2:
-                    await slack.send_message(f"place_nifty_order_new(): Exited At Market Price Successfully for {symbol}.")
-                    return symbol,order_id                     
-                else:
-                    self.logger.error("place_nifty_order_new(): Failed to Place Order")
-                    await slack.send_message(f"place_nifty_order_new(): Failed to Place Order at Market \n Place order manually for {symbol}")
-                    return None, None               
+            asyncio.create_task(self.LibertyMarketData.insert_order_data(orderID=report.order_id))
+            if report.filled:
+                how = "At Market Price" if report.market else f"after {report.reprices} reprices"
+                await slack.send_message(f"place_nifty_order_new(): Order Filled {how} for {symbol} at {report.fill_price} (slippage {report.slippage}, {report.time_to_fill:.2f}s)")
+                return symbol, report.order_id
+            self.logger.error(f"place_nifty_order_new(): Failed to Place Order, {report.status}")
+            await slack.send_message(f"place_nifty_order_new(): Failed to Place Order at Market ({report.status}) {report.caution}\n Place order manually for {symbol}")
+            return None, None
 
         except Exception as e:
             print(f"Error: {e}")
             self.logger.error(f"place_nifty_order_new(): {e}")
             return None, None
 
-    async def _monitor_order_websocket(self, order_id, symbol, initial_ask, counter, order_complete_event):
-        """
-        Monitor order status via WebSocket and modify as needed
-        """
-        loop = asyncio.get_event_loop()
-        
-        # Start the WebSocket in a separate thread
-        thread = threading.Thread(
-            target=self._run_order_monitor_thread,
-            args=(order_id, initial_ask, counter, order_complete_event, loop),
-            daemon=True
-        )
-        thread.start()
-        self.logger.info(f"Order monitor started for order ID: {order_id}")
-
-    def _run_order_monitor_thread(self, order_id, initial_ask, counter, order_complete_event, loop):
-        """
-        Background thread for order monitoring and modification
-        """
-        def on_order(message):
-            nonlocal counter
-            
-            if not isinstance(message, dict) or message.get("s") != "ok" or "orders" not in message:
-                return
-                
-            order_info = message.get("orders", {})
-            
-            # Check if this is our order
-            if order_info.get("id") != order_id:
-                return
-                
-            status = order_info.get("status")
-            self.logger.info(f"Order {order_id} status update: {status}")
-            
-            # If order complete (status 2 in Fyers API), signal completion
-            if status == 2:
-                self.logger.info(f"Order {order_id} completed successfully!")
-                # Signal the asyncio waiter
-                loop.call_soon_threadsafe(order_complete_event.set)
-                try:
-                    ws.unsubscribe(data_type="OnOrders")
-                except Exception as e:
-                    self.logger.error(f"Error unsubscribing: {e}")
-                return
-                
-            # If order not complete, wait 2 seconds and then modify if needed
-            time.sleep(2)
-            
-            if counter < 10:
-                # Increment counter and adjust price
-                counter += 1
-                new_price = initial_ask * (1 + (counter * 0.01))
-                
-                # Modify order with new price
-                modify_data = {
-                    'id': order_id,
-                    'type': self.limit_type,  # Market order
-                    'limitPrice': new_price
-                }
-                
-                try:
-                    modify_response = self.fyers.modify_order(modify_data)
-                    self.logger.info(f"Modified order {order_id} to price {new_price}. Response: {modify_response}")
-                except Exception as e:
-                    self.logger.error(f"Error modifying order: {e}")
-            
-            elif counter == 10:
-                # Convert to market order
-                modify_data = {
-                    'id': order_id,
-                    'type': self.market_type  # Market order
-                }
-                
-                try:
-                    modify_response = self.fyers.modify_order(modify_data)
-                    self.logger.info(f"Converted order {order_id} to market order. Response: {modify_response}")
-                except Exception as e:
-                    self.logger.error(f"Error converting to market order: {e}")
-        
-        def on_error(message):
-            self.logger.error(f"WebSocket error: {message}")
-            loop.call_soon_threadsafe(order_complete_event.set)
-            
-        def on_close(message):
-            self.logger.info(f"WebSocket closed: {message}")
-            
-        def on_open():
-            self.logger.info(f"WebSocket connected, subscribing to orders for {order_id}")
-            ws.subscribe(data_type="OnOrders")
-            ws.keep_running()
-            
-        # Create and connect the WebSocket
-        ws = order_ws.FyersOrderSocket(
-            access_token=self.access_token,
-            log_path="",
-            write_to_file=False,
-            on_connect=on_open,
-            on_orders=on_order,
-            on_error=on_error,
-            on_close=on_close
-        )
-        ws.connect() 
-
     async def exit_position(self):
         try:
             self.logger.info(f"exit_position(): Starting to Exit Postions")
             # Getting all open INTRADAY positions            
             openPositions=[]
-            positions = self.fyers.positions()
+            positions = await fyers_gateway.positions()
             for position in positions['netPositions']:
                 if position['netQty'] > 0 and position['productType'] == self.nifty_product_type:
                     openPositions.append(position)
             self.logger.info(f"exit_position(): Found {len(openPositions)} Open Positions")
+            if len(openPositions) == 0:
+                await slack.send_message(f"exit_position(): No Open Positions to Exit")
+                return True
+            # Price every leg in one quotes call, then chase all the exits at once
+            quotes = await self.LibertyMarketData.fetch_quotes([p['symbol'] for p in openPositions]) or {}
+            exits = []
             for exitPosition in openPositions:
                 self.logger.info(f"exitPosition: {exitPosition}")
                 symbol = exitPosition['symbol']
@@ -309,70 +166,28 @@ class Nifty_OMS:
                     positionQty = exitPosition['qty']
                 except:
                     positionQty = exitPosition['netQty']
-                initial_quote = await self.LibertyMarketData.fetch_quick_quote(symbol)
-                self.logger.info(f"Initial Quote: {initial_quote}")
-                bid_price = initial_quote['bid']
-                limit_price = self.round_to_nearest_half(bid_price - bid_price * self.limit_price_pct) # Setting Limit Price at 0.5% of ask price
-                counter = 1
-                data={
-                    'productType':self.nifty_product_type,
-                    'side': self.sell_side,
-                    'symbol': symbol,
-                    'qty': positionQty,
-                    'type': self.limit_type,
-                    'validity':'DAY',
-                    'limitPrice': limit_price,
-                    'orderTag': 'NiftyTF'
-                }
-                self.logger.info(f"Data sending to fyers: {data}")
-                response = self.fyers.place_order(data)
-                if response['s'] == "ok":
-                    order_id = response['id']
-                else:
-                    self.logger.error("exit_position(): Failed to Place Exit Order")
-                    await slack.send_message(f"exit_position(): Failed to Place Exit Order \n Exit manually for {symbol} Response: {response}")
-                    continue ### Going to next position
-                
-                self.logger.info(f"Exit Order Placed. Response:{response}\n")
+                quote = quotes.get(symbol)
+                if quote is None or quote.get('bid') is None:
+                    quote = None # Engine fetches its own
+                exits.append(self.execution.execute(self.sell_side, symbol, positionQty, "exit_all", quote=quote))
+            reports = await asyncio.gather(*exits, return_exceptions=True)
 
-                await asyncio.sleep(1.5)  # Waiting for a second for order to process, maybe will need to increase later
-                placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                self.logger.info(f"exit_position():{placed_order_status}, {type(placed_order_status)}")
-                if placed_order_status == 2:
-                    await slack.send_message(f"exit_position(): Exited Successfully for {symbol} Response: {response}")
-                    # return True
+            lines = []
+            for exitPosition, report in zip(openPositions, reports):
+                symbol = exitPosition['symbol']
+                if isinstance(report, Exception):
+                    lines.append(f"{symbol}: error {report}, exit manually")
+                elif report.filled:
+                    how = " at market" if report.market else ""
+                    lines.append(f"{symbol}: exited{how} at {report.fill_price} (slippage {report.slippage}, {report.time_to_fill:.2f}s)")
+                elif report.order_id is None:
+                    lines.append(f"{symbol}: exit order not placed, exit manually. Response: {report.response}")
                 else:
-                    while counter < 6:
-                        counter += 1
-                        placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                        if placed_order_status == 2:
-                            await slack.send_message(f"exit_position(): Exited Successfully for {symbol}.")
-                            # return True                     
-                            continue
-                        fresh_quote = await self.LibertyMarketData.fetch_quick_quote(symbol)
-                        self.logger.info(f"Fresh Quote: {fresh_quote}")
-                        bid_price = fresh_quote['bid']            
-                        limit_price = self.round_to_nearest_half(bid_price - bid_price * (self.limit_price_pct * counter)) ### Exponential Backoff
-                        data = {
-                                "id":order_id, 
-                                "type":self.limit_type, 
-                                "limitPrice": limit_price
-                            }
-                        self.fyers.modify_order(data=data) ### Not Error Checking here
-                        await asyncio.sleep(5)
-                    # Going for Market Order
-                    data = {
-                            "id":order_id, 
-                            "type":self.market_type # <- Market Order
-                        }  
-                    self.fyers.modify_order(data=data) ### Not Error Checking here
-                    await asyncio.sleep(2)
-                    placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                    if placed_order_status == 2:
-                        await slack.send_message(f"exit_position(): Exited At Market Price Successfully for {symbol}.")
-            if len(openPositions) == 0:
-                await slack.send_message(f"exit_position(): No Open Positions to Exit")
-            return True                            
+                    lines.append(f"{symbol}: exit {report.status}, exit manually. {report.caution}")
+            exited = sum(1 for report in reports if not isinstance(report, Exception) and report.filled)
+            self.logger.info(f"exit_position(): Exited {exited}/{len(openPositions)} positions")
+            await slack.send_message(f"exit_position(): Exited {exited}/{len(openPositions)} positions\n" + "\n".join(lines))
+            return exited == len(openPositions)
         except Exception as e:
             print(f"Error: {e}")
             self.logger.error(f"exit_position(): {e}")                
@@ -380,73 +195,19 @@ class Nifty_OMS:
     async def exit_single_position(self,symbol):
         try:
             self.logger.info(f"exit_single_position(): Starting to Exit ")
-            initial_quote = await self.LibertyMarketData.fetch_quick_quote(symbol)
-            print(f"Initial Quote: {initial_quote}")
-            bid_price = initial_quote['bid']
-            limit_price = self.round_to_nearest_half(bid_price - bid_price * self.limit_price_pct) # Setting Limit Price at 0.5% of bid price
-            counter = 1
             if "BANK" in symbol:
                 self.qty = settings.trade.BANKNIFTY_LOT * settings.trade.BANKNIFTY_LOT_SIZE
-            data={
-                'productType':self.nifty_product_type,
-                'side': self.sell_side,
-                'symbol': symbol,
-                'qty': self.qty,
-                'type': self.limit_type,
-                'validity':'DAY',
-                'limitPrice': limit_price,
-                'orderTag': 'NiftyTF'
-            }
-            self.logger.info(f"exit_single_position(): Data sending to fyers: {data}")
-            response = self.fyers.place_order(data) ### Placing Order here
-            print(response)
-            if response['s'] == "ok":
-                order_id = response['id']
-            else:
+            report = await self.execution.execute(self.sell_side, symbol, self.qty, "exit")
+            if report.order_id is None:
                 self.logger.error("exit_single_position(): Failed to Place Exit Order")
-                await slack.send_message(f"exit_single_position(): Failed to Place Exit Order \n Exit manually for {symbol} Response: {response}")
+                await slack.send_message(f"exit_single_position(): Failed to Place Exit Order \n Exit manually for {symbol} Response: {report.response}")
                 return False
-                
-            self.logger.info(f"exit_single_position(): Exit Order Placed. Response:{response}\n")
-            await asyncio.sleep(3.5)  # Waiting for a second for order to process, maybe will need to increase later
-
-
-            placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-            print(f"exit_single_position():{placed_order_status}, {type(placed_order_status)}")
-
-
-            if placed_order_status == 2:
-                await slack.send_message(f"exit_single_position(): Exited Successfully for {symbol} Response: {response}")
+            if report.filled:
+                how = "At Market Price " if report.market else ""
+                await slack.send_message(f"exit_single_position(): Exited {how}Successfully for {symbol} at {report.fill_price} (slippage {report.slippage})")
                 return True
-            else:
-                while counter < 6:
-                    counter += 1
-                    placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                    if placed_order_status == 2:
-                        await slack.send_message(f"exit_single_position(): Exited Successfully for {symbol}.")
-                        return True                     
-                    fresh_quote = await self.LibertyMarketData.fetch_quick_quote(symbol)
-                    print(f"Fresh Quote: {fresh_quote}")
-                    bid_price = fresh_quote['bid']            
-                    limit_price = self.round_to_nearest_half(bid_price - bid_price * (self.limit_price_pct * counter)) ### Exponential Backoff
-                    data = {
-                            "id":order_id, 
-                            "type":self.limit_type, 
-                            "limitPrice": limit_price
-                        }
-                    self.fyers.modify_order(data=data) ### Not Error Checking here
-                    await asyncio.sleep(5)
-                # Going for Market Order
-                data = {
-                        "id":order_id, 
-                        "type":self.market_type # <- Market Order
-                    }  
-                self.fyers.modify_order(data=data) ### Not Error Checking here
-                await asyncio.sleep(2)
-                placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                if placed_order_status == 2:
-                    await slack.send_message(f"exit_single_position(): Exited At Market Price Successfully for {symbol}.")
-                    return True     
+            await slack.send_message(f"exit_single_position(): Exit {report.status} for {symbol}, exit manually. {report.caution}")
+            return False
         except Exception as e:
             print(f"Error: {e}")
             self.logger.error(f"exit_position(): {e}")                          
@@ -464,221 +225,113 @@ class Nifty_OMS:
                 print(ATM)
             else:
                 raise Exception
-            url = 'https://public.fyers.in/sym_details/NSE_FO.csv'
-            df = pd.read_csv(url, header=None)
             if side == "Buy":
                 optionType="CE"
             else:
                 optionType="PE"
-            df_filtered = df[df[9].str.startswith(f"NSE:NIFTY") & df[9].str.contains(f"{ATM}{optionType}")]
-            expiry_date = datetime.strptime(f"{df_filtered.iloc[0][1].split(" ")[3]} {df_filtered.iloc[0][1].split(" ")[2]} {datetime.now().year}", "%d %b %Y").date()
-            # dotenv_path = find_dotenv(filename="/mnt/LibertyFlow/LibertyFlow_v002/.env")
-            dotenv_path = "/mnt/LibertyFlow/LibertyFlow_v002/.env"
-            load_dotenv(dotenv_path, override=True)            
-            if expiry_date != datetime.today().date():
-                symbol = str(df_filtered.iloc[0][9])
-                if side == "Buy":
-                    set_key(dotenv_path, 'NIFTY_BUY_SYMBOL', symbol)
-                else:
-                    set_key(dotenv_path, 'NIFTY_SELL_SYMBOL', symbol)
-                self.logger.info(f"set_option_symbol(): Set {side} Symbol: {symbol}")                    
-                return True
-            else:
-                symbol = str(df_filtered.iloc[1][9])
-                if side == "Buy":
-                    set_key(dotenv_path, 'NIFTY_BUY_SYMBOL', symbol)
-                else:
-                    set_key(dotenv_path, 'NIFTY_SELL_SYMBOL', symbol)                
-                self.logger.info(f"set_option_symbol(): Set {side} Symbol: {symbol}")
-                return True
+            symbol = instruments.option("NIFTY", ATM, optionType)
+            if symbol is None:
+                raise Exception(f"{ATM}{optionType} not found in instrument master")
+            symbol_registry.set("nifty", side, symbol)
+            self.logger.info(f"set_option_symbol(): Set {side} Symbol: {symbol}")                    
+            return True
         except Exception as e:
             self.logger.error(f"set_option_symbol(): Error Getting Symbol for {side} {ATM}. Error: {e}")
             return None   
                  
+    async def select_strike(self, underlying, side, ltp, strike_interval, required_price, ladder=10):
+        """
+            Walks from ATM into the money (CE below for Buy, PE above for Sell) and returns the first
+            strike whose premium is at least required_price.
+            The whole ladder (ATM + ladder strikes) is priced with one batched quotes call.
+        """
+        ATM = round(ltp/strike_interval)*strike_interval
+        optionType = "CE" if side == "Buy" else "PE"
+        step = -strike_interval if side == "Buy" else strike_interval
+        candidates = []
+        for strike_multiplier in range(ladder + 1):
+            symbol = instruments.option(underlying, ATM + step * strike_multiplier, optionType)
+            if symbol is not None:
+                candidates.append(symbol)
+        if not candidates:
+            raise Exception(f"{ATM}{optionType} not found in instrument master")
+        quotes = await self.LibertyMarketData.fetch_quotes(candidates)
+        if quotes is None:
+            raise Exception("Failed to fetch ladder quotes")
+        for symbol in candidates:
+            price = (quotes.get(symbol) or {}).get('lp')
+            self.logger.info(f"select_strike(): Symbol: {symbol} LTP: {price}")
+            if price is not None and price >= required_price:
+                return symbol
+        raise Exception(f"No {optionType} within {ladder} strikes of {ATM} priced at {required_price}+")
+
     async def set_option_symbol(self,side,ltp,strike_interval=50):
-        strike_multiplier=0
         requiredPrice = 100
-        price = 0
-        while price < requiredPrice:        
-            try:
-                self.logger.info(f"set_option_symbol(): LTP: {ltp}")
-                if ltp is not None:
-                    ATM =  round(ltp/strike_interval)*strike_interval
-                    ### Stepping 1 Down in ATM strike
-                    if side == "Buy":
-                        ATM = ATM - (50 * strike_multiplier)
-                    else:
-                        ATM = ATM + (50 * strike_multiplier)
-                    self.logger.info(f"set_option_symbol(): ATM: {ATM} strike_multiplier: {strike_multiplier}")
-                else:
-                    raise Exception
-                # Master Sheet
-                url = 'https://public.fyers.in/sym_details/NSE_FO.csv'
-                df = pd.read_csv(url, header=None)
-                if side == "Buy":
-                    optionType="CE"
-                else:
-                    optionType="PE"
-                df_filtered = df[df[9].str.startswith(f"NSE:NIFTY") & df[9].str.contains(f"{ATM}{optionType}")]
-                expiry_date = datetime.strptime(f"{df_filtered.iloc[0][1].split(" ")[3]} {df_filtered.iloc[0][1].split(" ")[2]} {datetime.now().year}", "%d %b %Y").date()
-                #dotenv_path = find_dotenv(filename="/mnt/LibertyFlow/LibertyFlow_v002/.env")
-                dotenv_path = "/mnt/LibertyFlow/LibertyFlow_v002/.env"
-                load_dotenv(dotenv_path, override=True)            
-                if expiry_date != datetime.today().date():
-                    symbol = str(df_filtered.iloc[0][9])
-                    if side == "Buy":
-                        set_key(dotenv_path, 'NIFTY_BUY_SYMBOL', symbol)
-                    else:
-                        set_key(dotenv_path, 'NIFTY_SELL_SYMBOL', symbol)
-                    self.logger.info(f"set_option_symbol(): Set {side} Symbol: {symbol}")                    
-                else:
-                    symbol = str(df_filtered.iloc[1][9])
-                    if side == "Buy":
-                        set_key(dotenv_path, 'NIFTY_BUY_SYMBOL', symbol)
-                    else:
-                        set_key(dotenv_path, 'NIFTY_SELL_SYMBOL', symbol)                
-                    self.logger.info(f"set_option_symbol(): Set {side} Symbol: {symbol}")
-                price = (await self.LibertyMarketData.fetch_quick_quote(symbol))['lp']
-                if price < requiredPrice:
-                    strike_multiplier += 1
-                self.logger.info(f"set_option_symbol(): Symbol: {symbol} LTP: {price}")                    
-            except Exception as e:
-                self.logger.error(f"set_option_symbol(): Error Getting Symbol for {side} {ATM}. Error: {e}")
-                return None         
+        try:
+            self.logger.info(f"set_option_symbol(): LTP: {ltp}")
+            if ltp is None:
+                raise Exception
+            symbol = await self.select_strike("NIFTY", side, ltp, strike_interval, requiredPrice)
+            symbol_registry.set("nifty", side, symbol)
+            entry_playbooks.arm("nifty", side, swing_price=ltp, symbol=symbol)
+            self.logger.info(f"set_option_symbol(): Set {side} Symbol: {symbol}")                    
+            # Keep the strikes around the swing live for the breakout
+            option_chain.watch("NIFTY", side, ltp, strike_interval)
+        except Exception as e:
+            self.logger.error(f"set_option_symbol(): Error Getting Symbol for {side} {ltp}. Error: {e}")
+            return None         
         return True   
     
     async def set_option_symbol_bnf(self,side,ltp,strike_interval=100):
-        strike_multiplier=0
         requiredPrice = 500
-        price = 0
-        while price < requiredPrice:        
-            try:
-                self.logger.info(f"set_option_symbol_bnf(): LTP: {ltp}")
-                if ltp is not None:
-                    ATM =  round(ltp/strike_interval)*strike_interval
-                    ### Stepping 1 Down in ATM strike
-                    if side == "Buy":
-                        ATM = ATM - (100 * strike_multiplier)
-                    else:
-                        ATM = ATM + (100 * strike_multiplier)
-                    self.logger.info(f"set_option_symbol_bnf(): ATM: {ATM} strike_multiplier: {strike_multiplier}")
-                else:
-                    raise Exception
-                # Master Sheet
-                url = 'https://public.fyers.in/sym_details/NSE_FO.csv'
-                df = pd.read_csv(url, header=None)
-                if side == "Buy":
-                    optionType="CE"
-                else:
-                    optionType="PE"
-                df_filtered = df[df[9].str.startswith(f"NSE:BANKNIFTY") & df[9].str.contains(f"{ATM}{optionType}")]
-                expiry_date = datetime.strptime(f"{df_filtered.iloc[0][1].split(" ")[3]} {df_filtered.iloc[0][1].split(" ")[2]} {datetime.now().year}", "%d %b %Y").date()
-                dotenv_path = "/mnt/LibertyFlow/LibertyFlow_v002/.env"
-                load_dotenv(dotenv_path, override=True)            
-                if expiry_date != datetime.today().date():
-                    symbol = str(df_filtered.iloc[0][9])
-                    set_key(dotenv_path, 'BANKNIFTY_BUY_SYMBOL', symbol)
-                    self.logger.info(f"set_option_symbol_bnf(): Set {side} Symbol: {symbol}")                    
-                else:
-                    symbol = str(df_filtered.iloc[1][9])
-                    set_key(dotenv_path, 'BANKNIFTY_BUY_SYMBOL', symbol)
-                    self.logger.info(f"set_option_symbol_bnf(): Set {side} Symbol: {symbol}")
-                price = (await self.LibertyMarketData.fetch_quick_quote(symbol))['lp']
-                if price < requiredPrice:
-                    strike_multiplier += 1
-                self.logger.info(f"set_option_symbol_bnf(): Symbol: {symbol} LTP: {price}")                    
-            except Exception as e:
-                self.logger.error(f"set_option_symbol_bnf(): Error Getting Symbol for {side} {ATM}. Error: {e}")
-                return None         
+        try:
+            self.logger.info(f"set_option_symbol_bnf(): LTP: {ltp}")
+            if ltp is None:
+                raise Exception
+            symbol = await self.select_strike("BANKNIFTY", side, ltp, strike_interval, requiredPrice)
+            symbol_registry.set("banknifty", side, symbol)
+            self.logger.info(f"set_option_symbol_bnf(): Set {side} Symbol: {symbol}")                    
+            # Keep the strikes around the POI live for the breakout
+            option_chain.watch("BANKNIFTY", side, ltp, strike_interval)
+        except Exception as e:
+            self.logger.error(f"set_option_symbol_bnf(): Error Getting Symbol for {side} {ltp}. Error: {e}")
+            return None         
         return True   
     
-    async def place_banknifty_order_new(self,side,ltp) -> str:
+    async def place_banknifty_order_new(self,side,ltp,timeline=None) -> str:
         # This returns symbol and order date time, both in string
         try:
-            try:
-                from app.config import settings
-                # dotenv_path = find_dotenv(filename="/mnt/LibertyFlow/LibertyFlow_v002/.env")
-                dotenv_path = "/mnt/LibertyFlow/LibertyFlow_v002/.env"
-                load_dotenv(dotenv_path, override=True)
-                if side == "Buy":
-                    symbol = os.getenv("BANKNIFTY_BUY_SYMBOL")
-                else:
-                    symbol = os.getenv("BANKNIFTY_BUY_SYMBOL")
-                if symbol is None or symbol == "":
-                    raise Exception("Symbol not found in .env file")
-            except Exception as e:
-                self.logger.error(f"place_banknifty_order_new(): Failed to Get Symbol from .env file. Error: {e}")
-                symbol = await self.set_option_symbol_bnf(side=side, ltp=float(ltp))
+            # Strike and ask straight from the live option chain when we have it
+            chain = option_chain.select("BANKNIFTY", side, float(ltp), 100, 500)
+            initial_quote = None
+            if chain is not None:
+                symbol, initial_quote = chain
+                self.logger.info(f"place_banknifty_order_new(): {symbol} picked from live option chain")
+            else:
+                # Picked when the POI was set
+                symbol = symbol_registry.get("banknifty", side)
+                if symbol is None:
+                    self.logger.error(f"place_banknifty_order_new(): No {side} symbol in the registry")
+                    await self.set_option_symbol_bnf(side=side, ltp=float(ltp))
+                    symbol = symbol_registry.get("banknifty", side)
             self.qty = settings.trade.BANKNIFTY_LOT * settings.trade.BANKNIFTY_LOT_SIZE
             #Debugging settings
             # symbol='NSE:SBIN-EQ' # Comment this later
             # self.qty = 1 # Comment this later
             self.logger.info(f"place_banknifty_order_new(): Placing order for: {symbol}")
-            initial_quote = await self.LibertyMarketData.fetch_quick_quote(symbol)
-            ask_price = initial_quote['ask']
-            limit_price = self.round_to_nearest_half(ask_price + ask_price * self.limit_price_pct) # Setting Limit Price at 1% of ask price
-            counter = 1
-            data={
-                'productType':self.nifty_product_type,
-                'side': self.buy_side,
-                'symbol': symbol,
-                'qty': self.qty,
-                'type': self.limit_type,
-                'validity':'DAY',
-                'limitPrice': limit_price,
-                'orderTag': 'BankNiftyTF'
-            }
-            response = self.fyers.place_order(data)
-            print(response)
-            if response['s'] == "ok":
-                order_id = response['id']
-                asyncio.create_task(self.LibertyMarketData.insert_order_data(orderID=order_id))
-            else:
+            report = await self.execution.execute(self.buy_side, symbol, self.qty, "banknifty_entry", quote=initial_quote, timeline=timeline)
+            if report.order_id is None:
                 self.logger.error("place_banknifty_order_new(): Failed to Place Order")
-                await slack.send_message(f"place_banknifty_order_new(): Failed to Place Order \n Place order manually for {symbol} Response: {response}")
+                await slack.send_message(f"place_banknifty_order_new(): Failed to Place Order \n Place order manually for {symbol} Response: {report.response}")
                 return None, None
-            
-            self.logger.info(f"place_banknifty_order_new(): Order Placed. Response:{response}\n")
-
-            await asyncio.sleep(3.5)  # Waiting for a second for order to process, maybe will need to increase later
-            placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-            print(f"placed_order_status:{placed_order_status}, {type(placed_order_status)}")
-            if placed_order_status == 2:
-                await slack.send_message(f"place_banknifty_order_new(): Order Filled Successfully for {symbol} Response: {response}")
-                return symbol,order_id
-            else:
-                while counter < 6:
-                    counter += 1
-                    placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)                         
-                    if placed_order_status == 2:
-                        await slack.send_message(f"place_banknifty_order_new(): Order Filled Successfully for {symbol}")
-                        return symbol,order_id
-                    fresh_quote = await self.LibertyMarketData.fetch_quick_quote(symbol) ### Getting new quote
-                    ask_price = fresh_quote['ask']                                        
-                    limit_price = self.round_to_nearest_half(ask_price + ask_price * (self.limit_price_pct * counter))
-                    data = {
-                            "id":order_id, 
-                            "type":self.limit_type, 
-                            "limitPrice": limit_price
-                        }
-                    self.fyers.modify_order(data=data) ### Not Error Checking here
-                    await asyncio.sleep(5)
-                # Going for Market Order
-                self.logger.info("place_banknifty_order_new(): Going for Market Order")
-                data = {
-                        "id":order_id, 
-                        "type":self.market_type # <- Market Order
-                    }  
-                self.fyers.modify_order(data=data) ### Not Error Checking here
-                await asyncio.sleep(2)
-                placed_order_status = await self.LibertyMarketData.fetch_quick_order_status(orderID=order_id)
-                if placed_order_status == 2:
-                    await slack.send_message(f"place_banknifty_order_new(): Exited At Market Price Successfully for {symbol}.")
-                    return symbol,order_id                     
-                else:
-                    self.logger.error("place_banknifty_order_new(): Failed to Place Order")
-                    await slack.send_message(f"place_banknifty_order_new(): Failed to Place Order at Market \n Place order manually for {symbol}")
-                    return None, None               
+            asyncio.create_task(self.LibertyMarketData.insert_order_data(orderID=report.order_id))
+            if report.filled:
+                how = "At Market Price" if report.market else f"after {report.reprices} reprices"
+                await slack.send_message(f"place_banknifty_order_new(): Order Filled {how} for {symbol} at {report.fill_price} (slippage {report.slippage}, {report.time_to_fill:.2f}s)")
+                return symbol, report.order_id
+            self.logger.error(f"place_banknifty_order_new(): Failed to Place Order, {report.status}")
+            await slack.send_message(f"place_banknifty_order_new(): Failed to Place Order at Market ({report.status}) {report.caution}\n Place order manually for {symbol}")
+            return None, None
 
         except Exception as e:
             print(f"Error: {e}")
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from app.utils.logging import get_logger
+from app.fyers.instruments import instruments
+from app.fyers.market_feed import market_feed
+
+QUOTE_MAX_AGE = 5 # Seconds since its last tick after which a book is too old to price an order off
+
+class LibertyOptionChain:
+    """
+        Live top of book for the option strikes we may trade.
+        Once a swing forms we know the side, watch() subscribes ATM ± depth strikes of that side's
+        option type (CE for Buy, PE for Sell) to the market feed, and every tick updates the
+        contract's ltp/bid/ask in memory.
+        At breakout select() picks the strike and first limit price from memory, no REST calls.
+        Anything not in memory (feed down, strike outside the ladder, no tick yet or none for
+        QUOTE_MAX_AGE seconds) returns None and the caller goes back to quotes.
+    """
+    def __init__(self):
+        self.logger = get_logger("OptionChain")
+        self._lock = threading.Lock()
+        self._books = {} # symbol -> {"lp", "bid", "ask", "ts"}
+        self._ladders = {} # (underlying, side) -> list of watched symbols
+        self.depth = 10
+
+    @staticmethod
+    def _ladder(underlying, side, ltp, strike_interval, strikes):
+        """Option symbols for the strikes, ATM first then walking into the money"""
+        ATM = round(ltp/strike_interval)*strike_interval
+        optionType = "CE" if side == "Buy" else "PE"
+        step = -strike_interval if side == "Buy" else strike_interval
+        return [instruments.option(underlying, ATM + step * k, optionType) for k in strikes]
+
+    def watch(self, underlying, side, ltp, strike_interval):
+        """(Re)centre the watched ladder for underlying/side on ltp"""
+        ladder = [s for s in self._ladder(underlying, side, ltp, strike_interval, range(-self.depth, self.depth + 1)) if s]
+        old = self._ladders.get((underlying, side), [])
+        for symbol in ladder:
+            if symbol not in old:
+                market_feed.add_listener(symbol, self._on_tick)
+        for symbol in old:
+            if symbol not in ladder:
+                market_feed.remove_listener(symbol, self._on_tick)
+                with self._lock:
+                    self._books.pop(symbol, None)
+        self._ladders[(underlying, side)] = ladder
+        self.logger.info(f"watch(): Watching {len(ladder)} {underlying} {side} strikes around {ltp}")
+
+    def unwatch(self, underlying, side):
+        for symbol in self._ladders.pop((underlying, side), []):
+            market_feed.remove_listener(symbol, self._on_tick)
+            with self._lock:
+                self._books.pop(symbol, None)
+
+    def _on_tick(self, msg):
+        """Market feed listener, runs on the socket thread"""
+        with self._lock:
+            book = self._books.setdefault(msg["symbol"], {"lp": None, "bid": None, "ask": None, "ts": 0})
+            if msg.get("ltp") is not None:
+                book["lp"] = msg["ltp"]
+            if msg.get("bid_price") is not None:
+                book["bid"] = msg["bid_price"]
+            if msg.get("ask_price") is not None:
+                book["ask"] = msg["ask_price"]
+            book["ts"] = time.time()
+
+    def top(self, symbol):
+        """{'lp','bid','ask'} of symbol from memory, None if we can't trust it"""
+        if not market_feed.is_connected():
+            return None
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None or book["lp"] is None or book["ask"] is None or book["bid"] is None:
+                return None
+            if time.time() - book["ts"] > QUOTE_MAX_AGE:
+                self.logger.info(f"top(): {symbol} last ticked {time.time() - book['ts']:.1f}s ago, not using it")
+                return None
+            return {"lp": book["lp"], "ask": book["ask"], "bid": book["bid"]}
+
+    def select(self, underlying, side, ltp, strike_interval, required_price):
+        """(symbol, quote) of the first strike from ATM into the money priced at required_price+"""
+        watched = self._ladders.get((underlying, side), [])
+        for symbol in self._ladder(underlying, side, ltp, strike_interval, range(self.depth + 1)):
+            if symbol is None or symbol not in watched:
+                return None
+            quote = self.top(symbol)
+            if quote is None:
+                return None # Don't skip past a strike we know nothing about
+            if quote["lp"] >= required_price:
+                return symbol, quote
+        return None
+
+
+option_chain = LibertyOptionChain()
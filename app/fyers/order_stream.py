@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+from app.utils.logging import get_logger
+from app.config import settings
+from fyers_apiv3.FyersWebsocket import order_ws
+
+# Fyers order status codes
+CANCELLED, FILLED, TRANSIT, REJECTED, PENDING, EXPIRED = 1, 2, 4, 5, 6, 7
+FINAL_STATUSES = (CANCELLED, FILLED, REJECTED, EXPIRED)
+
+class LibertyOrderStream:
+    """
+        Persistent order update stream.
+        One FyersOrderSocket (own thread) subscribed to OnOrders for the whole session. Every update
+        is cached per order id, and wait() futures resolve the moment the broker reports a fill,
+        a partial fill, a reject/cancel.
+        Callers keep the REST path (get_orders) for when the stream is down or never saw the order.
+    """
+    def __init__(self):
+        self.logger = get_logger("OrderStream")
+        self.access_token = settings.fyers.FYERS_ACCESS_TOKEN
+        self._lock = threading.Lock()
+        self._ws = None
+        self._thread = None
+        self._connected = False
+        self._loop = None
+        self._orders = {} # order id -> latest order update
+        self._waiters = {} # order id -> list of asyncio.Future
+
+    def start(self):
+        """Connect the order socket, call from the event loop. Only the first call does anything"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.logger.info("start(): Order stream thread started")
+
+    def _run(self):
+        self._ws = order_ws.FyersOrderSocket(
+            access_token=self.access_token,
+            log_path="",
+            write_to_file=False,
+            reconnect=True,
+            on_connect=self._on_connect,
+            on_orders=self._on_order,
+            on_error=self._on_error,
+            on_close=self._on_close
+        )
+        self._ws.connect()
+
+    def _on_connect(self):
+        with self._lock:
+            self._connected = True
+        self.logger.info("Order stream connected, subscribing to order updates")
+        self._ws.subscribe(data_type="OnOrders")
+        self._ws.keep_running()
+
+    def _on_error(self, message):
+        self.logger.error(f"Order stream error: {message}")
+
+    def _on_close(self, message):
+        with self._lock:
+            self._connected = False
+        self.logger.info(f"Order stream closed: {message}")
+
+    def is_connected(self):
+        with self._lock:
+            return self._connected
+
+    def _on_order(self, message):
+        """Runs on the socket thread"""
+        if not isinstance(message, dict) or message.get("s") != "ok" or "orders" not in message:
+            return
+        order = message.get("orders") or {}
+        order_id = order.get("id")
+        if order_id is None:
+            return
+        with self._lock:
+            previous = self._orders.get(order_id) or {}
+            self._orders[order_id] = order
+        self.logger.info(f"Order {order_id} update: status {order.get('status')} filled {order.get('filledQty')}/{order.get('qty')}")
+
+        # Wake waiters on a final status or whenever more quantity fills
+        final = order.get("status") in FINAL_STATUSES
+        partial = (order.get("filledQty") or 0) > (previous.get("filledQty") or 0)
+        if (final or partial) and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._resolve, order_id, order)
+
+    def _resolve(self, order_id, order):
+        for waiter in self._waiters.pop(order_id, []):
+            if not waiter.done():
+                waiter.set_result(order)
+
+    def order(self, order_id):
+        """Latest update seen for order_id, None if the stream hasn't seen it"""
+        with self._lock:
+            return self._orders.get(str(order_id))
+
+    async def wait(self, order_id, timeout):
+        """
+            Wait up to timeout for order_id to fill (fully or partly), or be rejected/cancelled.
+            Returns the latest update seen either way, None if the stream never saw the order.
+        """
+        order_id = str(order_id)
+        order = self.order(order_id)
+        if order is not None and order.get("status") in FINAL_STATUSES:
+            return order
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(order_id, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            return self.order(order_id)
+        finally:
+            waiters = self._waiters.get(order_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+
+order_stream = LibertyOrderStream()
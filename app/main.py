@@ -1,13 +1,14 @@
 import asyncio
 import sys
 import traceback
-from datetime import date
 
 from app.utils.logging import setup_logging, get_logger
+from app.utils.calendar import trading_calendar
 import signal
 from app.db.dbclass import db
 from app.fyers.client import fyersClient
 from app.nifty_tf.strategy_main import LibertyFlow
+from app.nifty_tf.warmup import warmup
 #from app.nifty_tf.strategy_main_test import LibertyFlow
 from app.slack import slack
 
@@ -45,33 +46,6 @@ async def shutdown(signal_name=None):
     
     logger.info("Shutdown complete")
 
-def today_holiday():
-    """
-    Check if today's date is a holiday.
-    Returns 0 if today matches any of the specified holiday dates.
-    """
-    # List of holiday dates
-    holiday_dates = [
-        date(2026, 1, 15),   # 15-Jan-2026 Municipal Corporation Holiday
-        date(2026, 1, 26),   # 26-Jan-2026
-        date(2026, 3, 3),    # 03-Mar-2026
-        date(2026, 3, 26),   # 26-Mar-2026
-        date(2026, 3, 31),   # 31-Mar-2026
-        date(2026, 4, 3),    # 03-Apr-2026
-        date(2026, 4, 14),   # 14-Apr-2026
-        date(2026, 5, 1),    # 01-May-2026
-        date(2026, 5, 28),   # 28-May-2026
-        date(2026, 6, 26),   # 26-Jun-2026
-        date(2026, 9, 14),   # 14-Sep-2026
-        date(2026, 10, 2),   # 02-Oct-2026
-        date(2026, 10, 20),  # 20-Oct-2026
-        date(2026, 11, 10),  # 10-Nov-2026
-        date(2026, 11, 24),  # 24-Nov-2026
-        date(2026, 12, 25),  # 25-Dec-2026
-    ]
-    today = date.today()
-    return today in holiday_dates    
-
 async def main():
     # Setup logging first
     global strategy
@@ -80,7 +54,7 @@ async def main():
     asyncio.create_task(slack.send_message("Starting Liberty Flow..."))
     
     try:
-        if today_holiday():
+        if not trading_calendar.is_trading_day():
             logger.info("Today is a holiday. Skipping trading session.")
             await slack.send_message("Today is a holiday.")
             return 0
@@ -102,6 +76,9 @@ async def main():
 
         # Initializing & Running Strategy
         strategy = LibertyFlow(db, fyers)        
+
+        # Pre-open warm-up (9.00 - 9.14), so the open runs on warm connections and caches
+        await warmup.run(strategy.trigger.LibertyMarketData, underlying="NIFTY", strike_interval=50)
         result = await strategy.run()   
 
         # Check result and log appropriately
@@ -0,0 +1,251 @@
+import asyncio
+import os
+import re
+import shutil
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+
+from app.utils.logging import get_logger
+from app.utils.calendar import trading_calendar
+from app.config import settings
+from app.fyers.gateway import fyers_gateway
+from app.fyers.instruments import instruments
+from app.nifty_tf.candles import Candles, IST_OFFSET
+
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+
+# Archive name -> broker symbol, futures are the underlying's nearest contract (cont_flag stitches the history)
+ARCHIVE_SYMBOLS = {
+    "NIFTY50-INDEX": "NSE:NIFTY50-INDEX",
+    "NIFTYBANK-INDEX": "NSE:NIFTYBANK-INDEX",
+    "NIFTY-FUT": "NIFTY",
+    "BANKNIFTY-FUT": "BANKNIFTY",
+}
+
+# Most calendar days the broker serves per history call
+CHUNK_DAYS = {"1": 100, "1D": 366}
+
+# How long after the close the broker's bars of the session are taken as final
+SETTLE_AFTER_CLOSE = timedelta(minutes=30)
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def day_epoch(day):
+    """Epoch of day's 00:00 IST"""
+    return (day.toordinal() - EPOCH_ORDINAL) * 86400 - IST_OFFSET
+
+def ist_day(ts):
+    return date.fromordinal(EPOCH_ORDINAL + (int(ts) + IST_OFFSET) // 86400)
+
+def archive_name(symbol):
+    """Archive name of a broker symbol, NSE:NIFTY26OCTFUT -> NIFTY-FUT, NSE:NIFTY50-INDEX -> NIFTY50-INDEX"""
+    future = re.match(r"^NSE:([A-Z]+)\d{2}[A-Z]{3}FUT$", symbol)
+    if future:
+        return f"{future.group(1)}-FUT"
+    return symbol.split(":")[-1]
+
+class LibertyArchive:
+    """
+        Local archive of 1min and 1D candles for the indices and futures, so research and lookbacks
+        read from disk instead of calling history.
+        Stored under DATA_DIR/history/<name>/<resolution>/<YYYY-MM>/ as one .npy per column (like the
+        instrument master) plus days.npy, the sessions the partition fully covers. A session the broker
+        returned nothing or a partial day for isn't marked, so the next backfill / append asks again.
+        Reads are memory-mapped.
+        A partition is rewritten whole in a temp dir and swapped in, so a killed backfill leaves
+        every partition either old or new and simply resumes from days.npy.
+    """
+    def __init__(self):
+        self.logger = get_logger("Archive")
+        self.root = Path(settings.DATA_DIR) / "history"
+        self._lock = threading.Lock()
+
+    def _path(self, name, resolution, month):
+        return self.root / name / resolution / month
+
+    def _months(self, name, resolution):
+        path = self.root / name / resolution
+        if not path.exists():
+            return []
+        return sorted(p.name for p in path.iterdir() if (p / "days.npy").exists())
+
+    def _load(self, path, mmap_mode="r"):
+        return {column: np.load(path / f"{column}.npy", mmap_mode=mmap_mode) for column in COLUMNS + ("days",)}
+
+    def covered(self, name, resolution):
+        """Sessions already in the archive, as a set of dates"""
+        days = set()
+        for month in self._months(name, resolution):
+            days.update(date.fromordinal(int(d)) for d in np.load(self._path(name, resolution, month) / "days.npy"))
+        return days
+
+    def read(self, name, resolution, start, end=None):
+        """Candles of sessions start to end (default start), memory-mapped views when it's a single month"""
+        end = end or start
+        parts = []
+        for month in self._months(name, resolution):
+            if start.strftime("%Y-%m") <= month <= end.strftime("%Y-%m"):
+                parts.append(self._load(self._path(name, resolution, month)))
+        if not parts:
+            return Candles.from_rows([])
+        if len(parts) == 1:
+            columns = parts[0]
+        else:
+            columns = {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+        ts = columns["ts"]
+        lo = np.searchsorted(ts, day_epoch(start))
+        hi = np.searchsorted(ts, day_epoch(end + timedelta(days=1)))
+        return Candles(*(columns[column][lo:hi] for column in COLUMNS))
+
+    def _complete_days(self, resolution, rows, days):
+        """
+            The days of days the rows fully cover: at least one bar, and for 1min every bar of the session.
+            Anything less (no_data, a session the broker hasn't finished publishing) stays uncovered, so it's fetched again.
+        """
+        counts = {}
+        for ts in rows[:, 0]:
+            day = ist_day(ts)
+            counts[day] = counts.get(day, 0) + 1
+        complete = []
+        for day in days:
+            count = counts.get(day, 0)
+            if resolution == "1":
+                expected = int((trading_calendar.session_close(day) - trading_calendar.session_open(day)).total_seconds() // 60)
+            else:
+                expected = 1
+            if count >= expected:
+                complete.append(day)
+            else:
+                self.logger.warning(f"_complete_days(): {resolution} {day}: {count} of {expected} bars, not marking it covered")
+        return complete
+
+    def write(self, name, resolution, rows, days):
+        """Merge broker rows (a newer bar replaces the same timestamp) and mark the days they fully cover as covered"""
+        with self._lock:
+            rows = np.array(rows, dtype=np.float64).reshape(-1, 6)
+            months = {}
+            for day in self._complete_days(resolution, rows, days):
+                months.setdefault(day.strftime("%Y-%m"), ([], []))[1].append(day.toordinal())
+            for row in rows:
+                month = ist_day(row[0]).strftime("%Y-%m")
+                months.setdefault(month, ([], []))[0].append(row)
+            for month, (month_rows, month_days) in months.items():
+                self._write_partition(self._path(name, resolution, month), np.array(month_rows).reshape(-1, 6), month_days)
+
+    def _write_partition(self, path, rows, days):
+        if (path / "days.npy").exists():
+            old = self._load(path, mmap_mode=None)
+            ts = np.concatenate([old["ts"], rows[:, 0].astype(np.int64)])
+            values = {column: np.concatenate([old[column], rows[:, i]]) for i, column in enumerate(COLUMNS) if column != "ts"}
+            days = np.union1d(old["days"], days)
+        else:
+            ts = rows[:, 0].astype(np.int64)
+            values = {column: rows[:, i] for i, column in enumerate(COLUMNS) if column != "ts"}
+            days = np.unique(np.array(days, dtype=np.int64))
+        # Sorted unique timestamps, the last copy of a timestamp wins
+        _, last = np.unique(ts[::-1], return_index=True)
+        keep = len(ts) - 1 - last
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        tmp.mkdir(parents=True, exist_ok=True)
+        np.save(tmp / "ts.npy", ts[keep])
+        for column, value in values.items():
+            np.save(tmp / f"{column}.npy", value[keep])
+        np.save(tmp / "days.npy", days.astype(np.int64))
+        if path.exists():
+            stale = path.with_name(path.name + f".old{os.getpid()}")
+            path.rename(stale)
+            tmp.rename(path)
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            tmp.rename(path)
+
+    def last_complete_session(self):
+        """Today once it has closed and the broker's bars have settled, else the previous session"""
+        today = date.today()
+        if trading_calendar.is_trading_day(today) and datetime.now() >= trading_calendar.session_close(today) + SETTLE_AFTER_CLOSE:
+            return today
+        return trading_calendar.prev_trading_day(today)
+
+    def missing_chunks(self, name, resolution, start, end):
+        """Runs of sessions between start and end not in the archive, each within one history call"""
+        covered = self.covered(name, resolution)
+        chunks = []
+        for day in trading_calendar.trading_days(start, end):
+            if day in covered:
+                continue
+            if chunks and chunks[-1][-1] == trading_calendar.prev_trading_day(day) and (day - chunks[-1][0]).days < CHUNK_DAYS[resolution]:
+                chunks[-1].append(day)
+            else:
+                chunks.append([day])
+        return chunks
+
+    async def broker_symbol(self, name):
+        symbol = ARCHIVE_SYMBOLS[name]
+        if name.endswith("-FUT"):
+            await instruments.refresh()
+            return instruments.future(symbol)
+        return symbol
+
+    async def _fetch_chunk(self, name, symbol, resolution, days, semaphore):
+        async with semaphore:
+            data = {
+                "symbol": symbol,
+                "resolution": resolution,
+                "date_format": "1",
+                "range_from": days[0].strftime('%Y-%m-%d'),
+                "range_to": days[-1].strftime('%Y-%m-%d'),
+                "cont_flag": 1
+                }
+            try:
+                response = await fyers_gateway.history(data)
+            except Exception as e:
+                self.logger.error(f"_fetch_chunk(): {name} {resolution} {days[0]} - {days[-1]}: {e}")
+                return False
+            if response.get('code') != 200 or response.get('s') not in ("ok", "no_data"):
+                self.logger.error(f"_fetch_chunk(): {name} {resolution} {days[0]} - {days[-1]}: {response}")
+                return False
+        await asyncio.to_thread(self.write, name, resolution, response.get("candles") or [], days)
+        self.logger.info(f"_fetch_chunk(): {name} {resolution} {days[0]} - {days[-1]}: {len(response.get('candles') or [])} bars")
+        return True
+
+    async def backfill(self, start, end=None, names=None, resolutions=("1", "1D"), concurrency=4):
+        """
+            Download every session missing between start and end (default last complete session).
+            Chunks run concurrently, the gateway's rate limiter paces them behind live traffic.
+            Returns the number of chunks that failed, run it again to retry them.
+        """
+        end = end or self.last_complete_session()
+        semaphore = asyncio.Semaphore(concurrency)
+        jobs = []
+        for name in names or ARCHIVE_SYMBOLS:
+            symbol = await self.broker_symbol(name)
+            if symbol is None:
+                self.logger.error(f"backfill(): No broker symbol for {name}")
+                continue
+            for resolution in resolutions:
+                chunks = await asyncio.to_thread(self.missing_chunks, name, resolution, start, end)
+                self.logger.info(f"backfill(): {name} {resolution}: {len(chunks)} chunks to fetch")
+                jobs.extend(self._fetch_chunk(name, symbol, resolution, days, semaphore) for days in chunks)
+        results = await asyncio.gather(*jobs)
+        return results.count(False)
+
+    async def append(self):
+        """Evening top-up: sessions of the past week up to the last complete one that aren't archived yet"""
+        end = self.last_complete_session()
+        return await self.backfill(trading_calendar.prev_trading_day(end - timedelta(days=7)), end)
+
+    async def session(self, symbol, resolution, day):
+        """Archived candles of a broker symbol's session, None if that session isn't archived"""
+        name = archive_name(symbol)
+        path = self._path(name, resolution, day.strftime("%Y-%m"))
+        if name not in ARCHIVE_SYMBOLS or not (path / "days.npy").exists():
+            return None
+        if day.toordinal() not in np.load(path / "days.npy", mmap_mode="r"):
+            return None
+        candles = self.read(name, resolution, day)
+        return candles if len(candles) else None
+
+
+archive = LibertyArchive()
@@ -1,16 +1,21 @@
 import asyncio
 import threading
 from datetime import datetime, time
-import pandas as pd
-import math
 
 from app.utils.logging import get_logger
+from app.utils.scheduler import scheduler
 from app.config import settings
-from fyers_apiv3.FyersWebsocket import data_ws
 from app.slack import slack
 from app.fyers.oms.nifty_tf_oms import Nifty_OMS
+from app.nifty_tf.strategy_state import strategy_state
 from app.nifty_tf.market_data import LibertyMarketData
 from app.nifty_tf.trigger import LibertyTrigger
+from app.nifty_tf.candle_aggregator import candle_aggregator
+from app.fyers.market_feed import market_feed
+from app.utils.latency import trade_latency
+from app.utils.dispatch import dispatcher
+from app.nifty_tf.trail import LibertyTrail
+from app.nifty_tf.playbook import trail_levels
 
 class LibertyBreakout:
     def __init__(self, db, fyers):
@@ -29,7 +34,8 @@ class LibertyBreakout:
         self.state = {
             "triggered": False,
             "direction": None,
-            "price": None
+            "price": None,
+            "timeline": None # Trade latency, from the breaking tick
         }
 
         # Internal control
@@ -50,10 +56,15 @@ class LibertyBreakout:
             "sl_price": 0,
             "exit_executed": False
         }
+        self.sl_armed_event = asyncio.Event() # Set once sl() has filled sl_state (or failed), trail_sl waits on it
+        self.sl_hit_event = asyncio.Event() # Only gets set if the SL is hit
 
         # OMS
         self.place_order = Nifty_OMS(db, fyers)
 
+        # Trailing stop of the open position (trail_sl)
+        self.trail = None
+
         # Add last known LTP tracking
         self.last_ltp = None
         self.threshold_lock = threading.Lock()        
@@ -61,8 +72,8 @@ class LibertyBreakout:
 
     async def monitor_breakouts(self, *, swh_price=None, swl_price=None):
         """
-        Register new thresholds. On first call only, spins up a single
-        background WebSocket thread that watches both SWH and SWL.
+        Register new thresholds. On first call only, subscribes a single
+        market feed watcher that checks both SWH and SWL.
         Subsequent calls just update the thresholds immediately.
         """
         swh_set = False
@@ -106,7 +117,7 @@ class LibertyBreakout:
         if start_watcher:
             asyncio.create_task(self._watch_for_breakout())
             # status update also outside the lock
-            asyncio.create_task(self.db.update_status(status='Awaiting Breakout'))        
+            strategy_state.set_status('Awaiting Breakout')        
 
     async def wait_for_breakout(self):
         """
@@ -126,118 +137,82 @@ class LibertyBreakout:
         self.logger.info("Breakout event received")
         return self.state  # so caller can inspect direction & price
 
+    async def start_candle_feed(self):
+        """
+        Build candles from the futures ticks of the shared market feed before any
+        threshold is registered, so swing detection and triggers act on bar close.
+        """
+        candle_aggregator.track(self.futures_symbol)
+
     async def _watch_for_breakout(self):
         """
-        Internally fire a thread that connects to Fyers WebSocket and
-        signals the asyncio Event on the first breach.
+        Subscribe to the shared market feed and signal the asyncio Event
+        on the first breach.
         """
-        loop = asyncio.get_event_loop()
-        thread = threading.Thread(
-            target=self._run_ws_thread,
-            args=(self._done_event, loop),
-            daemon=True
-        )
-        thread.start()
+        candle_aggregator.track(self.futures_symbol)
+        queue = market_feed.subscribe(self.futures_symbol)
+        asyncio.create_task(self._watch_ticks(queue, self._done_event))
         self.logger.info("_watch_for_breakout(): Breakout watcher started")
         await slack.send_message(f"_watch_for_breakout(): Breakout watcher started")
 
-    def _run_ws_thread(self, done_event: asyncio.Event, loop: asyncio.AbstractEventLoop):
+    async def _watch_ticks(self, queue, done_event: asyncio.Event):
         """
-        Background thread: subscribes to SymbolUpdate and
-        calls done_event.set() thread‐safely upon breakout.
+        Consumes SymbolUpdate ticks from the market feed and
+        sets done_event upon breakout.
         """
-        def on_message(msg):
-            
-            if not isinstance(msg, dict) or msg.get("type") != "sf":
-                return
-
-            ltp = msg.get("ltp")
-            if self.state["triggered"]:
-                return
+        try:
+            while not self.state["triggered"]:
+                msg = await queue.get()
+                ltp = msg.get("ltp")
+                if ltp is None:
+                    continue
+
+                with self.threshold_lock:
+                    direction = None
+                    price = None
+
+                    # Buy signal: LTP crosses above SWH
+                    if self.swh_price is not None:
+                        if ltp >= self.swh_price:
+                            direction, price = "Buy", ltp
+                            self.logger.info(f"SWH crossed upward: {ltp} (threshold: {self.swh_price})")
+
+                    # Sell signal: LTP crosses below SWL
+                    if self.swl_price is not None and direction is None:
+                        if ltp <= self.swl_price:
+                            direction, price = "Sell", ltp
+                            self.logger.info(f"SWL crossed downward: {ltp} (threshold: {self.swl_price})")
 
-            with self.threshold_lock:
-                # Track previous LTP for crossing detection
-                # prev_ltp = self.last_ltp
-                # self.last_ltp = ltp
-                
-                # # Skip if this is the first LTP or no thresholds set
-                # if prev_ltp is None:
-                #     return
-                
-                # Check for actual threshold crossing (not just being beyond threshold)
-                direction = None
-                price = None
-                
-                # Buy signal: LTP crosses above SWH
-                if self.swh_price is not None:
-                    # if prev_ltp < self.swh_price and ltp >= self.swh_price:
-                    if ltp >= self.swh_price:
-                        direction, price = "Buy", ltp
-                        self.logger.info(f"SWH crossed upward: {ltp} (threshold: {self.swh_price})")
-                        # self.logger.info(f"SWH crossed upward: {prev_ltp} → {ltp} (threshold: {self.swh_price})")
-                
-                # Sell signal: LTP crosses below SWL
-                if self.swl_price is not None and direction is None:
-                    # if prev_ltp > self.swl_price and ltp <= self.swl_price:
-                    if ltp <= self.swl_price:
-                        direction, price = "Sell", ltp
-                        # self.logger.info(f"SWL crossed downward: {prev_ltp} → {ltp} (threshold: {self.swl_price})")
-                        self.logger.info(f"SWL crossed downward: {ltp} (threshold: {self.swl_price})")
-                
                 # No crossing detected
                 if direction is None:
-                    return
-
-            self.logger.info(f"Breakout → {direction} at {price}")
-            
-            # FIXED: Update state atomically and only signal if complete
-            self.state["triggered"] = True
-            self.state["direction"] = direction
-            self.state["price"] = price
-
-            try:
-                ws.unsubscribe(symbols=[self.futures_symbol], data_type="SymbolUpdate")
-            except Exception as e:
-                self.logger.error(f"Error unsubscribing: {e}")
-
-            # signal the asyncio waiter
-            loop.call_soon_threadsafe(done_event.set)
-
-        def on_error(err):
-            self.logger.error(f"WebSocket error: {err}")
-
-        def on_close(msg):
-            self.logger.info("WebSocket closed")
-
-        def on_connect():
-            self.logger.info(f"WebSocket connected—subscribing {self.futures_symbol}")
-            ws.subscribe(symbols=[self.futures_symbol], data_type="SymbolUpdate")
-            ws.keep_running()
-
-        ws = data_ws.FyersDataSocket(
-            access_token=self.access_token,
-            log_path="",
-            litemode=False,
-            write_to_file=False,
-            reconnect=True,
-            on_connect=on_connect,
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close,
-        )
-        ws.connect()  # blocks until closed
-
-    async def sl(self, side, symbol):
+                    continue
+
+                timeline = trade_latency.begin("nifty", tick_at=msg.get("received_at"))
+                timeline.mark("decision")
+                self.logger.info(f"Breakout → {direction} at {price}")
+                self.state["timeline"] = timeline
+                self.state["triggered"] = True
+                self.state["direction"] = direction
+                self.state["price"] = price
+
+                # signal the asyncio waiter
+                done_event.set()
+        finally:
+            market_feed.unsubscribe(self.futures_symbol, queue)
+
+    async def sl(self, side, symbol, playbook=None, timeline=None):
         try:
-            if side == "Buy":
-                entry_price = await self.db.fetch_swing_price(swing="swhPrice")
+            if playbook is not None:
+                entry_price, sl_price = playbook.swing_price, playbook.sl_price
+            elif side == "Buy":
+                entry_price = strategy_state.trigger.swhPrice
                 if entry_price is None:
-                    raise Exception("swhPrice not found in database")
+                    raise Exception("swhPrice not set")
                 sl_price = round(entry_price - (entry_price * self.sl_percent))            
             else:  # Sell
-                entry_price = await self.db.fetch_swing_price(swing="swlPrice")
+                entry_price = strategy_state.trigger.swlPrice
                 if entry_price is None:
-                    raise Exception("swlPrice not found in database")
+                    raise Exception("swlPrice not set")
                 sl_price = round(entry_price + (entry_price * self.sl_percent))
                 self.logger.info(f"SL price set at {sl_price} for Sell position")
 
@@ -254,81 +229,54 @@ class LibertyBreakout:
                     "exit_executed": False
                 }
 
-            # Start WebSocket in separate thread
-            ws_thread = threading.Thread(
-                target=self._start_sl_websocket,
-                daemon=True
-            )
-            ws_thread.start()
-            self.logger.info(f"SL websocket started in background thread")
-
-            # An event that only gets set if the SL is hit
-            sl_hit_event = asyncio.Event()        
-            self.sl_hit_event = sl_hit_event    
-            await self.sl_hit_event.wait()
+            # Check every tick on the feed thread, SL exits come back to this loop
+            dispatcher.bind()
+            candle_aggregator.track(self.futures_symbol)
+            market_feed.add_listener(self.futures_symbol, self._on_sl_tick)
+            self.logger.info(f"SL monitor subscribed to market feed")
+            self.sl_armed_event.set()
+            if timeline is not None:
+                timeline.mark("sl_armed")
+            try:
+                await self.sl_hit_event.wait()
+            finally:
+                market_feed.remove_listener(self.futures_symbol, self._on_sl_tick)
             self.logger.info("SL hit event received, SL task completing")
             return True
         
         except Exception as e:
+            self.sl_armed_event.set() # Nothing to trail, don't leave trail_sl waiting
             self.logger.error(f"sl(): Error in SL: {e}")
             await slack.send_message(f"sl(): Error in SL: {e}")
             return False
     
-    def _start_sl_websocket(self):
-        def on_message(msg):
-            # Skip if not relevant message
-            if not isinstance(msg, dict) or msg.get("type") != "sf":
+    def _on_sl_tick(self, msg):
+        """Market feed listener, runs on the socket thread. Only checks the SL, the exit is dispatched to the loop"""
+        ltp = msg.get("ltp")
+        if ltp is None:
+            return
+        # Thread-safe access to SL state
+        with self.sl_lock:
+            # Stop if not active or already exited
+            if not self.sl_state["active"] or self.sl_state["exit_executed"]:
                 return
-
-            ltp = msg.get("ltp")
-            if ltp is None:
+            side = self.sl_state["side"]
+            sl_price = self.sl_state["sl_price"]
+            symbol = self.sl_state["symbol"]
+            sl_hit = (side == "Buy" and ltp <= sl_price) or (side == "Sell" and ltp >= sl_price)
+            if not sl_hit:
                 return
-                
-            # Thread-safe access to SL state
+            self.sl_state["active"] = False # Only the first hit exits
+        dispatcher.dispatch("sl_exit", self._exit_on_sl, symbol, ltp, sl_price)
+
+    async def _exit_on_sl(self, symbol, ltp, sl_price):
+        """Runs on the event loop"""
+        self.logger.info(f"SL hit for position. LTP: {ltp}, SL: {sl_price}")
+        try:
+            await self.place_order.exit_single_position(symbol=symbol)
+        finally:
             with self.sl_lock:
-                # Skip if not active or already exited
-                if not self.sl_state["active"] or self.sl_state["exit_executed"]:
-                    return
-                    
-                side = self.sl_state["side"]
-                sl_price = self.sl_state["sl_price"]
-                symbol = self.sl_state["symbol"]
-                if (side == "Buy" and ltp <= sl_price) or (side == "Sell" and ltp >= sl_price):
-                    self.logger.info(f"SL hit for position. LTP: {ltp}, SL: {sl_price}")
-                    asyncio.run(self.place_order.exit_single_position(symbol=symbol))
-                    self.sl_state["exit_executed"] = True
-                    self.sl_state["active"] = False
-                    if hasattr(self, 'sl_hit_event'):
-                        asyncio.run(self._set_sl_hit_event())                    
-        
-        def on_error(err):
-            self.logger.error(f"SL WebSocket error: {err}")
-        
-        def on_close(msg):
-            self.logger.info("SL WebSocket closed")
-        
-        def on_connect():
-            self.logger.info(f"SL WebSocket connected—subscribing {self.futures_symbol}")
-            ws.subscribe(symbols=[self.futures_symbol], data_type="SymbolUpdate")
-            ws.keep_running()
-        
-        # Create and connect WebSocket
-        ws = data_ws.FyersDataSocket(
-            access_token=self.access_token,
-            log_path="",
-            litemode=False,
-            write_to_file=False,
-            reconnect=True,
-            on_connect=on_connect,
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close,
-            reconnect_retry=10
-        )        
-        ws.connect()
-
-    async def _set_sl_hit_event(self):
-        if hasattr(self, 'sl_hit_event'):
+                self.sl_state["exit_executed"] = True
             self.sl_hit_event.set()
 
     async def update_sl_price(self, new_sl_price) -> None:        
@@ -357,229 +305,53 @@ class LibertyBreakout:
             self.logger.info(f"No trailing required for {new_sl_price}")
 
 
-    async def trail_sl(self, orderID):        
+    def _on_trail_tick(self, msg):
+        """Market feed listener, runs on the socket thread. New SL prices go to the loop"""
+        ltp = msg.get("ltp")
+        if ltp is None or self.trail is None:
+            return
+        new_sl_price = self.trail.update(ltp, datetime.now().time())
+        if new_sl_price is not None:
+            self.logger.info(f"maxRR: {round(self.trail.max_rr, 2)}, entry price: {self.trail.entry_price}, new SL price: {new_sl_price}")
+            dispatcher.dispatch("trail", self.update_sl_price, new_sl_price)
+
+    async def trail_sl(self, orderID, playbook=None):
         try:
             self.logger.info(f"trail_sl(): Order ID Received: {orderID} Type: {type(orderID)}")
-            order_time = await self.db.fetch_timestamp(str(orderID))
-            if order_time is None:
-                await asyncio.sleep(5)
-                order_time = await self.db.fetch_timestamp(str(orderID))
-            # order_time = datetime.strptime(order_time, '%d-%b-%Y %H:%M:%S').replace(second=0) 
-            order_time = datetime.strptime(order_time, '%Y-%m-%d %H:%M:%S').replace(second=0)
-            order_time = pd.Timestamp(order_time).tz_localize('Asia/Kolkata')
+            await self.sl_armed_event.wait() # sl_state is filled in by sl()
             with self.sl_lock:
                 initial_sl_price = self.sl_state["sl_price"]
                 side = self.sl_state["side"]
                 if self.sl_state["exit_executed"]:
                     self.logger.info("SL already hit, stopping trailing")
                     return                
+                if not self.sl_state["active"]:
+                    self.logger.info("trail_sl(): SL not active (hit or never armed), not trailing")
+                    return
             self.logger.info(f"trail_sl(): Starting SL monitor for {side} position")        
-            if side == "Buy":
-                entry_price = await self.db.fetch_swing_price(swing="swhPrice") + 1
-                initial_sl_points = round(abs(entry_price - initial_sl_price))
+            if playbook is not None:
+                entry_price, initial_sl_points = playbook.trail_entry, playbook.initial_sl_points
+                levels = playbook.trail_levels
             else:
-                entry_price = await self.db.fetch_swing_price(swing="swlPrice") - 1
-                initial_sl_points = round(abs(initial_sl_price - entry_price))
-
-            maxRR = 0
-            while datetime.now().time() < time(15, 13):
-
-                # Until 1:30 PM Trail
-                while datetime.now().time() < time(13, 30):
-                    with self.sl_lock:
-                        if self.sl_state["exit_executed"]:
-                            self.logger.info("SL hit during trailing, stopping trailing logic")
-                            return                    
-                    min1_data_df = await self.LibertyMarketData.fetch_1min_data()
-                    min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                    filtered_df = min1_data_df[min1_data_df['timestamp'] >= order_time]
-
-                    if not len(filtered_df[1:]) > 0:
-                        next_check = await self.trigger.get_next_1min_interval()
-                        await self.trigger.wait_until_time(next_check)                        
-                        min1_data_df = await self.LibertyMarketData.fetch_1min_data()
-                        min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                        filtered_df = min1_data_df[min1_data_df['timestamp'] > order_time] # Checking from next minute of Order time stamp
-
-                    # Initialize new_sl_price to None
-                    new_sl_price = None
-
-                    if side == "Buy":
-                        curr_RR = round(((filtered_df[1:]['high'].max() - entry_price)/initial_sl_points),2)
-                        maxRR = max(maxRR,curr_RR)
-                        if maxRR >= 2:
-                            new_sl_price = math.floor(entry_price - (initial_sl_points * 0.5)) # Trailing 50%
-                            await self.update_sl_price(new_sl_price)
-                                                        
-                    else:
-                        curr_RR = round(((entry_price - filtered_df[1:]['low'].min())/initial_sl_points),2)
-                        maxRR = max(maxRR,curr_RR)
-                        if maxRR >= 2:
-                            new_sl_price = math.ceil(entry_price + (initial_sl_points * 0.5)) # Trailing 50%
-                            await self.update_sl_price(new_sl_price)
-
-                    self.logger.info(f"maxRR: {maxRR}, current RR: {curr_RR}, entry price: {entry_price}, new SL price: {new_sl_price}")                                    
-                    next_check = await self.trigger.get_next_1min_interval()
-                    await self.trigger.wait_until_time(next_check)
-
-                # 1:30 - 2:30 PM Trail
-                maxRR = 0 # Resetting max RR
-                while datetime.now().time() > time(13, 30) and datetime.now().time() < time(14, 30):
-                    with self.sl_lock:
-                        if self.sl_state["exit_executed"]:
-                            self.logger.info("SL hit during trailing, stopping trailing logic")
-                            return                    
-                    min1_data_df = await self.LibertyMarketData.fetch_1min_data()
-                    min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                    filtered_df = min1_data_df[min1_data_df['timestamp'] >= order_time]
-
-                    if not len(filtered_df[1:]) > 0:
-                        next_check = await self.trigger.get_next_1min_interval()
-                        await self.trigger.wait_until_time(next_check)
-                        min1_data_df = await self.LibertyMarketData.fetch_1min_data()
-                        min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                        filtered_df = min1_data_df[min1_data_df['timestamp'] >= order_time]
-
-                    # Initialize new_sl_price to None
-                    new_sl_price = None
-
-                    if side == "Buy":
-                        curr_RR = round(((filtered_df[1:]['high'].max() - entry_price)/initial_sl_points),2)
-                        maxRR = max(maxRR,curr_RR)
-
-                        if maxRR >= 1 and maxRR < 2.00:
-                            new_sl_price = math.floor(entry_price - (initial_sl_points * 0.5)) # Trailing 50%
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.00 and maxRR < 2.50:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 0.5)) # Taking 0.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.50 and maxRR < 3.00:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1)) # Taking 1R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.00 and maxRR < 3.25:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1.25)) # Taking 1.25R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.25 and maxRR < 3.50:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1.5)) # Taking 1.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.5:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1.75)) # Taking 1.75R
-                            await self.update_sl_price(new_sl_price)
-                            
-                    else:
-                        curr_RR = round(((entry_price - filtered_df[1:]['low'].min())/initial_sl_points),2)
-                        maxRR = max(maxRR,curr_RR)
-
-                        if maxRR >= 1 and maxRR < 2.00:
-                            new_sl_price = math.ceil(entry_price + (initial_sl_points * 0.5)) # Trailing 50%
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.00 and maxRR < 2.50:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 0.5)) # Taking 0.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.50 and maxRR < 3.00:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1)) # Taking 1R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.00 and maxRR < 3.25:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1.25)) # Taking 1.25R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.25 and maxRR < 3.50:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1.5)) # Taking 1.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.5:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1.75)) # Taking 1.75R
-                            await self.update_sl_price(new_sl_price)
-
-                    self.logger.info(f"maxRR: {maxRR}, current RR: {curr_RR}, entry price: {entry_price}, new SL price: {new_sl_price}")                                                        
-                    next_check = await self.trigger.get_next_1min_interval()
-                    await self.trigger.wait_until_time(next_check)
-
-                # 2:30 - 3:08 PM Trail
-                maxRR = 0 # Resetting max RR
-                while datetime.now().time() > time(14, 30) and datetime.now().time() < time(15, 13):
-                    with self.sl_lock:
-                        if self.sl_state["exit_executed"]:
-                            self.logger.info("SL hit during trailing, stopping trailing logic")
-                            return                    
-                    min1_data_df = await self.LibertyMarketData.fetch_1min_data()
-                    min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                    filtered_df = min1_data_df[min1_data_df['timestamp'] >= order_time]
-
-                    if not len(filtered_df[1:]) > 0:
-                        next_check = await self.trigger.get_next_1min_interval()
-                        await self.trigger.wait_until_time(next_check)
-                        min1_data_df = await self.LibertyMarketData.fetch_1min_data()
-                        min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                        filtered_df = min1_data_df[min1_data_df['timestamp'] >= order_time]                        
-                    
-                    # Initialize new_sl_price to None
-                    new_sl_price = None
-
-                    if side == "Buy":
-                        curr_RR = round(((filtered_df[1:]['high'].max() - entry_price)/initial_sl_points),2)
-                        maxRR = max(maxRR,curr_RR)
-
-                        if maxRR >= 1 and maxRR < 2.00:
-                            new_sl_price = math.floor(entry_price - (initial_sl_points * 0.5)) # Trailing 50%
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.00 and maxRR < 2.50:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 0.5)) # Taking 0.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.50 and maxRR < 3.00:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1)) # Taking 1R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.00 and maxRR < 3.25:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1.25)) # Taking 1.25R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.25 and maxRR < 3.50:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1.5)) # Taking 1.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.5:
-                            new_sl_price = math.floor(entry_price + (initial_sl_points * 1.75)) # Taking 1.75R
-                            await self.update_sl_price(new_sl_price)
-                            
-                    else:
-                        curr_RR = round(((entry_price - filtered_df[1:]['low'].min())/initial_sl_points),2)
-                        maxRR = max(maxRR,curr_RR)
-
-                        if maxRR >= 1 and maxRR < 2.00:
-                            new_sl_price = math.ceil(entry_price + (initial_sl_points * 0.5)) # Trailing 50%
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 2.00 and maxRR < 2.50:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1)) # Taking 1R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.00 and maxRR < 3.25:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1.25)) # Taking 1.25R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.25 and maxRR < 3.50:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1.5)) # Taking 1.5R
-                            await self.update_sl_price(new_sl_price)
-                            
-                        if maxRR >= 3.5:
-                            new_sl_price = math.ceil(entry_price - (initial_sl_points * 1.75)) # Taking 1.75R
-                            await self.update_sl_price(new_sl_price)
-
-                    self.logger.info(f"maxRR: {maxRR}, current RR: {curr_RR}, entry price: {entry_price}, new SL price: {new_sl_price}")                                                        
-                    next_check = await self.trigger.get_next_1min_interval()
-                    await self.trigger.wait_until_time(next_check)
-
+                if side == "Buy":
+                    entry_price = strategy_state.trigger.swhPrice + 1
+                    initial_sl_points = round(abs(entry_price - initial_sl_price))
+                else:
+                    entry_price = strategy_state.trigger.swlPrice - 1
+                    initial_sl_points = round(abs(initial_sl_price - entry_price))
+                levels = trail_levels(side, entry_price, initial_sl_points)
+
+            # Rules in trail.TRAIL_RULES, evaluated on every tick against the running high/low
+            self.trail = LibertyTrail(side, entry_price, initial_sl_points, levels, entered_at=datetime.now().time())
+            dispatcher.bind()
+            market_feed.add_listener(self.futures_symbol, self._on_trail_tick)
+            try:
+                await asyncio.wait_for(self.sl_hit_event.wait(), timeout=scheduler.seconds_until(time(15, 13)))
+                self.logger.info("SL hit during trailing, stopping trailing logic")
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                market_feed.remove_listener(self.futures_symbol, self._on_trail_tick)
             return
             
         except Exception as e:
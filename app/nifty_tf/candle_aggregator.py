@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from app.utils.logging import get_logger
+from app.utils.scheduler import scheduler
+from app.nifty_tf.candle_cache import candle_cache
+from app.fyers.market_feed import market_feed
+
+class LibertyCandleAggregator:
+    """
+        Builds 1min/5min OHLCV bars from SymbolUpdate ticks of the shared market feed.
+        Ticks go straight into the shared candle cache, so fetch_1min_data/fetch_5min_data
+        stop hitting fyers.history while the feed is live.
+        Every time a bar closes it's published to the asyncio side:
+        - subscribe() hands out a queue of closed bars
+        - wait_for_close() awaits the next closed bar (falls back to the wall clock if the feed is down)
+        on_tick() is a market feed listener (socket thread), everything else runs on the event loop.
+    """
+    def __init__(self):
+        self.logger = get_logger("CandleAggregator")
+        self._lock = threading.Lock()
+        self._loop = None
+        self._tracked = set()
+        self._last_volume = {} # symbol -> vol_traded_today of the last tick
+        self._last_tick = {} # symbol -> time.monotonic() of the last tick
+        self._feed_started = {} # symbol -> time.time() of the first tick after a gap
+        self._subscribers = {} # (symbol, resolution) -> list of asyncio.Queue
+        self._waiters = {} # (symbol, resolution) -> list of asyncio.Future
+        self.stale_after = 5 # Seconds without a tick before the feed is treated as down
+        self.resolutions = ("1", "5")
+
+    def attach(self, loop=None):
+        """Remember the loop closed bars are published to. Called from the loop."""
+        self._loop = loop or asyncio.get_running_loop()
+
+    def track(self, symbol):
+        """Start building candles for symbol from the shared market feed. Called from the loop."""
+        self.attach()
+        if symbol in self._tracked:
+            return
+        self._tracked.add(symbol)
+        market_feed.add_listener(symbol, self.on_tick)
+        self.logger.info(f"track(): Building candles from ticks for {symbol}")
+
+    def on_tick(self, msg):
+        """SymbolUpdate callback, runs on the socket thread"""
+        if not isinstance(msg, dict) or msg.get("type") != "sf":
+            return
+        symbol = msg.get("symbol")
+        ltp = msg.get("ltp")
+        if symbol is None or ltp is None:
+            return
+        ts = msg.get("last_traded_time") or msg.get("exch_feed_time") or time.time()
+
+        with self._lock:
+            now = time.monotonic()
+            last_tick = self._last_tick.get(symbol)
+            if last_tick is None or now - last_tick > self.stale_after:
+                self._feed_started[symbol] = time.time()
+            self._last_tick[symbol] = now
+
+            # SymbolUpdate only carries the day's cumulative volume
+            volume = 0
+            cum_volume = msg.get("vol_traded_today")
+            if cum_volume is not None:
+                last_volume = self._last_volume.get(symbol)
+                if last_volume is not None and cum_volume > last_volume:
+                    volume = cum_volume - last_volume
+                if last_volume is None or cum_volume > last_volume:
+                    self._last_volume[symbol] = cum_volume
+
+            closed = candle_cache.update_tick(symbol, ts, ltp, volume)
+
+        if closed is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._publish, symbol, closed)
+
+    def is_live(self, symbol):
+        """
+            True when ticks are flowing for symbol and the cache was filled from the broker
+            after the feed (re)started, i.e. the cache has no hole the ticks didn't cover.
+        """
+        with self._lock:
+            last_tick = self._last_tick.get(symbol)
+            if last_tick is None or time.monotonic() - last_tick > self.stale_after:
+                return False
+            feed_started = self._feed_started.get(symbol, 0)
+        return candle_cache.refreshed_at(symbol) >= feed_started
+
+    def _publish(self, symbol, bar):
+        """Runs on the loop with a freshly closed 1min bar"""
+        self._deliver(symbol, "1", bar)
+
+        # 5min bar closes with the 1min bar at minute 4 of its bucket
+        if (bar[0] + 60) % 300 == 0:
+            bucket = bar[0] - (bar[0] % 300)
+            for bar5 in reversed(candle_cache.candles(symbol, "5")):
+                if bar5[0] == bucket:
+                    self._deliver(symbol, "5", bar5)
+                    break
+
+    def _deliver(self, symbol, resolution, bar):
+        key = (symbol, resolution)
+        for queue in self._subscribers.get(key, []):
+            if queue.full():
+                queue.get_nowait() # Slow consumer, drop the oldest bar
+            queue.put_nowait(list(bar))
+        for waiter in self._waiters.pop(key, []):
+            if not waiter.done():
+                waiter.set_result(list(bar))
+
+    def subscribe(self, symbol, resolution="5", maxsize=100):
+        """Queue that receives every closed bar for symbol/resolution"""
+        self.attach()
+        queue = asyncio.Queue(maxsize=maxsize)
+        self._subscribers.setdefault((symbol, resolution), []).append(queue)
+        return queue
+
+    def unsubscribe(self, symbol, resolution, queue):
+        queues = self._subscribers.get((symbol, resolution), [])
+        if queue in queues:
+            queues.remove(queue)
+
+    async def wait_for_close(self, symbol, resolution="5", settle=0):
+        """
+            Wait for the next bar close of symbol.
+            Returns the closed bar when the feed is live, otherwise sleeps until the next
+            wall clock boundary (+ settle seconds so REST has the bar) and returns None.
+        """
+        self.attach()
+        seconds = int(resolution) * 60
+        boundary = time.time() // seconds * seconds + seconds
+        if self.is_live(symbol):
+            waiter = self._loop.create_future()
+            self._waiters.setdefault((symbol, resolution), []).append(waiter)
+            try:
+                # Still bounded by the clock in case the feed dies mid-bar
+                timeout = boundary - time.time() + self.stale_after + settle
+                return await asyncio.wait_for(waiter, timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                self.logger.warning(f"wait_for_close(): No {resolution}min close from feed for {symbol}, falling back to clock")
+                return None
+        await scheduler.at(datetime.fromtimestamp(boundary + settle), f"close_{resolution}")
+        return None
+
+
+candle_aggregator = LibertyCandleAggregator()
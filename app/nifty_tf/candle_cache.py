@@ -0,0 +1,137 @@
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+
+from app.utils.logging import get_logger
+from app.nifty_tf.candles import Candles
+
+CANDLE_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+def candles_frame(candles):
+    """Candles as a DataFrame in the same shape fyers.history returns"""
+    return pd.DataFrame({"timestamp": candles.ts, "open": candles.open, "high": candles.high, "low": candles.low, "close": candles.close, "volume": candles.volume}, columns=CANDLE_COLUMNS)
+
+class LibertyCandleCache:
+    """
+        Process wide intraday candle store.
+        Only 1min candles are fetched from the broker, per symbol, for the current session.
+        Each refresh asks for candles from the last cached bar onwards (that bar may still
+        have been forming when it was cached) and merges them in.
+        Higher resolutions (5min) are derived from the cached 1min candles, so both
+        resolutions cost a single history call.
+        The candle aggregator also writes WebSocket ticks in here, hence the lock.
+    """
+    def __init__(self):
+        self.logger = get_logger("CandleCache")
+        self._lock = threading.Lock()
+        self._session = None
+        self._candles = {} # symbol -> list of [timestamp, open, high, low, close, volume] 1min candles
+        self._refreshed_at = {} # symbol -> time.time() of the last broker merge
+        self._version = {} # symbol -> bumped on every change to its candles
+        self._arrays = {} # (symbol, resolution) -> (version, Candles)
+
+    def _check_session(self):
+        today = datetime.now().date()
+        if self._session != today:
+            self._session = today
+            self._candles = {}
+            self._refreshed_at = {}
+            self._version = {}
+            self._arrays = {}
+
+    def fetch_from(self, symbol):
+        """Epoch of the last cached 1min candle, None if nothing is cached for today"""
+        with self._lock:
+            self._check_session()
+            candles = self._candles.get(symbol)
+            if not candles:
+                return None
+            return int(candles[-1][0])
+
+    def refreshed_at(self, symbol):
+        """time.time() of the last broker merge for symbol, 0 if never"""
+        with self._lock:
+            self._check_session()
+            return self._refreshed_at.get(symbol, 0)
+
+    def merge(self, symbol, candles):
+        """Merge broker candles, anything at or after the first new timestamp is replaced"""
+        with self._lock:
+            self._check_session()
+            self._refreshed_at[symbol] = time.time()
+            if not candles:
+                return
+            self._version[symbol] = self._version.get(symbol, 0) + 1
+            cached = self._candles.setdefault(symbol, [])
+            first_ts = candles[0][0]
+            while cached and cached[-1][0] >= first_ts:
+                cached.pop()
+            cached.extend(list(c) for c in candles)
+
+    def update_tick(self, symbol, ts, ltp, volume=0):
+        """
+            Apply a single trade to the forming 1min candle.
+            Returns the 1min candle this tick closed (a copy), or None.
+        """
+        bucket = int(ts) - (int(ts) % 60)
+        with self._lock:
+            self._check_session()
+            self._version[symbol] = self._version.get(symbol, 0) + 1
+            cached = self._candles.setdefault(symbol, [])
+            if cached and cached[-1][0] == bucket:
+                bar = cached[-1]
+                bar[2] = max(bar[2], ltp)
+                bar[3] = min(bar[3], ltp)
+                bar[4] = ltp
+                bar[5] += volume
+                return None
+            if cached and cached[-1][0] > bucket:
+                return None # Late tick for a bar that's already gone
+            closed = list(cached[-1]) if cached else None
+            cached.append([bucket, ltp, ltp, ltp, ltp, volume])
+            return closed
+
+    def candles(self, symbol, resolution="1"):
+        """Cached candles as a list, resolution is in minutes ("1", "5" ...)"""
+        with self._lock:
+            self._check_session()
+            candles = [list(c) for c in self._candles.get(symbol, [])]
+        minutes = int(resolution)
+        if minutes == 1:
+            return candles
+
+        # 9:15 IST is 03:45 UTC, so epoch based buckets line up with the exchange's 5min/15min bars
+        bucket_size = minutes * 60
+        resampled = []
+        for ts, o, h, l, c, v in candles:
+            bucket = ts - (ts % bucket_size)
+            if resampled and resampled[-1][0] == bucket:
+                bar = resampled[-1]
+                bar[2] = max(bar[2], h)
+                bar[3] = min(bar[3], l)
+                bar[4] = c
+                bar[5] += v
+            else:
+                resampled.append([bucket, o, h, l, c, v])
+        return resampled
+
+    def arrays(self, symbol, resolution="1"):
+        """Cached candles as Candles (NumPy columns, shared so read only), rebuilt only when the symbol's candles changed"""
+        with self._lock:
+            self._check_session()
+            version = self._version.get(symbol, 0)
+            cached = self._arrays.get((symbol, resolution))
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            rows = self._candles.get(symbol, [])
+            candles = Candles.from_rows(rows).resample(int(resolution))
+            self._arrays[(symbol, resolution)] = (version, candles)
+            return candles
+
+    def frame(self, symbol, resolution="1"):
+        """Cached candles as a fresh DataFrame in the same shape fyers.history returns"""
+        return pd.DataFrame(self.candles(symbol, resolution), columns=CANDLE_COLUMNS)
+
+
+candle_cache = LibertyCandleCache()
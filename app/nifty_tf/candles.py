@@ -0,0 +1,112 @@
+from datetime import time as dtime
+import numpy as np
+
+IST_OFFSET = 19800 # +05:30 in seconds
+SESSION_START = 9 * 60 + 15 # 9:15 in minutes of the day
+
+class Candles:
+    """
+        Intraday candles as contiguous NumPy columns (epoch seconds + float OHLCV).
+        minute is the bar's minute from the 9:15 open in IST (0 is the 9:15 bar), worked out once,
+        so "bars after 10:05" is a searchsorted on ints instead of tz converting timestamps.
+        Slicing returns views, nothing is copied.
+    """
+    __slots__ = ("ts", "open", "high", "low", "close", "volume", "minute")
+
+    def __init__(self, ts, open, high, low, close, volume, minute=None):
+        self.ts = ts
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.minute = ((ts + IST_OFFSET) % 86400) // 60 - SESSION_START if minute is None else minute
+
+    @classmethod
+    def from_rows(cls, rows):
+        """From broker style [[ts, open, high, low, close, volume], ...]"""
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 6).T.copy() # One row per column, each contiguous
+        return cls(columns[0].astype(np.int64), columns[1], columns[2], columns[3], columns[4], columns[5])
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("Candles only slice, index the columns for single values")
+        return Candles(self.ts[index], self.open[index], self.high[index], self.low[index], self.close[index], self.volume[index], self.minute[index])
+
+    @staticmethod
+    def session_minute(at):
+        """Session minute of a time / datetime / 'HH:MM[:SS]' string, seconds are dropped"""
+        if isinstance(at, str):
+            parts = at.split(":")
+            hour, minute = int(parts[0]), int(parts[1])
+        else:
+            hour, minute = at.hour, at.minute
+        return hour * 60 + minute - SESSION_START
+
+    @staticmethod
+    def _has_seconds(at):
+        if isinstance(at, str):
+            parts = at.split(":")
+            return len(parts) > 2 and float(parts[2]) != 0
+        return bool(getattr(at, "second", 0) or getattr(at, "microsecond", 0))
+
+    def after(self, at):
+        """Bars that open strictly after time of day at"""
+        return self[np.searchsorted(self.minute, self.session_minute(at), side="right"):]
+
+    def index_at(self, at):
+        """Index of the bar opening exactly at time of day at, None if there isn't one"""
+        if self._has_seconds(at):
+            return None
+        minute = self.session_minute(at)
+        i = int(np.searchsorted(self.minute, minute))
+        if i < len(self) and self.minute[i] == minute:
+            return i
+        return None
+
+    @staticmethod
+    def clock(minute):
+        """'HH:MM:SS' (IST) of a session minute"""
+        minute = int(minute) + SESSION_START
+        return str(dtime(minute // 60, minute % 60))
+
+    def time_at(self, i):
+        """Opening time of bar i as 'HH:MM:SS' (IST)"""
+        return self.clock(self.minute[i])
+
+    def body(self):
+        """abs(close - open) per bar"""
+        return np.abs(self.close - self.open)
+
+    def rolling_max(self, window, column="high"):
+        """Max of column over each run of window bars, len(self) - window + 1 values"""
+        values = getattr(self, column)
+        if len(values) < window:
+            return values[:0]
+        return np.lib.stride_tricks.sliding_window_view(values, window).max(axis=1)
+
+    def rolling_min(self, window, column="low"):
+        """Min of column over each run of window bars, len(self) - window + 1 values"""
+        values = getattr(self, column)
+        if len(values) < window:
+            return values[:0]
+        return np.lib.stride_tricks.sliding_window_view(values, window).min(axis=1)
+
+    def resample(self, minutes):
+        """Bars of minutes minutes, epoch aligned (9:15 IST is 03:45 UTC, so they line up with the exchange's)"""
+        if minutes == 1 or len(self) == 0:
+            return self
+        buckets = self.ts - self.ts % (minutes * 60)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(self)] - 1
+        return Candles(
+            buckets[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            np.add.reduceat(self.volume, starts),
+        )
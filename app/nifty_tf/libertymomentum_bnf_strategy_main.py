@@ -4,11 +4,19 @@ import traceback
 
 from app.nifty_tf.range_bnf import LibertyRange
 from app.nifty_tf.breakout_bnf import LibertyBreakout
+from app.utils.calendar import trading_calendar
+from app.utils.scheduler import scheduler
 from app.utils.logging import get_logger
 from app.fyers.oms.nifty_tf_oms import Nifty_OMS
 from app.nifty_tf.swingFormation2 import LibertySwing
 from app.nifty_tf.trigger2_bnf import LibertyTrigger
 from app.slack import slack
+from app.utils.metrics import metrics
+from app.utils.latency import trade_latency
+from app.nifty_tf.symbol_registry import symbol_registry
+from app.nifty_tf.strategy_state import strategy_state
+from app.db.write_behind import write_behind
+from app.fyers.order_stream import order_stream
 
 class LibertyMomentum_BNF:
     def __init__(self, db, fyers):
@@ -36,24 +44,23 @@ class LibertyMomentum_BNF:
         try:
             active_tasks = []
             self.logger.info("LibertyMomentum_BNF run started")
+            await strategy_state.load() # Today's trigger status and status, carried on after a restart
+            await symbol_registry.load() # Selections made before a restart
+            order_stream.start() # Fills are pushed to us instead of polled
             range_val = await self.range.read_range()
 
-            ### Wait until Market start if before 9.15
-            while True:
-                if datetime.now().time() < time(9, 15):
-                    next_check = await self.trigger.get_next_5min_interval()
-                    await self.trigger.wait_until_time(next_check)
-                else:
-                    break
+            ### Wait until Market start if before the open (9.15 unless it's a special session)
+            await scheduler.at(trading_calendar.session_open(), "session_open")
 
-            """Waiting 15 seconds, Getting PCT Trigger at 9.16 AM"""
-            await asyncio.sleep(15)
-            """ATR Check"""
+            # Ticks feed the candle aggregator, so ATR acts on the 9.15 candle close
+            await self.breakout.start_candle_feed()
+
+            """PCT Trigger on the 9.15 1min candle close"""
             pctTrigger = await self.trigger.pct_trigger(range_val)
             #if not pctTrigger[0]:
             #    return 0 ### Exiting Whole Application # Will Comment this to check daily for ATR passings and other tests
             
-            """ATR Check"""
+            """ATR Check on the 9.15 5min candle close"""
             atrTrigger = await self.trigger.ATR(opening_percent=pctTrigger[1])
             direction = atrTrigger[1]
             poi = atrTrigger[2] ### Price of Interest
@@ -75,19 +82,19 @@ class LibertyMomentum_BNF:
             try:
                 await asyncio.wait_for(
                     self.run_bnf_breakout(poi=poi, direction=direction), 
-                    timeout=self._get_seconds_until_time(breakout_timeout)
+                    timeout=scheduler.seconds_until(breakout_timeout)
                 )
                 # direction, price = state["direction"], state["price"]
             except asyncio.TimeoutError:
                 self.logger.info("Breakout timeout reached at 10:30 -> Exit")
                 await slack.send_message("Breakout timeout reached at 10:30 -> Exit",webhook_name="banknifty")
-                await self.db.update_status(status='Exited - No Breakout by 10:30')
+                strategy_state.set_status('Exited - No Breakout by 10:30')
                 return 1
 
             if direction == "Buy":
                 self.logger.info("direction: Buy")
                 asyncio.create_task(slack.send_message("Order Placed: Long",webhook_name="banknifty"))
-                symbol, orderID = await self.place_order.place_banknifty_order_new(side="Buy", ltp=float(poi))
+                symbol, orderID = await self.place_order.place_banknifty_order_new(side="Buy", ltp=float(poi), timeline=self.breakout.state["timeline"])
                 self.logger.info(f"Output from place_order: {symbol} {orderID}")                
                 if symbol is None or orderID is None :
                     self.logger.error("Order placement failed - no order details returned.")
@@ -96,7 +103,7 @@ class LibertyMomentum_BNF:
             if direction == "Sell":
                 self.logger.info("direction: Sell")
                 asyncio.create_task(slack.send_message("Order Placed: Short",webhook_name="banknifty"))
-                symbol, orderID = await self.place_order.place_banknifty_order_new(side="Sell", ltp=float(poi))
+                symbol, orderID = await self.place_order.place_banknifty_order_new(side="Sell", ltp=float(poi), timeline=self.breakout.state["timeline"])
                 self.logger.info(f"Output from place_order: {symbol} {orderID}")
                 if symbol is None or orderID is None :
                     self.logger.error("Order placement failed - no order details returned.")
@@ -104,10 +111,10 @@ class LibertyMomentum_BNF:
                     return 1
             
             ### Calling SL Method in BG
-            sl_task  = asyncio.create_task(self.breakout.sl(symbol=symbol, side=direction, entry_price=poi))
+            sl_task  = asyncio.create_task(self.breakout.sl(symbol=symbol, side=direction, entry_price=poi, timeline=self.breakout.state["timeline"]))
             active_tasks.append(sl_task)
             self.logger.info(f"Called SL Method in Background for symbol: {symbol} and side: {direction}")
-            await asyncio.sleep(5) # Waiting 5 seconds before starting trailing
+            await scheduler.sleep(5, "trail_start") # Waiting 5 seconds before starting trailing
             trailing_task = asyncio.create_task(self.breakout.trail_sl(orderID, entry_price=poi))
             active_tasks.append(trailing_task)
 
@@ -120,7 +127,7 @@ class LibertyMomentum_BNF:
                         if self.breakout.sl_state["exit_executed"]:
                             self.logger.info("SL was hit, exiting run method")
                             break
-                    await asyncio.sleep(300) # Checking in every 5 minutes
+                    await scheduler.sleep(300, "sl_check") # Checking in every 5 minutes
                 if not sl_task.done():
                     sl_task.cancel()
                 if not trailing_task.done():
@@ -137,7 +144,10 @@ class LibertyMomentum_BNF:
             await slack.send_message(f"run(): Error in LibertyFlow run: {e}\n{error_traceback}",webhook_name="banknifty")
             return 1
         finally:
+            trade_latency.close_all()
+            metrics.log_summary()
             try:
+                await write_behind.flush()
                 await self.db.close()   
                 for task in active_tasks:
                     if not task.done():
@@ -145,29 +155,13 @@ class LibertyMomentum_BNF:
             except Exception as db_err:
                 self.logger.error(f"Error closing database: {db_err}")                        
 
-    def _get_seconds_until_time(self, target_time):
-        """Calculate seconds until target time today"""
-        now = datetime.now()
-        target_datetime = datetime.combine(now.date(), target_time)
-        
-        # If target time has already passed today, return 0
-        if target_datetime <= now:
-            return 0
-            
-        return (target_datetime - now).total_seconds()
-
     async def run_swh_formation(self, swing_instance):
         """Run SWH formation and immediately notify breakout when it forms"""
         try:
             self.logger.info("run_swh_formation(): Starting Swing High formation monitoring")
             result = await swing_instance.SWH()
             if result:
-                # Get the SWH value from DB
-                sql = 'SELECT "swhPrice" FROM nifty.trigger_status WHERE date = CURRENT_DATE'
-                result = await self.db.fetch_query(sql)
-                if result is not None:
-                    self.logger.info(f"run_swh_formation(): {result}")
-                    self.swh_value = result[0]["swhPrice"]
+                self.swh_value = strategy_state.trigger.swhPrice
                 
                 if self.swh_value:
                     self.logger.info(f"run_swh_formation(): SWH formed with value: {self.swh_value}, notifying breakout system")
@@ -194,12 +188,7 @@ class LibertyMomentum_BNF:
             result = await swing_instance.SWL()
             
             if result:
-                # Get the SWL value from DB
-                sql = 'SELECT "swlPrice" FROM nifty.trigger_status WHERE date = CURRENT_DATE'
-                result = await self.db.fetch_query(sql)
-                if result is not None:
-                    self.logger.info(f"run_swl_formation(): {result}")
-                    self.swl_value = result[0]["swlPrice"]
+                self.swl_value = strategy_state.trigger.swlPrice
 
                 if self.swl_value:
                     self.logger.info(f"run_swl_formation(): SWL formed with value: {self.swl_value}, notifying breakout system")
@@ -235,10 +224,7 @@ class LibertyMomentum_BNF:
                         direction = self.breakout.state.get("breakout_direction", "Unknown")
                         
                         # Update status in DB
-                        sqlStatus = f'''UPDATE nifty.status 
-                            SET status = 'Exited - {direction} Breakout'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlStatus)
+                        strategy_state.set_status(f'Exited - {direction} Breakout')
                         
                         self.events["trading_complete"].set()
                         break
@@ -248,10 +234,7 @@ class LibertyMomentum_BNF:
                         self.logger.info("Both swings formed but no breakout by 13:00, ending session")
                         
                         # Update status in DB
-                        sqlStatus = '''UPDATE nifty.status 
-                            SET status = 'Exited - No Breakout'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlStatus)
+                        strategy_state.set_status('Exited - No Breakout')
                         
                         self.events["trading_complete"].set()
                         break
@@ -261,15 +244,12 @@ class LibertyMomentum_BNF:
                         self.logger.info("No swings formed by cutoff time, ending session")
                         
                         # Update status in DB
-                        sqlStatus = '''UPDATE nifty.status 
-                            SET status = 'Exited - No Swings Formed'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlStatus)
+                        strategy_state.set_status('Exited - No Swings Formed')
                         
                         self.events["trading_complete"].set()
                         break
                     
-                    await asyncio.sleep(10)  # Check every 10 seconds
+                    await scheduler.sleep(10, "session_monitor")  # Check every 10 seconds
                     
             except Exception as e:
                 self.logger.error(f"Error monitoring trading session: {e}", exc_info=True)
@@ -290,7 +270,9 @@ class LibertyMomentum_BNF:
                 """Start  breakout monitor with SWL value"""
                 await self.breakout.monitor_breakouts(swl_price=poi)                   
             # Wait for breakout to happen
-            await self.breakout.wait_for_breakout()
+            state = await self.breakout.wait_for_breakout()
+            if state["timeline"] is not None:
+                state["timeline"].mark("wakeup")
             self.logger.info("run_bnf_breakout(): Breakout detected!")
                 
         except Exception as e:
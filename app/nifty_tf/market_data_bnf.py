@@ -3,9 +3,16 @@ import pandas as pd
 import builtins
 
 from app.utils.logging import get_logger
+from app.utils.calendar import trading_calendar
 from datetime import datetime, timedelta
 from app.config import settings
 from app.slack import slack
+from app.nifty_tf.candle_cache import candle_cache, candles_frame
+from app.nifty_tf.archive import archive
+from app.nifty_tf.candle_aggregator import candle_aggregator
+from app.fyers.gateway import fyers_gateway
+from app.utils.singleflight import singleflight
+from app.nifty_tf.session_features import session_features, day_features
 
 class LibertyMarketData:
     def __init__(self, db, fyers):
@@ -15,103 +22,137 @@ class LibertyMarketData:
         #self.symbol = "MCX:NATURALGAS25APRFUT" ### For Testing outside of market hours ### Remove this later
         self.symbol = settings.trade.BANKNIFTY_SYMBOL
 
-    async def fetch_5min_data(self):
-        try:
+    async def _refresh_candles(self, symbol):
+        """
+            Tops up the session candle cache with 1min candles from the last cached bar onwards.
+            SWH and SWL wake on the same bar close, concurrent refreshes of the same window share one history call.
+        """
+        if candle_aggregator.is_live(symbol):
+            return True # WebSocket ticks are keeping the cache current
+        range_from = candle_cache.fetch_from(symbol)
+        if range_from is None:
             data={
-                  "symbol":self.symbol,
-                  "resolution":"5",
+                  "symbol":symbol,
+                  "resolution":"1",
                   "date_format":"1",
                   "range_from":datetime.now().strftime('%Y-%m-%d'),
                   "range_to":datetime.now().strftime('%Y-%m-%d'),
                   "cont_flag":1
                   }
-            min5_data_today = self.fyers.history(data)
-            if min5_data_today['code'] == 200  and "candles" in min5_data_today:
+        else:
+            data={
+                  "symbol":symbol,
+                  "resolution":"1",
+                  "date_format":"0",
+                  "range_from":str(range_from),
+                  "range_to":str(int(datetime.now().timestamp())),
+                  "cont_flag":1
+                  }
+        return await singleflight.do(("history", symbol, "1", range_from), self._merge_history, symbol, data)
+
+    async def _merge_history(self, symbol, data):
+        min1_data = await fyers_gateway.history(data)
+        if min1_data['code'] == 200 and "candles" in min1_data:
+            candle_cache.merge(symbol, min1_data["candles"])
+            return True
+        self.logger.error(f"_refresh_candles(): Error fetching candles for {symbol}: {min1_data}")
+        return False
+
+    async def fetch_5min_data(self):
+        try:
+            if await self._refresh_candles(self.symbol):
                 self.logger.info(f"fetch_5min_data(): Fetched today's 5min candle data.")
-                min5_data_df = pd.DataFrame(
-                    min5_data_today["candles"], 
-                    columns=["timestamp", "open", "high", "low", "close", "volume"]
-                    )     
-                #min5_data_df['timestamp'] = pd.to_datetime(min5_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata') 
-                return min5_data_df 
-            self.logger.info(f"fetch_5min_data(): Error fetching range from DB: {e}", exc_info=True)
+                return candle_cache.frame(self.symbol, "5")
+            return None
         except Exception as e:
-            self.logger.error(f"fetch_5min_data(): Error fetching range from DB: {e}", exc_info=True)
+            self.logger.error(f"fetch_5min_data(): Error fetching 5min candle data: {e}", exc_info=True)
             return None 
                    
     async def fetch_1min_data(self):
         try:
-            data={
-                  "symbol":self.symbol,
-                  "resolution":"1",
-                  "date_format":"1",
-                  "range_from":datetime.now().strftime('%Y-%m-%d'),
-                  "range_to":datetime.now().strftime('%Y-%m-%d'),
-                  "cont_flag":1
-                  }
-            min1_data_today = self.fyers.history(data)
-            if min1_data_today['code'] == 200  and "candles" in min1_data_today:
+            if await self._refresh_candles(self.symbol):
                 self.logger.info(f"fetch_1min_data(): Fetched today's 1min candle data.")
-                min1_data_df = pd.DataFrame(
-                    min1_data_today["candles"], 
-                    columns=["timestamp", "open", "high", "low", "close", "volume"]
-                    ) 
-                #min1_data_df['timestamp'] = pd.to_datetime(min1_data_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')      
-                return min1_data_df       
-            self.logger.info(f"fetch_1min_data(): Error fetching range from DB: {e}", exc_info=True)
+                return candle_cache.frame(self.symbol, "1")
+            return None
         except Exception as e:
-            self.logger.error(f"fetch_1min_data(): Error fetching range from DB: {e}", exc_info=True)
+            self.logger.error(f"fetch_1min_data(): Error fetching 1min candle data: {e}", exc_info=True)
             return None       
              
+    async def fetch_5min_candles(self):
+        """Today's 5min candles as Candles (NumPy columns), None on error"""
+        try:
+            if await self._refresh_candles(self.symbol):
+                return candle_cache.arrays(self.symbol, "5")
+            return None
+        except Exception as e:
+            self.logger.error(f"fetch_5min_candles(): Error fetching 5min candles: {e}", exc_info=True)
+            return None
+
+    async def fetch_1min_candles(self):
+        """Today's 1min candles as Candles (NumPy columns), None on error"""
+        try:
+            if await self._refresh_candles(self.symbol):
+                return candle_cache.arrays(self.symbol, "1")
+            return None
+        except Exception as e:
+            self.logger.error(f"fetch_1min_candles(): Error fetching 1min candles: {e}", exc_info=True)
+            return None
+
+    async def fetch_prevDay_features(self):
+        """Previous session's features (pdc, avg_body_10, ...), precomputed by feature_update.py, probing the broker if that didn't run"""
+        try:
+            features = await session_features.get(self.symbol)
+            if features is not None:
+                return features
+            self.logger.warning(f"fetch_prevDay_features(): No precomputed features, fetching previous day's candles.")
+            df_day = await self.fetch_prevDay_1D_data()
+            df_min5 = await self.fetch_prevDay_5min_data()
+            return day_features(df_day.values[-1], df_min5.values)
+        except Exception as e:
+            self.logger.error(f"fetch_prevDay_features(): Error getting previous day features: {e}", exc_info=True)
+            return None
+
     async def fetch_prevDay_5min_data(self):
         try:
-            for i in builtins.range(1, 6):
-                data={
-                        "symbol":self.symbol,
-                        "resolution":"5",
-                        "date_format":"1",
-                        "range_from":(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d'),
-                        "range_to":(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d'),
-                        "cont_flag":1
-                        }                   
-                min5_data_prevDay = self.fyers.history(data)
-                if min5_data_prevDay['code'] == 200  and "candles" in min5_data_prevDay and min5_data_prevDay['s'] !="no_data":
-                    self.logger.info(f"fetch_prevDay_5min_data(): Fetched previous day's 5min candle data.")
-                    df_prevDay = pd.DataFrame(
-                        min5_data_prevDay["candles"], 
-                        columns=["timestamp", "open", "high", "low", "close", "volume"]
-                        )
-                    break
-            return  df_prevDay  
+            day = trading_calendar.prev_trading_day() # Sessions come from the calendar, no probing
+            candles = await archive.session(self.symbol, "1", day)
+            if candles is not None:
+                return candles_frame(candles.resample(5))
+            day = day.strftime('%Y-%m-%d')
+            data={
+                    "symbol":self.symbol,
+                    "resolution":"5",
+                    "date_format":"1",
+                    "range_from":day,
+                    "range_to":day,
+                    "cont_flag":1
+                    }                   
+            min5_data_prevDay = await fyers_gateway.history(data)
+            if min5_data_prevDay['code'] == 200  and "candles" in min5_data_prevDay and min5_data_prevDay['s'] !="no_data":
+                self.logger.info(f"fetch_prevDay_5min_data(): Fetched previous day's 5min candle data.")
+                df_prevDay = pd.DataFrame(
+                    min5_data_prevDay["candles"], 
+                    columns=["timestamp", "open", "high", "low", "close", "volume"]
+                    )
+                return df_prevDay
+            self.logger.error(f"fetch_prevDay_5min_data(): No 5min candles for {day}: {min5_data_prevDay}")
+            return None
         except Exception as e:
             self.logger.error(f"fetch_prevDay_5min_data(): Error fetching data from Fyers: {e}", exc_info=True)
             return None  
 
     async def fetch_quick_LTP(self):
         try:
-            data={
-                  "symbol":self.symbol,
-                  "resolution":"1",
-                  "date_format":"1",
-                  "range_from":datetime.now().strftime('%Y-%m-%d'),
-                  "range_to":datetime.now().strftime('%Y-%m-%d'),
-                  "cont_flag":1
-                  }
-            min1_data_today = self.fyers.history(data)
-            if min1_data_today['code'] == 200  and "candles" in min1_data_today:
+            if await self._refresh_candles(self.symbol):
                 self.logger.info(f"fetch_quick_LTP(): Fetching quick LTP.")
-                min1_data_df = pd.DataFrame(
-                    min1_data_today["candles"], 
-                    columns=["timestamp", "open", "high", "low", "close", "volume"]
-                    ) 
-                return float(min1_data_df.iloc[-1]['close'])
+                return float(candle_cache.candles(self.symbol)[-1][4])
         except Exception as e:
             self.logger.error(f"fetch_quick_LTP(): Error fetching last LTP: {e}", exc_info=True)
             return None
         
     async def fetch_quick_quote(self, symbol):
         try:
-            response = self.fyers.quotes(data={"symbols": symbol})
+            response = await fyers_gateway.quotes(data={"symbols": symbol})
             if response.get('code') == 200 and response.get('d') and len(response['d']) > 0:
                 quote_data = response['d'][0].get('v', {})
                 self.logger.info(f"fetch_quick_quote(): Fetched {self.symbol} Quote: LTP:{quote_data.get('lp')} ASK:{quote_data.get('ask')}")
@@ -128,9 +169,31 @@ class LibertyMarketData:
             self.logger.error(f"fetch_quick_quote(): Exception occurred: {str(e)}")
             return {'lp': None, 'ask': None}                           
         
+    async def fetch_quotes(self, symbols):
+        """Quotes for many symbols in a single quotes call, {symbol: {'lp','ask','bid'}}"""
+        try:
+            quotes = {}
+            for i in range(0, len(symbols), 50): # Broker takes 50 symbols per call
+                response = await fyers_gateway.quotes(data={"symbols": ",".join(symbols[i:i + 50])})
+                if response.get('code') != 200:
+                    self.logger.error(f"fetch_quotes(): API Error: {response.get('message', 'Unknown error')}")
+                    return None
+                for quote in response.get('d', []):
+                    quote_data = quote.get('v', {})
+                    quotes[quote.get('n')] = {
+                        'lp': quote_data.get('lp'),
+                        'ask': quote_data.get('ask'),
+                        'bid': quote_data.get('bid')
+                    }
+            self.logger.info(f"fetch_quotes(): Fetched {len(quotes)} quotes")
+            return quotes
+        except Exception as e:
+            self.logger.error(f"fetch_quotes(): Exception occurred: {str(e)}")
+            return None
+
     async def insert_order_data(self, orderID):
         try:
-            response = self.fyers.get_orders({'id':str(orderID)})
+            response = await fyers_gateway.get_orders({'id':str(orderID)})
             if response.get('code') == 200 and len(response['orderBook']) > 0:
                 order = response['orderBook'][0]
                 sql =f'''
@@ -149,7 +212,7 @@ class LibertyMarketData:
         
     async def fetch_quick_order_status(self, orderID):
         try:
-            response = self.fyers.get_orders({'id':str(orderID)})
+            response = await fyers_gateway.get_orders({'id':str(orderID)})
             if response.get('code') == 200 and len(response['orderBook']) > 0:
                 order = response['orderBook'][0]
                 return order['status']
@@ -163,24 +226,29 @@ class LibertyMarketData:
 
     async def fetch_prevDay_1D_data(self):
         try:
-            for i in builtins.range(1, 6):
-                data={
-                        "symbol":self.symbol,
-                        "resolution":"1D",
-                        "date_format":"1",
-                        "range_from":(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d'),
-                        "range_to":(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d'),
-                        "cont_flag":1
-                        }                   
-                day_data_prevDay = self.fyers.history(data)
-                if day_data_prevDay['code'] == 200  and "candles" in day_data_prevDay and day_data_prevDay['s'] !="no_data":
-                    self.logger.info(f"fetch_prevDay_1D_data(): Fetched previous day's 1D candle data.")
-                    df_prevDay = pd.DataFrame(
-                        day_data_prevDay["candles"], 
-                        columns=["timestamp", "open", "high", "low", "close", "volume"]
-                        )
-                    break
-            return  df_prevDay  
+            day = trading_calendar.prev_trading_day() # Sessions come from the calendar, no probing
+            candles = await archive.session(self.symbol, "1D", day)
+            if candles is not None:
+                return candles_frame(candles)
+            day = day.strftime('%Y-%m-%d')
+            data={
+                    "symbol":self.symbol,
+                    "resolution":"1D",
+                    "date_format":"1",
+                    "range_from":day,
+                    "range_to":day,
+                    "cont_flag":1
+                    }                   
+            day_data_prevDay = await fyers_gateway.history(data)
+            if day_data_prevDay['code'] == 200  and "candles" in day_data_prevDay and day_data_prevDay['s'] !="no_data":
+                self.logger.info(f"fetch_prevDay_1D_data(): Fetched previous day's 1D candle data.")
+                df_prevDay = pd.DataFrame(
+                    day_data_prevDay["candles"], 
+                    columns=["timestamp", "open", "high", "low", "close", "volume"]
+                    )
+                return df_prevDay
+            self.logger.error(f"fetch_prevDay_1D_data(): No 1D candles for {day}: {day_data_prevDay}")
+            return None
         except Exception as e:
             self.logger.error(f"fetch_prevDay_1D_data(): Error fetching data from Fyers: {e}", exc_info=True)
             return None 
\ No newline at end of file
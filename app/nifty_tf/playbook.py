@@ -0,0 +1,99 @@
+import math
+from datetime import datetime
+from typing import Tuple
+from pydantic import BaseModel, ConfigDict
+
+from app.utils.logging import get_logger
+from app.config import settings
+
+# Locked R multiples the trail moves the SL to (-0.5 is "trail 50%", 0.5 is "take 0.5R" ...)
+TRAIL_LOCKS = (-0.5, 0.5, 1, 1.25, 1.5, 1.75)
+
+def trail_levels(side, trail_entry, initial_sl_points):
+    """((locked R, SL price), ...) for a position entered at trail_entry, floor for Buy, ceil for Sell"""
+    if side == "Buy":
+        return tuple((r, math.floor(trail_entry + initial_sl_points * r)) for r in TRAIL_LOCKS)
+    return tuple((r, math.ceil(trail_entry - initial_sl_points * r)) for r in TRAIL_LOCKS)
+
+class EntryPlaybook(BaseModel):
+    """Everything the entry needs except the fill, fixed when the swing forms"""
+    model_config = ConfigDict(frozen=True)
+
+    strategy: str
+    side: str # Buy / Sell breakout
+    swing_price: float
+    symbol: str
+    qty: int
+    product_type: str
+    schedule: str # Execution chase schedule
+    sl_price: float # On the underlying
+    trail_entry: float # Swing ± 1, what R is measured from
+    initial_sl_points: float
+    trail_levels: Tuple[Tuple[float, float], ...]
+    armed_at: datetime
+
+    def trail_level(self, r):
+        """SL price that locks r R"""
+        return dict(self.trail_levels)[r]
+
+class LibertyPlaybooks:
+    """
+        Entry playbooks per strategy and side.
+        arm() is called when a swing forms (and again whenever its option symbol is reselected) and
+        does all the sums up front, so after the breakout the strategy only reads get() from memory.
+        Playbooks are replaced, never changed, and are gone on restart; callers fall back to
+        working things out themselves when get() is None.
+    """
+    def __init__(self):
+        self.logger = get_logger("Playbooks")
+        self._playbooks = {} # (strategy, side) -> EntryPlaybook
+        self.strategies = {
+            "nifty": {
+                "qty": settings.trade.NIFTY_LOT * settings.trade.NIFTY_LOT_SIZE,
+                "product_type": settings.trade.NIFTY_PRODUCT_TYPE,
+                "sl_pct": settings.trade.NIFTY_SL_PCT,
+                "schedule": "nifty_entry",
+            },
+        }
+
+    def arm(self, strategy, side, swing_price, symbol):
+        try:
+            config = self.strategies[strategy]
+            swing_price = float(swing_price)
+            if side == "Buy":
+                sl_price = round(swing_price - (swing_price * config["sl_pct"]))
+                trail_entry = swing_price + 1
+            else:
+                sl_price = round(swing_price + (swing_price * config["sl_pct"]))
+                trail_entry = swing_price - 1
+            initial_sl_points = round(abs(trail_entry - sl_price))
+            playbook = EntryPlaybook(
+                strategy=strategy,
+                side=side,
+                swing_price=swing_price,
+                symbol=symbol,
+                qty=config["qty"],
+                product_type=config["product_type"],
+                schedule=config["schedule"],
+                sl_price=sl_price,
+                trail_entry=trail_entry,
+                initial_sl_points=initial_sl_points,
+                trail_levels=trail_levels(side, trail_entry, initial_sl_points),
+                armed_at=datetime.now()
+            )
+            self._playbooks[(strategy, side)] = playbook
+            self.logger.info(f"arm(): {strategy} {side} armed: {symbol} x {playbook.qty}, swing {swing_price}, SL {sl_price}")
+            return playbook
+        except Exception as e:
+            self.logger.error(f"arm(): Error arming {strategy} {side}: {e}")
+            return None
+
+    def get(self, strategy, side):
+        """Today's armed playbook, None if the swing hasn't formed in this process"""
+        playbook = self._playbooks.get((strategy, side))
+        if playbook is not None and playbook.armed_at.date() != datetime.now().date():
+            return None
+        return playbook
+
+
+entry_playbooks = LibertyPlaybooks()
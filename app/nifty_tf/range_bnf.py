@@ -7,6 +7,7 @@ import asyncio
 from app.utils.logging import get_logger
 from app.config import settings
 from app.slack import slack
+from app.fyers.gateway import fyers_gateway
 
 class NumpyEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -50,7 +51,7 @@ class LibertyRange:
                     "range_to": datetime.now().strftime('%Y-%m-%d'),
                     "cont_flag": 1
                     }
-            today_candle_data = self.fyers.history(data)
+            today_candle_data = await fyers_gateway.history(data)
             
             if today_candle_data['code'] == 200 and "candles" in today_candle_data:
                 self.logger.info(f"update_range(): Fetched today candle data: {today_candle_data}")
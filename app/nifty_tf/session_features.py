@@ -0,0 +1,115 @@
+from datetime import datetime, date
+import numpy as np
+
+from app.utils.logging import get_logger
+from app.utils.calendar import trading_calendar
+from app.db.dbclass import db
+from app.fyers.gateway import fyers_gateway
+from app.nifty_tf.candles import Candles
+from app.nifty_tf.archive import archive, archive_name
+
+def day_features(day_candle, min5_rows):
+    """Features of one session from its 1D candle and its 5min candles, what the open-time triggers read as 'previous day'"""
+    return {
+        "pdo": float(day_candle[1]),
+        "pdh": float(day_candle[2]),
+        "pdl": float(day_candle[3]),
+        "pdc": float(day_candle[4]),
+        "avg_body_10": float(Candles.from_rows(min5_rows).body()[-10:].mean()), # ATR()'s average of the last 10 5min bodies
+    }
+
+class LibertySessionFeatures:
+    """
+        Per instrument features of the last completed session (PDC, the last 10 5min bar average body, ...).
+        feature_update.py computes them after the close and stores them in nifty.session_features
+        (app/sql/session_features.sql), so pct_trigger and ATR read one cached row at the open instead
+        of probing the broker for the previous trading day.
+        Rows are keyed by the archive name (NIFTY-FUT, not NSE:NIFTY26OCTFUT), so the evening before a
+        rollover stores what the next morning's contract looks up.
+    """
+    def __init__(self, db):
+        self.logger = get_logger("SessionFeatures")
+        self.db = db
+        self._session = None
+        self._features = {} # archive name -> features of the previous session
+
+    def _check_session(self):
+        today = date.today()
+        if self._session != today:
+            self._session = today
+            self._features = {}
+
+    async def compute(self, symbol, day=None):
+        """Features of symbol's session on day (default today) from the archive or the broker, None if there's no data for it"""
+        try:
+            day = day or date.today()
+            daily = await archive.session(symbol, "1D", day)
+            min1 = await archive.session(symbol, "1", day)
+            if daily is not None and min1 is not None:
+                min5 = min1.resample(5)
+                rows = np.column_stack([min5.ts, min5.open, min5.high, min5.low, min5.close, min5.volume])
+                features = day_features([daily.ts[-1], daily.open[-1], daily.high[-1], daily.low[-1], daily.close[-1], daily.volume[-1]], rows)
+                self.logger.info(f"compute(): {symbol} {day} from the archive: {features}")
+                return features
+            day = day.strftime('%Y-%m-%d')
+            candles = {}
+            for resolution in ("1D", "5"):
+                data = {
+                    "symbol": symbol,
+                    "resolution": resolution,
+                    "date_format": "1",
+                    "range_from": day,
+                    "range_to": day,
+                    "cont_flag": 1
+                    }
+                response = await fyers_gateway.history(data)
+                if response.get('code') != 200 or not response.get("candles"):
+                    self.logger.warning(f"compute(): No {resolution} candles for {symbol} on {day}: {response}")
+                    return None
+                candles[resolution] = response["candles"]
+            features = day_features(candles["1D"][-1], candles["5"])
+            self.logger.info(f"compute(): {symbol} {day}: {features}")
+            return features
+        except Exception as e:
+            self.logger.error(f"compute(): Error computing features for {symbol}: {e}", exc_info=True)
+            return None
+
+    async def store(self, symbol, features, day=None):
+        """Upsert symbol's features for day (default today), under symbol's archive name"""
+        await self.db.execute_query(
+            '''
+            INSERT INTO nifty.session_features (date, symbol, pdo, pdh, pdl, pdc, avg_body_10, computed_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            ON CONFLICT (date, symbol)
+            DO UPDATE SET pdo = EXCLUDED.pdo, pdh = EXCLUDED.pdh, pdl = EXCLUDED.pdl, pdc = EXCLUDED.pdc,
+                avg_body_10 = EXCLUDED.avg_body_10, computed_at = EXCLUDED.computed_at
+            ''',
+            day or date.today(), archive_name(symbol), features["pdo"], features["pdh"], features["pdl"], features["pdc"],
+            features["avg_body_10"], datetime.now()
+        )
+
+    async def get(self, symbol):
+        """Features of symbol's previous session, read from the DB once per day. None if the job didn't run for it."""
+        self._check_session()
+        name = archive_name(symbol)
+        if name in self._features:
+            return self._features[name]
+        try:
+            sql = '''
+                SELECT date, pdo, pdh, pdl, pdc, avg_body_10 FROM nifty.session_features
+                WHERE symbol = $1 AND date = $2
+                '''
+            rows = await self.db.fetch_query(sql, name, trading_calendar.prev_trading_day())
+            if not rows:
+                self.logger.warning(f"get(): No precomputed features for {name} on {trading_calendar.prev_trading_day()}")
+                return None
+            features = dict(rows[0])
+            self._features[name] = features
+            self.logger.info(f"get(): {symbol} features of {features['date']}: {features}")
+            return features
+        except Exception as e:
+            self.logger.error(f"get(): Error reading features for {symbol}: {e}")
+            return None
+
+
+session_features = LibertySessionFeatures(db)
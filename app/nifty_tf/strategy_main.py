@@ -4,11 +4,20 @@ import traceback
 
 from app.nifty_tf.range import LibertyRange
 from app.nifty_tf.breakout import LibertyBreakout
+from app.utils.calendar import trading_calendar
+from app.utils.scheduler import scheduler
 from app.utils.logging import get_logger
 from app.fyers.oms.nifty_tf_oms import Nifty_OMS
 from app.nifty_tf.swingFormation2 import LibertySwing
 from app.nifty_tf.trigger2 import LibertyTrigger
 from app.slack import slack
+from app.utils.metrics import metrics
+from app.utils.latency import trade_latency
+from app.nifty_tf.symbol_registry import symbol_registry
+from app.nifty_tf.strategy_state import strategy_state
+from app.nifty_tf.playbook import entry_playbooks
+from app.db.write_behind import write_behind
+from app.fyers.order_stream import order_stream
 
 class LibertyFlow:
     def __init__(self, db, fyers):
@@ -36,43 +45,22 @@ class LibertyFlow:
         try:
             active_tasks = []
             self.logger.info("LibertyFlow run started")
-            pctTrigger, atrTrigger, rangeTrigger = False, False, False ### Initializing triggers as False
-            sql='''INSERT INTO nifty.trigger_status (date, pct_trigger, atr, range)
-                SELECT CURRENT_DATE, NULL, NULL, NULL
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM nifty.trigger_status WHERE date = CURRENT_DATE
-                );'''
-            await self.db.execute_query(sql)            
+            await strategy_state.load() # Today's trigger status and status, carried on after a restart
+            await symbol_registry.load() # Selections made before a restart
+            order_stream.start() # Fills are pushed to us instead of polled
             range_val = await self.range.read_range()
-            sqlStatus = '''INSERT INTO nifty.status (date, status)
-                SELECT CURRENT_DATE,'Awaiting Trigger'
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM nifty.status WHERE date = CURRENT_DATE
-                );'''
-            await self.db.execute_query(sqlStatus)
+            pctTrigger = bool(strategy_state.trigger.pct_trigger)
+            atrTrigger = bool(strategy_state.trigger.atr)
+            rangeTrigger = bool(strategy_state.trigger.range)
 
-            triggerStatusSql = '''
-                    SELECT pct_trigger, atr, range FROM nifty.trigger_status
-                    where date = CURRENT_DATE
-                    order by ctid DESC
-                    limit 1
-                  '''
-            triggerStatus = await self.db.fetch_query(triggerStatusSql)
-            if  triggerStatus is not None and  len(triggerStatus) != 0:
-                if triggerStatus[0]['pct_trigger'] is not None: pctTrigger = bool(triggerStatus[0]['pct_trigger'])
-                if triggerStatus[0]['atr'] is not None: atrTrigger = bool(triggerStatus[0]['atr'])
-                if triggerStatus[0]['range'] is not None: rangeTrigger = bool(triggerStatus[0]['range'])
+            ### Wait until Market start if before the open (9.15 unless it's a special session)
+            await scheduler.at(trading_calendar.session_open(), "session_open")
 
-            ### Wait until Market start if before 9.15
-            while True:
-                if datetime.now().time() < time(9, 15):
-                    next_check = await self.trigger.get_next_5min_interval()
-                    await self.trigger.wait_until_time(next_check)
-                else:
-                    break
+            # Ticks feed the candle aggregator, so triggers and swings act on bar close
+            await self.breakout.start_candle_feed()
 
+            # Each trigger acts on the close of the bar it checks
             if not any([pctTrigger]):
-                await asyncio.sleep(15)
                 pctTrigger = await self.trigger.pct_trigger(range_val)            
 
             if not any([pctTrigger, atrTrigger]):
@@ -84,18 +72,13 @@ class LibertyFlow:
             ### Exiting if not Triggered
             if not any([pctTrigger, atrTrigger, rangeTrigger]):
                 self.logger.info("Not Triggered -> Exit") ### Exit out of day and close the server. Script should not go forward.
-                task = asyncio.create_task(self.db.update_status(status='Not Triggered'))
-                active_tasks.append(task)
+                strategy_state.set_status('Not Triggered')
                 return 1   
             if pctTrigger or atrTrigger or rangeTrigger:
-                task = asyncio.create_task(self.db.update_status(status='Awaiting Swing Formation'))
-                active_tasks.append(task)
+                strategy_state.set_status('Awaiting Swing Formation')
 
-                trigger_time = await self.db.fetch_trigger_time() 
-                if trigger_time is not None and len(trigger_time) != 0:
-                    trigger_time = trigger_time[0]['trigger_time']
-                    self.logger.info(f"Using trigger time: {trigger_time}")
-                print(f"Trigger Time: {trigger_time}")
+                trigger_time = strategy_state.trigger.trigger_time
+                self.logger.info(f"Using trigger time: {trigger_time}")
 
                 # Initializing Swing Class
                 swh_swing = LibertySwing(self.db, self.fyers)    
@@ -117,20 +100,24 @@ class LibertyFlow:
                 # state = await self.breakout.wait_for_breakout()
                 state = await asyncio.wait_for(
                     self.breakout.wait_for_breakout(), 
-                    timeout=self._get_seconds_until_time(breakout_timeout)
+                    timeout=scheduler.seconds_until(breakout_timeout)
                 )
-                direction, price = state["direction"], state["price"]
+                direction, price, timeline = state["direction"], state["price"], state["timeline"]
+                if timeline is not None:
+                    timeline.mark("wakeup")
             except asyncio.TimeoutError:
                 self.logger.info("Breakout timeout reached at 13:00 -> Exit")
                 await slack.send_message("Breakout timeout reached at 13:00 -> Exit")
-                await self.db.update_status(status='Exited - No Breakout by 13:00')
+                strategy_state.set_status('Exited - No Breakout by 13:00')
                 return 1
 
 
+            # Armed when the swing formed, None after a restart
+            playbook = entry_playbooks.get("nifty", direction)
             if direction == "Buy":
                 self.logger.info("direction: Buy")
                 asyncio.create_task(slack.send_message("Order Placed: Long"))
-                symbol, orderID = await self.place_order.place_nifty_order_new(side="Buy")
+                symbol, orderID = await self.place_order.place_nifty_order_new(side="Buy", ltp=price, playbook=playbook, timeline=timeline)
                 self.logger.info(f"Output from place_order: {symbol} {orderID}")                
                 if symbol is None or orderID is None :
                     self.logger.error("Order placement failed - no order details returned.")
@@ -139,7 +126,7 @@ class LibertyFlow:
             if direction == "Sell":
                 self.logger.info("direction: Sell")
                 asyncio.create_task(slack.send_message("Order Placed: Short"))
-                symbol, orderID = await self.place_order.place_nifty_order_new(side="Sell")
+                symbol, orderID = await self.place_order.place_nifty_order_new(side="Sell", ltp=price, playbook=playbook, timeline=timeline)
                 self.logger.info(f"Output from place_order: {symbol} {orderID}")
                 if symbol is None or orderID is None :
                     self.logger.error("Order placement failed - no order details returned.")
@@ -147,11 +134,11 @@ class LibertyFlow:
                     return 1
             
             ### Calling SL Method in BG
-            sl_task  = asyncio.create_task(self.breakout.sl(symbol=symbol, side=direction))
+            sl_task  = asyncio.create_task(self.breakout.sl(symbol=symbol, side=direction, playbook=playbook, timeline=timeline))
             active_tasks.append(sl_task)
             self.logger.info(f"Called SL Method in Background for symbol: {symbol} and side: {direction}")
-            await asyncio.sleep(5) # Waiting 5 seconds before starting trailing
-            trailing_task = asyncio.create_task(self.breakout.trail_sl(orderID))
+            await scheduler.sleep(5, "trail_start") # Waiting 5 seconds before starting trailing
+            trailing_task = asyncio.create_task(self.breakout.trail_sl(orderID, playbook=playbook))
             active_tasks.append(trailing_task)
 
             ### Waiting for SL or Market Close
@@ -163,7 +150,7 @@ class LibertyFlow:
                         if self.breakout.sl_state["exit_executed"]:
                             self.logger.info("SL was hit, exiting run method")
                             break
-                    await asyncio.sleep(300) # Checking in every 5 minutes
+                    await scheduler.sleep(300, "sl_check") # Checking in every 5 minutes
                 if not sl_task.done():
                     sl_task.cancel()
                 if not trailing_task.done():
@@ -180,7 +167,10 @@ class LibertyFlow:
             await slack.send_message(f"run(): Error in LibertyFlow run: {e}\n{error_traceback}")
             return 1
         finally:
+            trade_latency.close_all()
+            metrics.log_summary()
             try:
+                await write_behind.flush()
                 await self.db.close()   
                 for task in active_tasks:
                     if not task.done():
@@ -188,29 +178,13 @@ class LibertyFlow:
             except Exception as db_err:
                 self.logger.error(f"Error closing database: {db_err}")                        
 
-    def _get_seconds_until_time(self, target_time):
-        """Calculate seconds until target time today"""
-        now = datetime.now()
-        target_datetime = datetime.combine(now.date(), target_time)
-        
-        # If target time has already passed today, return 0
-        if target_datetime <= now:
-            return 0
-            
-        return (target_datetime - now).total_seconds()
-
     async def run_swh_formation(self, swing_instance):
         """Run SWH formation and immediately notify breakout when it forms"""
         try:
             self.logger.info("run_swh_formation(): Starting Swing High formation monitoring")
             result = await swing_instance.SWH()
             if result:
-                # Get the SWH value from DB
-                sql = 'SELECT "swhPrice" FROM nifty.trigger_status WHERE date = CURRENT_DATE'
-                result = await self.db.fetch_query(sql)
-                if result is not None:
-                    self.logger.info(f"run_swh_formation(): {result}")
-                    self.swh_value = result[0]["swhPrice"]
+                self.swh_value = strategy_state.trigger.swhPrice
                 
                 if self.swh_value:
                     self.logger.info(f"run_swh_formation(): SWH formed with value: {self.swh_value}, notifying breakout system")
@@ -237,12 +211,7 @@ class LibertyFlow:
             result = await swing_instance.SWL()
             
             if result:
-                # Get the SWL value from DB
-                sql = 'SELECT "swlPrice" FROM nifty.trigger_status WHERE date = CURRENT_DATE'
-                result = await self.db.fetch_query(sql)
-                if result is not None:
-                    self.logger.info(f"run_swl_formation(): {result}")
-                    self.swl_value = result[0]["swlPrice"]
+                self.swl_value = strategy_state.trigger.swlPrice
 
                 if self.swl_value:
                     self.logger.info(f"run_swl_formation(): SWL formed with value: {self.swl_value}, notifying breakout system")
@@ -278,10 +247,7 @@ class LibertyFlow:
                         direction = self.breakout.state.get("breakout_direction", "Unknown")
                         
                         # Update status in DB
-                        sqlStatus = f'''UPDATE nifty.status 
-                            SET status = 'Exited - {direction} Breakout'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlStatus)
+                        strategy_state.set_status(f'Exited - {direction} Breakout')
                         
                         self.events["trading_complete"].set()
                         break
@@ -291,10 +257,7 @@ class LibertyFlow:
                         self.logger.info("Both swings formed but no breakout by 13:00, ending session")
                         
                         # Update status in DB
-                        sqlStatus = '''UPDATE nifty.status 
-                            SET status = 'Exited - No Breakout'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlStatus)
+                        strategy_state.set_status('Exited - No Breakout')
                         
                         self.events["trading_complete"].set()
                         break
@@ -304,15 +267,12 @@ class LibertyFlow:
                         self.logger.info("No swings formed by cutoff time, ending session")
                         
                         # Update status in DB
-                        sqlStatus = '''UPDATE nifty.status 
-                            SET status = 'Exited - No Swings Formed'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlStatus)
+                        strategy_state.set_status('Exited - No Swings Formed')
                         
                         self.events["trading_complete"].set()
                         break
                     
-                    await asyncio.sleep(10)  # Check every 10 seconds
+                    await scheduler.sleep(10, "session_monitor")  # Check every 10 seconds
                     
             except Exception as e:
                 self.logger.error(f"Error monitoring trading session: {e}", exc_info=True)
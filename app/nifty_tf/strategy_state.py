@@ -0,0 +1,111 @@
+from datetime import date
+from typing import Optional
+from pydantic import BaseModel
+
+from app.utils.logging import get_logger
+from app.db.dbclass import db
+from app.db.write_behind import write_behind
+
+class TriggerStatus(BaseModel):
+    """Today's nifty.trigger_status row, times as 'HH:MM:SS'"""
+    pct_trigger: Optional[bool] = None
+    atr: Optional[bool] = None
+    range: Optional[bool] = None
+    trigger_index: Optional[int] = None
+    trigger_time: Optional[str] = None
+    swhTime: Optional[str] = None
+    swlTime: Optional[str] = None
+    swhPrice: Optional[float] = None
+    swlPrice: Optional[float] = None
+
+def _literal(value):
+    """SQL literal, the trigger_status time columns take a quoted 'HH:MM:SS' whatever their type"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+class LibertyStrategyState:
+    """
+        The strategy's working memory for the day: today's trigger_status row and status.
+        load() reads them once at startup (after a restart they carry on from the DB), after that
+        every read is an attribute access and every change is applied in memory first, then queued
+        to Postgres through write_behind. The queue is ordered and a column's pending write is
+        replaced by a newer one, so the row ends up as memory has it and nothing waits on the DB.
+    """
+    def __init__(self, db):
+        self.logger = get_logger("StrategyState")
+        self.db = db
+        self._session = None
+        self.trigger = TriggerStatus()
+        self.status = None
+
+    def _check_session(self):
+        today = date.today()
+        if self._session != today:
+            self._session = today
+            self.trigger = TriggerStatus()
+            self.status = None
+
+    async def load(self, status="Awaiting Trigger"):
+        """Make sure today's rows exist and read them, call once at startup"""
+        try:
+            self._check_session()
+            await self.db.execute_query('''INSERT INTO nifty.trigger_status (date, pct_trigger, atr, range)
+                SELECT CURRENT_DATE, NULL, NULL, NULL
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM nifty.trigger_status WHERE date = CURRENT_DATE
+                );''')
+            await self.db.execute_query(f'''INSERT INTO nifty.status (date, status)
+                SELECT CURRENT_DATE, {_literal(status)}
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM nifty.status WHERE date = CURRENT_DATE
+                );''')
+            rows = await self.db.fetch_query('''
+                SELECT * FROM nifty.trigger_status
+                WHERE date = CURRENT_DATE
+                ORDER BY ctid DESC
+                LIMIT 1
+                ''')
+            if rows:
+                row = dict(rows[0])
+                self.trigger = TriggerStatus(**{
+                    field: (str(row[field]) if field.endswith("Time") or field == "trigger_time" else row[field])
+                    for field in TriggerStatus.model_fields if row.get(field) is not None
+                })
+            rows = await self.db.fetch_query("SELECT status FROM nifty.status WHERE date = CURRENT_DATE")
+            if rows:
+                self.status = rows[0]['status']
+            self.logger.info(f"load(): {self.trigger} status: {self.status}")
+            return True
+        except Exception as e:
+            self.logger.error(f"load(): Error loading strategy state: {e}", exc_info=True)
+            return False
+
+    def update(self, **fields):
+        """Set trigger_status fields, in memory now and in the DB behind"""
+        self._check_session()
+        self.trigger = TriggerStatus(**{**self.trigger.model_dump(), **fields}) # Validates the new values
+        for field in fields:
+            write_behind.submit(
+                ("trigger_status", field),
+                f'''UPDATE nifty.trigger_status SET "{field}" = {_literal(getattr(self.trigger, field))} WHERE date = CURRENT_DATE'''
+            )
+        self.logger.info(f"update(): {fields}")
+        return self.trigger
+
+    def set_status(self, status):
+        self._check_session()
+        self.status = status
+        write_behind.submit(
+            ("status",),
+            '''UPDATE nifty.status SET status = $1 WHERE date = CURRENT_DATE''',
+            status
+        )
+        self.logger.info(f"set_status(): {status}")
+
+
+strategy_state = LibertyStrategyState(db)
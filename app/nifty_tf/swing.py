@@ -0,0 +1,55 @@
+from collections import deque
+
+class SwingTracker:
+    """
+        Incremental swing high ("high") / swing low ("low") detector fed closed 5min bars.
+        The reference bar is a swing once min_bars bars have closed after it and none of them went
+        beyond it (ties count as a swing). Otherwise the reference moves to the first bar holding the
+        extreme since the reference, and the count starts again from there.
+        Instead of rescanning the day on every close it keeps a monotonic deque of the bars after the
+        reference: deque[0] is the first extreme after the reference, deque[1] the first extreme after
+        deque[0] and so on. A bar pops the bars it beats off the back, so push() is amortised O(1) and
+        a moved reference already has the extreme of the bars after it at the front.
+    """
+    def __init__(self, side, ref_ts, min_bars=6):
+        self.side = side
+        self.ref_ts = ref_ts
+        self.ref_price = None # Known once the reference bar has closed
+        self.min_bars = min_bars
+        self.last_ts = None # Last bar pushed
+        self._seq = 0
+        self._ref_seq = None
+        self._after = deque() # (seq, ts, price), price non-increasing (high) / non-decreasing (low)
+
+    def _beats(self, price, other):
+        return price > other if self.side == "high" else price < other
+
+    def push(self, ts, high, low):
+        """
+            Feed the next closed bar. Returns None, ("moved", ref_ts) when the reference moved,
+            or ("swing", ref_ts, ref_price) when the reference is a swing.
+        """
+        if self.last_ts is not None and ts <= self.last_ts:
+            return None # Already seen
+        self.last_ts = ts
+        price = high if self.side == "high" else low
+        if ts < self.ref_ts:
+            return None
+        self._seq += 1
+        if ts == self.ref_ts:
+            self.ref_price = price
+            self._ref_seq = self._seq
+            return None
+        if self._ref_seq is None:
+            return None # Reference bar never seen, nothing to measure against
+
+        while self._after and self._beats(price, self._after[-1][2]):
+            self._after.pop()
+        self._after.append((self._seq, ts, price))
+
+        if self._seq - self._ref_seq < self.min_bars:
+            return None
+        if not self._beats(self._after[0][2], self.ref_price):
+            return ("swing", self.ref_ts, self.ref_price)
+        self._ref_seq, self.ref_ts, self.ref_price = self._after.popleft()
+        return ("moved", self.ref_ts)
@@ -4,6 +4,7 @@ import asyncio
 import math
 
 from app.utils.logging import get_logger
+from app.utils.scheduler import scheduler
 from app.nifty_tf.market_data import LibertyMarketData
 from app.nifty_tf.trigger import LibertyTrigger
 
@@ -61,9 +62,7 @@ class LibertySwing():
 
                 print(f"CandleList: \n{candleList}\n Reference Candle:\n{referenceCandle}\n Filtered Data:\n {filtered_df_data}")
                 # Wait for next 5-minute interval
-                next_check = await self.trigger.get_next_5min_interval()
-                #next_check = await self.trigger.get_next_1min_interval() ### Remove this later
-                await self.trigger.wait_until_time(next_check)
+                await scheduler.wait_next(5, "swing")
         except Exception as e:
             self.logger.error(f"SWH(): Error: {e}", exc_info=True)
             print(f"SWH(): Error: {e}")
@@ -116,9 +115,7 @@ class LibertySwing():
 
                 print(f"CandleList: \n{candleList}\n Reference Candle:\n{referenceCandle}\n Filtered Data:\n {filtered_df_data}")
                 # Wait for next 5-minute interval
-                next_check = await self.trigger.get_next_5min_interval()
-                #next_check = await self.trigger.get_next_1min_interval() ### Remove this later
-                await self.trigger.wait_until_time(next_check)
+                await scheduler.wait_next(5, "swing")
             
         except Exception as e:
             self.logger.error(f"SWL(): Error: {e}", exc_info=True)
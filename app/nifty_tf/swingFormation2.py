@@ -1,30 +1,26 @@
 from datetime import datetime, time
-import pandas as pd
 import asyncio
 import math
+import numpy as np
 
 from app.utils.logging import get_logger
 from app.nifty_tf.market_data import LibertyMarketData
 from app.nifty_tf.trigger import LibertyTrigger
 from app.slack import slack
 from app.fyers.oms.nifty_tf_oms import Nifty_OMS
+from app.nifty_tf.candle_aggregator import candle_aggregator
+from app.nifty_tf.candles import Candles, IST_OFFSET, SESSION_START
+from app.nifty_tf.swing import SwingTracker
+from app.nifty_tf.strategy_state import strategy_state
 
 class LibertySwing():
     """
-        New Approach to get Swings
-        1st of all, store the initial trigger time in:
-        1. trigger_time
-        2. swhTime
-        3. swlTime
-        Now just initalize SWH/SWL
-        It should fetch swhTime from DB itself, let it pull on every iteration.
-        Now, you have individual times for SWH and SWL.
-        Await 5 mins until len(df) >= 7. 7th is the candle which is being formed.
-        Now, once >=7 slice the df.iloc[:-1]['high'].max() and compare with swhTime candle
-        if swhTime[High] > df.iloc[:-1]['high'].max(): UPDATE swhPrice in DB & return
-        else: get the candle which was highest and update in DB
-        var = filtered_df_data.iloc[:-1][filtered_df_data.iloc[:-1]['high'] == filtered_df_data.iloc[:-1]['high'].max()]
-        update var.iloc[-1][datetime] wala jo bhi
+        Swings off the trigger time.
+        swhTime/swlTime start at the trigger time. Once 6 5min bars have closed after the reference
+        bar, it's the swing if none of them went beyond it, UPDATE swhPrice/swlPrice in DB & return.
+        Else the first bar holding the extreme becomes the reference and we wait again.
+        The reference and the extremes after it live in a SwingTracker fed one closed bar at a time,
+        the reference starts from and goes back to strategy_state (written behind, for a restart).
     """
     def __init__(self, db, fyers):
         self.logger = get_logger("LibertySwing")
@@ -35,141 +31,81 @@ class LibertySwing():
         self.place_order = Nifty_OMS(db, fyers)
     
     async def SWH(self) -> bool:
+        return await self._swing("SWH")
+
+    async def SWL(self) -> bool:
+        return await self._swing("SWL")
+
+    async def _closed_bars(self, tracker):
+        """Closed 5min bars after the last one the tracker saw, from the candle cache"""
+        candles = await self.LibertyMarketData.fetch_5min_candles()
+        if candles is None:
+            return []
+        closed = candles.ts + 300 <= datetime.now().timestamp()
+        fresh = closed if tracker.last_ts is None else closed & (candles.minute > tracker.last_ts)
+        return [(int(candles.minute[i]), float(candles.high[i]), float(candles.low[i])) for i in np.flatnonzero(fresh)]
+
+    async def _swing(self, name):
+        side, column, price_column = ("high", "swhTime", "swhPrice") if name == "SWH" else ("low", "swlTime", "swlPrice")
         try:
-            self.logger.info("SWH(): Starting to check SWH Formation")
-                            
+            self.logger.info(f"{name}(): Starting to check {name} Formation")
+            trigger_time = getattr(strategy_state.trigger, column)
+            if trigger_time is None:
+                return False
+            self.logger.info(f"{name}(): Reference starts at {trigger_time}")
+            tracker = SwingTracker(side, Candles.session_minute(trigger_time))
+            bar = None
+
             # Continue checking every 5 minutes until 12:25 PM
             while True:
                 # Hard stop at 12:25 PM
                 if datetime.now().time() >= time(12, 25): ### Remove this later
-                    self.logger.info("SWH(): Reached cutoff time 12:25 PM. Stopping Swing Formation Check checks")
-                    await slack.send_message("SWH(): Reached cutoff time 12:25 PM. Stopping Swing Formation Check checks")
-                    return False
-
-                trigger_time = await self.db.fetch_swing_trigger_time(swing="swhTime")
-                if trigger_time is None:
+                    self.logger.info(f"{name}(): Reached cutoff time 12:25 PM. Stopping Swing Formation Check checks")
+                    await slack.send_message(f"{name}(): Reached cutoff time 12:25 PM. Stopping Swing Formation Check checks")
                     return False
-                self.logger.info(f"SWH():trigger_time fetched from DB: {trigger_time}")
-
-                # If time is 9: 15, await till 9.20
-                if trigger_time == "09:15:00":
-                    if datetime.now().time() <= time(9, 20):
-                        next_check = await self.trigger.get_next_5min_interval()
-                        await self.trigger.wait_until_time(next_check)
 
+                if bar is not None and tracker.last_ts is not None and bar[0] - tracker.last_ts == 5:
+                    bars = [(bar[0], bar[1], bar[2])] # Live close right after the last bar we saw
+                else:
+                    bars = await self._closed_bars(tracker) # Start, restart or a gap in the feed
 
-                df_data = await self.LibertyMarketData.fetch_5min_data()
-                df_data['timestamp'] = pd.to_datetime(df_data['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                filtered_df_data = df_data[df_data['timestamp'].dt.time > pd.to_datetime(trigger_time).time()]
-                referenceCandle = df_data[df_data['timestamp'].dt.time == pd.to_datetime(trigger_time).time()]
+                for minute, high, low in bars:
+                    event = tracker.push(minute, high, low)
+                    if event is None:
+                        continue
+                    reference = Candles.clock(event[1])
+                    if event[0] == "moved":
+                        self.logger.info(f"{name}(): Reference moved to {reference}")
+                        strategy_state.update(**{column: reference})
+                        continue
 
-                if len(filtered_df_data) >= 7: 
-                    if referenceCandle.iloc[-1]['high'] >= filtered_df_data.iloc[:-1]['high'].max():
+                    referencePrice = event[2]
+                    if side == "high":
                         self.logger.info("SWH(): Swing High Found")
-                        if referenceCandle.iloc[-1]['high'] == math.ceil(referenceCandle.iloc[-1]['high']):
-                            swhPrice = math.ceil(referenceCandle.iloc[-1]['high']) + 1
-                        else:
-                            swhPrice = math.ceil(referenceCandle.iloc[-1]['high'])
-                        referenceCandle['timestamp'] = pd.to_datetime(referenceCandle['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                        
-                        ### Updating DB w/ SWH Price and Time
-                        sqlTrue = f'''UPDATE nifty.trigger_status 
-                        SET "swhPrice" = {swhPrice}, "swhTime" = '{str(referenceCandle.iloc[-1]['timestamp'].time())}'
-                        WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlTrue)
-
-                        # Setting Symbol for Buy Position
-                        try:
-                            await self.place_order.set_option_symbol(side="Buy",ltp=float(swhPrice))
-                        except Exception as e:
-                            self.logger.error("SWH(): Error Setting Symbol. Error: {e}")
-                        return True
+                        swingPrice = math.ceil(referencePrice) + 1 if referencePrice == math.ceil(referencePrice) else math.ceil(referencePrice)
                     else:
-                        df_cut = filtered_df_data.iloc[:-1]
-                        max_high = df_cut['high'].max()
-                        trigger_row = df_cut[df_cut['high'] == max_high]
-                        trigger_time = str(trigger_row['timestamp'].iloc[0].time())
-                        sqlUpdate = f'''UPDATE nifty.trigger_status 
-                        SET "swhTime" = '{trigger_time}'
-                        WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlUpdate)
-
-                # Wait for next 5-minute interval
-                next_check = await self.trigger.get_next_5min_interval()
-                await self.trigger.wait_until_time(next_check)
-
-        except Exception as e:
-            self.logger.error(f"SWH(): Error: {e}", exc_info=True)
-            print(f"SWH(): Error: {e}")
-            return False
-        
-    async def SWL(self) -> bool:
-        try:
-            self.logger.info("SWL(): Starting to check SWL Formation")
-                            
-            # Continue checking every 5 minutes until 12:25 PM
-            while True:
-                # Hard stop at 12:25 PM
-                if datetime.now().time() >= time(12, 25): ### Remove this later
-                    self.logger.info("SWL(): Reached cutoff time 12:25 PM. Stopping Swing Formation Check checks")
-                    await slack.send_message("SWL(): Reached cutoff time 12:25 PM. Stopping Swing Formation Check checks")
-                    return False
-                
-                trigger_time = await self.db.fetch_swing_trigger_time(swing="swlTime")
-                print("SWL()",trigger_time,type(trigger_time))
-                if trigger_time is None:
-                    return False
-                self.logger.info(f"SWL():trigger_time fetched from DB: {trigger_time}")
-                # If time is 9: 15, await till 9.20
-                if trigger_time == "09:15:00":
-                    if datetime.now().time() <= time(9, 20):
-                        next_check = await self.trigger.get_next_5min_interval()
-                        await self.trigger.wait_until_time(next_check)
+                        self.logger.info("SWL(): Swing Low Found")
+                        swingPrice = math.floor(referencePrice) - 1 if referencePrice == math.floor(referencePrice) else math.floor(referencePrice)
 
-                df_data = await self.LibertyMarketData.fetch_5min_data()
-                df_data['timestamp'] = pd.to_datetime(df_data['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                filtered_df_data = df_data[df_data['timestamp'].dt.time > pd.to_datetime(trigger_time).time()]
-                referenceCandle = df_data[df_data['timestamp'].dt.time == pd.to_datetime(trigger_time).time()]
+                    ### Swing Price and Time
+                    strategy_state.update(**{price_column: swingPrice, column: reference})
 
-                if len(filtered_df_data) >= 7: 
-                    if referenceCandle.iloc[-1]['low'] <= filtered_df_data.iloc[:-1]['low'].min():
-                        self.logger.info("SWL(): Swing Low Found")
-                        if referenceCandle.iloc[-1]['low'] == math.floor(referenceCandle.iloc[-1]['low']):
-                            swlPrice = math.floor(referenceCandle.iloc[-1]['low']) - 1
-                        else:
-                            swlPrice = math.floor(referenceCandle.iloc[-1]['low'])
-                        referenceCandle['timestamp'] = pd.to_datetime(referenceCandle['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-                        ### Updating DB w/ SWL Price and Time
-                        sqlTrue = f'''UPDATE nifty.trigger_status 
-                        SET "swlPrice" = {swlPrice}, "swlTime" = '{str(referenceCandle.iloc[-1]['timestamp'].time())}'
-                        WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlTrue)
-                        
-                        # Setting Symbol for Sell Position
-                        try:
-                            await self.place_order.set_option_symbol(side="Sell",ltp=float(swlPrice))
-                        except Exception as e:
-                            self.logger.error("SWH(): Error Setting Symbol. Error: {e}")                        
-                        return True
-                    else:
-                        df_cut = filtered_df_data.iloc[:-1]
-                        min_low = df_cut['low'].min()
-                        trigger_row = df_cut[df_cut['low'] == min_low]
-                        self.logger.info(f"Trigger_row:{trigger_row},df_cut:{df_cut},min_low:{min_low}")
-                        print("SWL(),",trigger_row,trigger_row['timestamp'].iloc[0].time())
-                        trigger_time = str(trigger_row['timestamp'].iloc[0].time()) ### This caused an issue, 27th May-> 9:55 and 10:00
-                        sqlUpdate = f'''UPDATE nifty.trigger_status 
-                            SET "swlTime" = '{trigger_time}'
-                            WHERE date = CURRENT_DATE '''
-                        await self.db.execute_query(sqlUpdate)
+                    # Setting Symbol for the Position
+                    try:
+                        await self.place_order.set_option_symbol(side="Buy" if side == "high" else "Sell", ltp=float(swingPrice))
+                    except Exception as e:
+                        self.logger.error(f"{name}(): Error Setting Symbol. Error: {e}")
+                    return True
 
-                # Wait for next 5-minute interval
-                next_check = await self.trigger.get_next_5min_interval()
-                await self.trigger.wait_until_time(next_check)
+                # Wait for the next 5-minute candle to close
+                closed = await candle_aggregator.wait_for_close(self.LibertyMarketData.symbol, "5", settle=3)
+                bar = None if closed is None else self._bar(closed)
 
         except Exception as e:
-            self.logger.error(f"SWL(): Error: {e}", exc_info=True)
-            print(f"SWL(): Error: {e}")
+            self.logger.error(f"{name}(): Error: {e}", exc_info=True)
             return False
 
-    
\ No newline at end of file
+    @staticmethod
+    def _bar(closed):
+        """(session minute, high, low) of a closed [ts, o, h, l, c, v] bar"""
+        return (int((closed[0] + IST_OFFSET) % 86400 // 60 - SESSION_START), float(closed[2]), float(closed[3]))
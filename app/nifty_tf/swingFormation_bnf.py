@@ -4,6 +4,7 @@ import asyncio
 import math
 
 from app.utils.logging import get_logger
+from app.utils.scheduler import scheduler
 from app.nifty_tf.market_data import LibertyMarketData
 from app.nifty_tf.trigger import LibertyTrigger
 from app.slack import slack
@@ -54,8 +55,7 @@ class LibertySwing():
                 # If time is 9: 15, await till 9.20
                 if trigger_time == "09:15:00":
                     if datetime.now().time() <= time(9, 20):
-                        next_check = await self.trigger.get_next_5min_interval()
-                        await self.trigger.wait_until_time(next_check)
+                        await scheduler.wait_next(5, "swing_bnf")
 
 
                 df_data = await self.LibertyMarketData.fetch_5min_data()
@@ -95,8 +95,7 @@ class LibertySwing():
                         await self.db.execute_query(sqlUpdate)
 
                 # Wait for next 5-minute interval
-                next_check = await self.trigger.get_next_5min_interval()
-                await self.trigger.wait_until_time(next_check)
+                await scheduler.wait_next(5, "swing_bnf")
 
         except Exception as e:
             self.logger.error(f"SWH(): Error: {e}", exc_info=True)
@@ -123,8 +122,7 @@ class LibertySwing():
                 # If time is 9: 15, await till 9.20
                 if trigger_time == "09:15:00":
                     if datetime.now().time() <= time(9, 20):
-                        next_check = await self.trigger.get_next_5min_interval()
-                        await self.trigger.wait_until_time(next_check)
+                        await scheduler.wait_next(5, "swing_bnf")
 
                 df_data = await self.LibertyMarketData.fetch_5min_data()
                 df_data['timestamp'] = pd.to_datetime(df_data['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
@@ -164,8 +162,7 @@ class LibertySwing():
                         await self.db.execute_query(sqlUpdate)
 
                 # Wait for next 5-minute interval
-                next_check = await self.trigger.get_next_5min_interval()
-                await self.trigger.wait_until_time(next_check)
+                await scheduler.wait_next(5, "swing_bnf")
 
         except Exception as e:
             self.logger.error(f"SWL(): Error: {e}", exc_info=True)
@@ -0,0 +1,85 @@
+from datetime import datetime, date
+from pydantic import BaseModel
+
+from app.utils.logging import get_logger
+from app.db.dbclass import db
+from app.db.write_behind import write_behind
+
+class SymbolSelection(BaseModel):
+    strategy: str # nifty / banknifty
+    side: str # Buy / Sell
+    symbol: str
+    selected_at: datetime
+
+class LibertySymbolRegistry:
+    """
+        Runtime symbol selections per strategy and side for today, e.g. the option picked at swing
+        formation that the breakout order should use.
+        Reads and writes are plain dict operations. Every change is persisted write-behind to
+        nifty.symbol_registry (app/sql/symbol_registry.sql) so a restarted process can load() it.
+    """
+    def __init__(self, db):
+        self.logger = get_logger("SymbolRegistry")
+        self.db = db
+        self._session = None
+        self._selections = {} # (strategy, side) -> SymbolSelection
+
+    def _check_session(self):
+        today = date.today()
+        if self._session != today:
+            self._session = today
+            self._selections = {}
+
+    async def load(self):
+        """Restore today's selections from the DB, call once at startup"""
+        try:
+            sql = '''
+                SELECT strategy, side, symbol, selected_at FROM nifty.symbol_registry
+                WHERE date = CURRENT_DATE
+                '''
+            rows = await self.db.fetch_query(sql)
+            self._check_session()
+            for row in rows or []:
+                self._selections[(row['strategy'], row['side'])] = SymbolSelection(**dict(row))
+            self.logger.info(f"load(): Restored {len(rows or [])} symbol selections")
+            return True
+        except Exception as e:
+            self.logger.error(f"load(): Error loading symbol selections: {e}")
+            return False
+
+    def set(self, strategy, side, symbol):
+        self._check_session()
+        selection = SymbolSelection(strategy=strategy, side=side, symbol=symbol, selected_at=datetime.now())
+        self._selections[(strategy, side)] = selection
+        write_behind.submit(
+            ("symbol_registry", strategy, side),
+            '''
+            INSERT INTO nifty.symbol_registry (date, strategy, side, symbol, selected_at)
+            VALUES (CURRENT_DATE, $1, $2, $3, $4)
+            ON CONFLICT (date, strategy, side)
+            DO UPDATE SET symbol = EXCLUDED.symbol, selected_at = EXCLUDED.selected_at
+            ''',
+            strategy, side, symbol, selection.selected_at
+        )
+        self.logger.info(f"set(): {strategy} {side} symbol: {symbol}")
+        return selection
+
+    def get(self, strategy, side):
+        """Today's symbol for strategy/side, None if nothing has been selected"""
+        self._check_session()
+        selection = self._selections.get((strategy, side))
+        return None if selection is None else selection.symbol
+
+    def clear(self, strategy):
+        """Forget today's selections of strategy"""
+        self._check_session()
+        for key in [key for key in self._selections if key[0] == strategy]:
+            del self._selections[key]
+        write_behind.submit(
+            ("symbol_registry", strategy, "clear"),
+            '''DELETE FROM nifty.symbol_registry WHERE date = CURRENT_DATE AND strategy = $1''',
+            strategy
+        )
+
+
+symbol_registry = LibertySymbolRegistry(db)
@@ -0,0 +1,89 @@
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+# One rule: between start and end (time of day), once the best RR since entry is in [rr_from, rr_to),
+# move the SL to the level that locks `lock` R (see playbook.trail_levels, -0.5 is "trail 50%").
+# side None applies to both Buy and Sell. rr_to None is open ended.
+TrailRule = namedtuple("TrailRule", "start end side rr_from rr_to lock")
+
+TRAIL_RULES = (
+    # Until 1:30 PM
+    TrailRule(time(9, 15), time(13, 30), None, 2, None, -0.5),
+    # 1:30 - 2:30 PM
+    TrailRule(time(13, 30), time(14, 30), None, 1, 2, -0.5),
+    TrailRule(time(13, 30), time(14, 30), None, 2, 2.5, 0.5),
+    TrailRule(time(13, 30), time(14, 30), None, 2.5, 3, 1),
+    TrailRule(time(13, 30), time(14, 30), None, 3, 3.25, 1.25),
+    TrailRule(time(13, 30), time(14, 30), None, 3.25, 3.5, 1.5),
+    TrailRule(time(13, 30), time(14, 30), None, 3.5, None, 1.75),
+    # 2:30 - 3:13 PM, Sell locks 1R from 2R and nothing extra at 2.5R
+    TrailRule(time(14, 30), time(15, 13), None, 1, 2, -0.5),
+    TrailRule(time(14, 30), time(15, 13), "Buy", 2, 2.5, 0.5),
+    TrailRule(time(14, 30), time(15, 13), "Buy", 2.5, 3, 1),
+    TrailRule(time(14, 30), time(15, 13), "Sell", 2, 2.5, 1),
+    TrailRule(time(14, 30), time(15, 13), None, 3, 3.25, 1.25),
+    TrailRule(time(14, 30), time(15, 13), None, 3.25, 3.5, 1.5),
+    TrailRule(time(14, 30), time(15, 13), None, 3.5, None, 1.75),
+)
+
+class LibertyTrail:
+    """
+        Trailing stop for one position, fed price by price.
+        Keeps the running max high (Buy) / min low (Sell) since entry, so every update() is a
+        compare, a division and a look-up in the few rules of the current window. It returns the
+        new SL price when a rule asks for a tighter SL than the last one handed out, else None.
+        Prices of the entry minute (entered_at) don't count, like the 1min bar loop skipping the entry bar.
+    """
+    def __init__(self, side, entry_price, initial_sl_points, levels, rules=TRAIL_RULES, entered_at=None):
+        self.side = side
+        self.entry_price = entry_price
+        self.initial_sl_points = initial_sl_points
+        self.levels = dict(levels) # locked R -> SL price
+        self.extreme = None
+        self.max_rr = 0
+        self.sl_price = None # Last SL handed out
+        self.track_from = None # Start of the minute after entry
+        if entered_at is not None:
+            self.track_from = (datetime.combine(date.today(), entered_at.replace(second=0, microsecond=0)) + timedelta(minutes=1)).time()
+        # Rules of each window for our side, in RR order
+        self._windows = {}
+        for rule in rules:
+            if rule.side in (None, side):
+                self._windows.setdefault((rule.start, rule.end), []).append(rule)
+        for window in self._windows.values():
+            window.sort(key=lambda rule: rule.rr_from)
+
+    def _rules(self, now):
+        for (start, end), rules in self._windows.items():
+            if start <= now < end:
+                return rules
+        return ()
+
+    def update(self, price, now):
+        """price: tick or bar high/low, now: time of day. New SL price or None."""
+        if self.track_from is not None and now < self.track_from:
+            return None
+        if self.side == "Buy":
+            if self.extreme is None or price > self.extreme:
+                self.extreme = price
+                self.max_rr = (price - self.entry_price) / self.initial_sl_points
+        else:
+            if self.extreme is None or price < self.extreme:
+                self.extreme = price
+                self.max_rr = (self.entry_price - price) / self.initial_sl_points
+        return self.check(now)
+
+    def check(self, now):
+        """Apply the rules of now's window to the best RR so far"""
+        rr = round(self.max_rr, 2)
+        lock = None
+        for rule in self._rules(now):
+            if rr >= rule.rr_from and (rule.rr_to is None or rr < rule.rr_to):
+                lock = rule.lock
+        if lock is None:
+            return None
+        sl_price = self.levels[lock]
+        if self.sl_price is not None and (sl_price <= self.sl_price if self.side == "Buy" else sl_price >= self.sl_price):
+            return None
+        self.sl_price = sl_price
+        return sl_price
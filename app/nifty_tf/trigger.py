@@ -7,6 +7,7 @@ import asyncio
 import pytz
 
 from app.utils.logging import get_logger
+from app.utils.scheduler import scheduler
 from app.nifty_tf.market_data import LibertyMarketData
 
 class LibertyTrigger():
@@ -49,14 +50,9 @@ class LibertyTrigger():
         
     async def ATR(self) -> bool:
         try:
-            while True:
-                if datetime.now().time() < time(9, 20):
-                    next_check = await self.get_next_5min_interval()
-                    await self.wait_until_time(next_check)
-                    break
-                else:
-                    break
-            await asyncio.sleep(3) ### Even after 9.20 waiting a few seconds
+            if datetime.now().time() < time(9, 20):
+                await scheduler.wait_next(5, "atr")
+            await scheduler.sleep(3, "atr") ### Even after 9.20 waiting a few seconds
             df_today = await self.LibertyMarketData.fetch_5min_data()
             df_today['timestamp'] = pd.to_datetime(df_today['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')         
 
@@ -98,8 +94,8 @@ class LibertyTrigger():
             if now < time(9, 25):
                 # Too early - wait until 9:25 to start
                 self.logger.info("range_break(): Waiting till 9.25, if triggered before it.")
-                await self.wait_until_start_time(time(9, 25))
-                await asyncio.sleep(3)           
+                await scheduler.at(time(9, 25), "range_break")
+                await scheduler.sleep(3, "range_break")
             df = await self.LibertyMarketData.fetch_5min_data()
             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')                        
             self.logger.info(f"range_break(): Checking")
@@ -135,7 +131,7 @@ class LibertyTrigger():
         if now < time(9, 25):
             # Too early - wait until 9:25 to start
             self.logger.info("Waiting till 9.25, if triggered before it.")
-            await self.wait_until_start_time(time(9, 25))
+            await scheduler.at(time(9, 25), "range_break")
         elif now >= time(12, 25):
             # Too late - past cutoff time
             print("Already past cutoff time of 12:25 PM. Strategy will not start.")
@@ -161,8 +157,7 @@ class LibertyTrigger():
                 return False
                 
             # Wait for next 5-minute interval
-            next_check = await self.get_next_5min_interval()
-            await self.wait_until_time(next_check)
+            await scheduler.wait_next(5, "range_break")
             
             # Check if trigger condition is met
             is_triggered = await self.range_break(range_val)
@@ -170,73 +165,3 @@ class LibertyTrigger():
             if is_triggered:
                 print("Trigger condition met!")
                 return True
-    
-    async def wait_until_start_time(self, target_time):
-        """Wait until the specified start time before beginning checks"""
-        now = datetime.now()
-        target = datetime.now().replace(
-            hour=target_time.hour, 
-            minute=target_time.minute, 
-            second=0, 
-            microsecond=0
-        )
-        
-        # If target time is in the future today
-        if now < target:
-            wait_seconds = (target - now).total_seconds()
-            print(f"Waiting {wait_seconds} seconds until {target_time}")
-            await asyncio.sleep(wait_seconds)
-        else:
-            # If we're already past the target time, don't wait
-            print(f"Already past start time {target_time}. Beginning immediately.")
-    
-    async def wait_until_time(self, target_time):
-        """Wait until a specific time"""
-        now = datetime.now()
-        target = datetime.now().replace(
-            hour=target_time.hour, 
-            minute=target_time.minute, 
-            second=0, 
-            microsecond=0
-        )
-        
-        # If target is in the past, add 5 minutes until it's in the future
-        while now >= target:
-            target = target.replace(minute=target.minute + 5)
-            # Handle hour rollover
-            if target.minute >= 60:
-                target = target.replace(hour=target.hour + 1, minute=target.minute - 60)
-            
-        wait_seconds = (target - now).total_seconds()
-        print(f"Next check at {target.time()}, waiting {wait_seconds:.2f} seconds")
-        await asyncio.sleep(wait_seconds)
-    
-    async def get_next_5min_interval(self):
-        """Get the next 5-minute interval time"""
-        now = datetime.now()
-        current_minute = now.minute
-        # Calculate the next 5-minute mark
-        next_5min = ((current_minute // 5) + 1) * 5
-        
-        # Handle hour rollover
-        new_hour = now.hour
-        if next_5min >= 60:
-            new_hour += 1
-            next_5min -= 60
-            
-        return time(new_hour, next_5min)
-    
-    async def get_next_1min_interval(self):
-        """Get the next 5-minute interval time"""
-        now = datetime.now()
-        current_minute = now.minute
-        # Calculate the next 5-minute mark
-        next_5min = ((current_minute // 1) + 1) * 1 
-        
-        # Handle hour rollover
-        new_hour = now.hour
-        if next_5min >= 60:
-            new_hour += 1
-            next_5min -= 60
-            
-        return time(new_hour, next_5min)
\ No newline at end of file
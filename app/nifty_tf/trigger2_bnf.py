@@ -8,7 +8,10 @@ import pytz
 
 from app.utils.logging import get_logger
 from app.nifty_tf.market_data_bnf import LibertyMarketData
+from app.nifty_tf.strategy_state import strategy_state
 from app.slack import slack
+from app.nifty_tf.candle_aggregator import candle_aggregator
+from app.nifty_tf.candles import Candles, IST_OFFSET, SESSION_START
 
 class LibertyTrigger():
     def __init__(self, db, fyers):
@@ -17,25 +20,54 @@ class LibertyTrigger():
         self.fyers = fyers
         self.LibertyMarketData = LibertyMarketData(db, fyers)
 
-    async def pct_trigger(self, range) -> bool:
+    @staticmethod
+    def _bar(closed):
+        """(session minute, open, high, low, close) of a closed [ts, o, h, l, c, v] bar"""
+        return (int((closed[0] + IST_OFFSET) % 86400 // 60 - SESSION_START), float(closed[1]), float(closed[2]), float(closed[3]), float(closed[4]))
+
+    async def _closed_bars(self, after=None):
+        """Closed 5min bars after session minute after (all if None), from the candle cache"""
+        candles = await self.LibertyMarketData.fetch_5min_candles()
+        if candles is None:
+            return []
+        closed = candles.ts + 300 <= datetime.now().timestamp()
+        if after is not None:
+            closed &= candles.minute > after
+        return [(int(candles.minute[i]), float(candles.open[i]), float(candles.high[i]), float(candles.low[i]), float(candles.close[i])) for i in np.flatnonzero(closed)]
+
+    async def _first_bar(self, resolution, settle):
+        """
+            The 9.15 bar of resolution, straight off its close when the feed is live.
+            After a restart (or with the feed down) it's read from the candle cache.
+        """
+        closed = None
+        while datetime.now().time() < time(9, 15 + int(resolution)):
+            closed = await candle_aggregator.wait_for_close(self.LibertyMarketData.symbol, resolution, settle=settle)
+            if closed is not None and self._bar(closed)[0] >= 0:
+                break
+        if closed is not None and self._bar(closed)[0] == 0:
+            return self._bar(closed)
+        if resolution == "1":
+            candles = await self.LibertyMarketData.fetch_1min_candles()
+        else:
+            candles = await self.LibertyMarketData.fetch_5min_candles()
+        if candles is None or len(candles) == 0 or candles.minute[0] != 0:
+            return None
+        return (0, float(candles.open[0]), float(candles.high[0]), float(candles.low[0]), float(candles.close[0]))
+
+    async def pct_trigger(self, range):
+        """Handler for the 9.15 1min bar close: its open against the previous day's close, [triggered, change]"""
         try:
-            while True:
-                if datetime.now().time() < time(9, 16, 15):
-                    next_check = await self.get_next_1min_interval()
-                    await self.wait_until_time(next_check)
-                    break
-                else:
-                    break            
-            min1_df = await self.LibertyMarketData.fetch_1min_data()
-            min1_df['timestamp'] = pd.to_datetime(min1_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
+            # Previous day's close, precomputed the evening before. Read before the close so the check doesn't wait on it
+            pdc = (await self.LibertyMarketData.fetch_prevDay_features())['pdc']
 
-            # Getting Previous Day DF
-            prevDay_df = await self.LibertyMarketData.fetch_prevDay_1D_data()
-            prevDay_df['timestamp'] = pd.to_datetime(prevDay_df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-            pdc = prevDay_df.iloc[0]['close']
-            
-            # change = round((min1_df.iloc[0]['open'] - range['pdc']) / range['pdc'] * 100, 2)
-            change = round((min1_df.iloc[0]['open'] - pdc) / pdc * 100, 2)
+            # REST fallback reads the bar 15 seconds after 9.16
+            bar = await self._first_bar("1", settle=15)
+            if bar is None:
+                self.logger.error(f"pct_trigger(): No 9.15 candle")
+                return [False, 0.0]
+
+            change = round((bar[1] - pdc) / pdc * 100, 2)
             asyncio.create_task(slack.send_message(f"Percent Change is {change}",webhook_name="banknifty"))
             if change >= 0.3 and change <= 1.0:
                 self.logger.info(f"pct_trigger(): Triggered. Percent Change is {change}")
@@ -51,39 +83,35 @@ class LibertyTrigger():
             return False
         
     async def ATR(self,opening_percent):
+        """Handler for the 9.15 5min bar close: its body against the previous day's last 10 bodies, [triggered, direction, poi]"""
         try:
-            while True:
-                if datetime.now().time() < time(9, 20):
-                    next_check = await self.get_next_5min_interval()
-                    await self.wait_until_time(next_check)
-                    break
-                else:
-                    break
-            await asyncio.sleep(3) ### Even after 9.20 waiting a few seconds
-            df_today = await self.LibertyMarketData.fetch_5min_data()
-            df_today['timestamp'] = pd.to_datetime(df_today['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')         
+            prevDay = await self.LibertyMarketData.fetch_prevDay_features()
 
-            df_prevDay = await self.LibertyMarketData.fetch_prevDay_5min_data()
-            df_prevDay['timestamp'] = pd.to_datetime(df_prevDay['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')                      
+            # REST fallback reads the bar a few seconds after 9.20
+            bar = await self._first_bar("5", settle=3)
+            if bar is None:
+                self.logger.error(f"ATR(): No 9.15 candle")
+                return [False,"N/A",0.0]
+            _, open_, high, low, close = bar
 
-            average_prev_body = (df_prevDay['close'] - df_prevDay['open']).abs().tail(10).mean()
+            average_prev_body = prevDay['avg_body_10']
             if average_prev_body != 0:
-                atrVal = round(((abs(df_today.iloc[0]['close'] - df_today.iloc[0]['open']) - average_prev_body) / average_prev_body) * 100,2)
+                atrVal = round(float((abs(close - open_) - average_prev_body) / average_prev_body) * 100,2)
             else:
                 atrVal = 0
             self.logger.info(f"ATR(): ATR Value: {atrVal}")
 
-            if df_today.iloc[0]['close'] > df_today.iloc[0]['open']:
+            if close > open_:
                 direction = "Buy"
-                poi = round(df_today.iloc[0]['high'])+1
-            if df_today.iloc[0]['close'] < df_today.iloc[0]['open']:
+                poi = round(high)+1
+            if close < open_:
                 direction = "Sell"
-                poi = round(df_today.iloc[0]['low'])-1
+                poi = round(low)-1
 
             asyncio.create_task(slack.send_message(f"ATR(): ATR Value: {atrVal} direction:{direction} poi: {poi} ",webhook_name="banknifty"))            
             """Checking Criteria 1"""
             if atrVal >= 1000 and atrVal <= 1500:
-                return [True,direction.poi]
+                return [True,direction,poi]
 
             """Checking Criteria 2: Dynamic Calculation"""
             dynamic_cbab_calculator_result = self.dynamic_cbab_calculator(opening_percent=opening_percent, CBAB_value=atrVal)
@@ -98,175 +126,60 @@ class LibertyTrigger():
             self.logger.error(f"ATR(): Error fetching today 5min candle data: {e}", exc_info=True)
             return [False,"N/A",0.0]
         
-    async def range_break(self, range) -> bool:
+    async def range_break(self, range, bar) -> bool:
+        """Handler for one closed 5min bar (session minute, open, high, low, close): did it go through either side of the range"""
         try: 
-            now = datetime.now().time()
-            
-            # Check if we're in the valid time window
-            if now < time(9, 25):
-                # Too early - wait until 9:25 to start
-                self.logger.info("range_break(): Waiting till 9.25, if triggered before it.")
-                await self.wait_until_start_time(time(9, 25))
-                await asyncio.sleep(3)           
-            df = await self.LibertyMarketData.fetch_5min_data()
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')                        
-            self.logger.info(f"range_break(): Checking")
-
-            for i,r in df.iterrows():
-                if df.iloc[i]['high'] > range['high'] or df.iloc[i]['low'] < range['low']:
-                    self.logger.info(f"range_break(): Triggered")
-                    trigger_time = str(df['timestamp'].iloc[i].time())
-                    sql = f'''UPDATE nifty.trigger_status 
-                    SET "range" = TRUE, "trigger_index" = 0, "trigger_time" = '{trigger_time}', "swhTime" = '{trigger_time}', "swlTime" = '{trigger_time}'
-                    WHERE "date" = CURRENT_DATE '''
-                    sql = f"""
-                            UPDATE nifty.trigger_status
-                            SET "range" = TRUE,
-                                "trigger_index" = '{i}',
-                                "trigger_time" = '{trigger_time}',
-                                "swhTime" = '{trigger_time}',
-                                "swlTime" = '{trigger_time}'
-                            WHERE "date" = CURRENT_DATE;
-                            """.strip()
-                    await self.db.execute_query(sql)
-                    asyncio.create_task(self.db.update_status(status='Awaiting Swing Formation'))
-                    await slack.send_message(f"range_break(): Triggered.")
-                    self.logger.info(f"range_break(): Triggered.")                    
-                    return True
-                
-                ### If not returned from loop, then returning False
-                self.logger.info(f"range_break(): Not Triggered.")                    
-                sql = '''UPDATE nifty.trigger_status 
-                SET range = FALSE
-                WHERE date = CURRENT_DATE '''                    
-                await self.db.execute_query(sql)
+            minute, _, high, low, _ = bar
+            if high > range['high'] or low < range['low']:
+                trigger_time = Candles.clock(minute)
+                strategy_state.update(range=True, trigger_index=minute // 5, trigger_time=trigger_time, swhTime=trigger_time, swlTime=trigger_time)
+                strategy_state.set_status('Awaiting Swing Formation')
+                asyncio.create_task(slack.send_message(f"range_break(): Triggered."))
+                self.logger.info(f"range_break(): Triggered by the {trigger_time} candle.")
+                return True
             return False
                     
         except Exception as e:
-            self.logger.error(f"range_break(): Error fetching min1 data: {e}", exc_info=True)
+            self.logger.error(f"range_break(): Error checking candle {bar}: {e}", exc_info=True)
             return False
 
     async def check_triggers_until_cutoff(self, range_val):
-        """Check triggers every 5 minutes until 12:25 PM"""
-        now = datetime.now().time()
-        
-        # Check if we're in the valid time window
-        if now < time(9, 25):
-            # Too early - wait until 9:25 to start
-            self.logger.info("check_triggers_until_cutoff(): Waiting till 9.25, if triggered before it.")
-            await self.wait_until_start_time(time(9, 25))
-            # Check if trigger condition is met
-            is_triggered = await self.range_break(range_val)
-            if is_triggered:
-                print("Trigger condition met!")
-                self.logger.info("check_triggers_until_cutoff(): Trigger condition met!")
-                return True            
-        elif now >= time(12, 25):
-            # Too late - past cutoff time
-            print("Already past cutoff time of 12:25 PM. Strategy will not start.")
+        """
+            Feeds range_break every 5min bar as it closes until 12.25.
+            Nothing is decided before the 9.20 bar closes at 9.25, then the bars closed so far are
+            caught up from the candle cache (also after a restart or a gap in the feed) and every
+            live close after that is checked on its own.
+        """
+        if datetime.now().time() >= time(12, 25):
+            self.logger.info("check_triggers_until_cutoff(): Already past cutoff time of 12:25 PM. Strategy will not start.")
             return False
-        else:
-            # Between 9:25 and 12:25 - start immediately
-            print(f"App restarted at {now}. Beginning immediately.")
-            
-            # Important: If the app restarted mid-interval, check immediately
-            # and then align to the 5-minute schedule
-            is_triggered = await self.range_break(range_val)
-            if is_triggered:
-                print("Trigger condition met on immediate check after restart!")
-                return True
-        
-        # Continue checking every 5 minutes until 12:25 PM
+        if datetime.now().time() < time(9, 25):
+            self.logger.info("check_triggers_until_cutoff(): Waiting till 9.25, if triggered before it.")
+        last = None # Session minute of the last bar checked
+        bar = None
         while True:
-            now = datetime.now().time()
-            
+            if datetime.now().time() >= time(9, 25):
+                if bar is not None and last is not None and bar[0] - last == 5:
+                    bars = [bar] # Live close right after the last bar we checked
+                else:
+                    bars = await self._closed_bars(last) # Start, restart or a gap in the feed
+                for closed in bars:
+                    last = closed[0]
+                    if await self.range_break(range_val, closed):
+                        self.logger.info("check_triggers_until_cutoff(): Trigger condition met!")
+                        return True
+
             # Hard stop at 12:25 PM
-            if now >= time(12, 25):
-                print("Reached cutoff time 12:25 PM. Stopping trigger checks.")
+            if datetime.now().time() >= time(12, 25):
                 self.logger.info("check_triggers_until_cutoff(): Reached cutoff time 12:25 PM. Stopping trigger checks.")
+                strategy_state.update(range=False)
                 return False
-                
-            # Wait for next 5-minute interval
-            next_check = await self.get_next_5min_interval()
-            await self.wait_until_time(next_check)
-            
-            # Check if trigger condition is met
-            is_triggered = await self.range_break(range_val)
-            if is_triggered:
-                print("Trigger condition met!")
-                self.logger.info("check_triggers_until_cutoff(): Trigger condition met!")
-                return True
-    
-    async def wait_until_start_time(self, target_time):
-        """Wait until the specified start time before beginning checks"""
-        now = datetime.now()
-        target = datetime.now().replace(
-            hour=target_time.hour, 
-            minute=target_time.minute, 
-            second=0, 
-            microsecond=0
-        )
-        
-        # If target time is in the future today
-        if now < target:
-            wait_seconds = (target - now).total_seconds()
-            print(f"Waiting {wait_seconds} seconds until {target_time}")
-            await asyncio.sleep(wait_seconds)
-        else:
-            # If we're already past the target time, don't wait
-            print(f"Already past start time {target_time}. Beginning immediately.")
-    
-    async def wait_until_time(self, target_time):
-        """Wait until a specific time"""
-        now = datetime.now()
-        target = datetime.now().replace(
-            hour=target_time.hour, 
-            minute=target_time.minute, 
-            second=0, 
-            microsecond=0
-        )
-        
-        # If target is in the past, add 5 minutes until it's in the future
-        while now >= target:
-            target = target.replace(minute=target.minute + 5)
-            # Handle hour rollover
-            if target.minute >= 60:
-                target = target.replace(hour=target.hour + 1, minute=target.minute - 60)
-            
-        wait_seconds = (target - now).total_seconds()
-        print(f"Next check at {target.time()}, waiting {wait_seconds:.2f} seconds")
-        await asyncio.sleep(wait_seconds)
-    
-    async def get_next_5min_interval(self):
-        """Get the next 5-minute interval time"""
-        now = datetime.now()
-        current_minute = now.minute
-        # Calculate the next 5-minute mark
-        next_5min = ((current_minute // 5) + 1) * 5
-        
-        # Handle hour rollover
-        new_hour = now.hour
-        if next_5min >= 60:
-            new_hour += 1
-            next_5min -= 60
-            
-        return time(new_hour, next_5min)
-    
-    async def get_next_1min_interval(self):
-        """Get the next 1-minute interval time"""
-        now = datetime.now()
-        current_minute = now.minute
-        # Calculate the next 5-minute mark
-        next_5min = ((current_minute // 1) + 1) * 1 
-        
-        # Handle hour rollover
-        new_hour = now.hour
-        if next_5min >= 60:
-            new_hour += 1
-            next_5min -= 60
-            
-        return time(new_hour, next_5min)
+
+            # Wait for the next 5-minute candle to close
+            closed = await candle_aggregator.wait_for_close(self.LibertyMarketData.symbol, "5", settle=3)
+            bar = None if closed is None else self._bar(closed)
     
+
     def dynamic_cbab_calculator(self, opening_percent, CBAB_value,
                                 gap_low=0.30, gap_high=1.00,
                                 CBAB_MIN_AT_LOW=300, CBAB_MIN_AT_HIGH=800,
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+from app.utils.logging import get_logger
+from app.utils.calendar import trading_calendar
+from app.utils.scheduler import scheduler
+from app.utils.metrics import metrics
+from app.db.dbclass import db
+from app.slack import slack
+from app.fyers.instruments import instruments
+from app.fyers.market_feed import market_feed
+from app.fyers.order_stream import order_stream
+from app.fyers.option_chain import option_chain
+from app.nifty_tf.candles import Candles
+from app.nifty_tf.candle_cache import candles_frame
+from app.nifty_tf.swing import SwingTracker
+from app.nifty_tf.strategy_state import TriggerStatus, strategy_state
+
+WARMUP_LEAD = timedelta(minutes=15) # Warm-up starts this long before the open (9.00)
+WARMUP_DEADLINE = timedelta(minutes=1) # and has to be done by this long before it (9.14)
+POOL_WARM = 3 # DB connections opened and pinged
+SOCKET_TIMEOUT = 30 # Seconds we wait for the feed and order sockets to connect
+
+class LibertyWarmup:
+    """
+        Pre-open stage, run by main before the strategy between 9.00 and 9.14.
+        Does once, before the open, everything the first decisions would otherwise pay for at 9.15:
+        DB pool connections, feed and order sockets, instrument master lookups, the previous session's
+        features, the option ladders around the previous close and a pass over the candle / swing /
+        pandas code paths on the previous session's bars.
+        Every step is timed (warmup.<step>_ms in metrics) and a failed step is logged and skipped,
+        the strategy does the same work lazily anyway.
+    """
+    def __init__(self, db):
+        self.logger = get_logger("Warmup")
+        self.db = db
+        self.timings = {} # step -> ms
+
+    async def run(self, market_data, underlying, strike_interval, webhook_name=None):
+        """Wait for the warm-up window if it's early, then warm up. Never raises."""
+        session_open = trading_calendar.session_open()
+        if datetime.now() < session_open - WARMUP_LEAD:
+            self.logger.info(f"run(): Waiting till {(session_open - WARMUP_LEAD).time()} to warm up")
+            await scheduler.at(session_open - WARMUP_LEAD, "warmup")
+        # After a restart in the session there's no window left, still warm up but don't hang on it
+        timeout = max(scheduler.seconds_until(session_open - WARMUP_DEADLINE), SOCKET_TIMEOUT)
+        try:
+            await asyncio.wait_for(self._run(market_data, underlying, strike_interval), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"run(): Warm-up didn't finish in {timeout:.0f}s, carrying on cold. Done: {self.timings}")
+        except Exception as e:
+            self.logger.error(f"run(): Error warming up: {e}", exc_info=True)
+        self.logger.info(f"run(): Warm-up done (ms): {self.timings}")
+        asyncio.create_task(slack.send_message(f"Warm-up done (ms): {self.timings}", webhook_name=webhook_name))
+
+    async def _run(self, market_data, underlying, strike_interval):
+        self.timings = {}
+        await self._step("sockets", self._sockets)
+        await self._step("db", self._db)
+        await self._step("instruments", self._instruments, underlying)
+        features = await self._step("features", market_data.fetch_prevDay_features)
+        if features:
+            await self._step("quotes", self._quotes, market_data, underlying, strike_interval, features["pdc"])
+        await self._step("hot_paths", self._hot_paths, market_data)
+        await self._step("connected", self._connected)
+
+    async def _step(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            result = await func(*args)
+        except Exception as e:
+            self.logger.error(f"_step(): {name} failed: {e}", exc_info=True)
+            result = None
+        elapsed = (time.perf_counter() - start) * 1000
+        self.timings[name] = round(elapsed, 1)
+        metrics.observe(f"warmup.{name}_ms", elapsed)
+        return result
+
+    async def _sockets(self):
+        """Start the feed and order socket threads, they connect while the other steps run"""
+        market_feed.start()
+        order_stream.start()
+        return True
+
+    async def _db(self):
+        """Open POOL_WARM pool connections (concurrent acquires) and ping each"""
+        results = await asyncio.gather(*(self.db.fetch_query("SELECT 1") for _ in range(POOL_WARM)))
+        if any(result is None for result in results):
+            raise Exception("DB ping failed")
+        return True
+
+    async def _instruments(self, underlying):
+        """Today's master on disk and loaded, and the expiry look-ups the option selection makes"""
+        if not await instruments.refresh():
+            raise Exception("Instrument master not loaded")
+        instruments.nearest_expiry(underlying, "OPT")
+        return instruments.future(underlying)
+
+    async def _quotes(self, market_data, underlying, strike_interval, pdc):
+        """Watch both option ladders around the previous close so their books fill from the first ticks"""
+        for side in ("Buy", "Sell"):
+            option_chain.watch(underlying, side, pdc, strike_interval)
+        quotes = await market_data.fetch_quotes([market_data.symbol])
+        if quotes is None:
+            raise Exception(f"No quote for {market_data.symbol}")
+        return quotes
+
+    async def _hot_paths(self, market_data):
+        """One pass over the open-time code paths on the previous session's 5min bars"""
+        df = await market_data.fetch_prevDay_5min_data()
+        if df is None or len(df) == 0:
+            raise Exception("No previous session candles")
+        candles = Candles.from_rows(df.values)
+        candles.body()[-10:].mean()
+        candles.rolling_max(6)
+        candles.rolling_min(6)
+        np.flatnonzero((candles.high > candles.high[0]) | (candles.low < candles.low[0]))
+        candles.time_at(len(candles) - 1)
+        candles_frame(candles)
+        for side in ("high", "low"):
+            tracker = SwingTracker(side, int(candles.minute[0]))
+            for i in range(len(candles)):
+                tracker.push(int(candles.minute[i]), float(candles.high[i]), float(candles.low[i]))
+        TriggerStatus(**strategy_state.trigger.model_dump())
+        return len(candles)
+
+    async def _connected(self):
+        """Wait for the feed and order sockets to report connected"""
+        deadline = time.monotonic() + SOCKET_TIMEOUT
+        while not (market_feed.is_connected() and order_stream.is_connected()):
+            if time.monotonic() > deadline:
+                raise Exception(f"Sockets not connected, feed: {market_feed.is_connected()} orders: {order_stream.is_connected()}")
+            await scheduler.sleep(0.2, "warmup_sockets")
+        return True
+
+
+warmup = LibertyWarmup(db)
@@ -2,46 +2,20 @@ import asyncio
 import sys
 import signal
 import os
-from dotenv import load_dotenv, set_key, find_dotenv
-from datetime import date
 
 from app.utils.logging import get_logger
 from app.utils.logging import setup_logging
+from app.utils.calendar import trading_calendar
 from app.db.dbclass import db
 from app.fyers.client import fyersClient
 from app.nifty_tf.strategy_main import LibertyFlow
 from app.nifty_tf.range import LibertyRange
 from app.slack import slack
+from app.nifty_tf.symbol_registry import symbol_registry
+from app.db.write_behind import write_behind
 
 logger = get_logger("RANGE_UPDATE")
 
-def today_holiday():
-    """
-    Check if today's date is a holiday.
-    Returns 0 if today matches any of the specified holiday dates.
-    """
-    # List of holiday dates
-    holiday_dates = [
-        date(2026, 1, 15),   # 15-Jan-2026 Municipal Corporation Holiday
-        date(2026, 1, 26),   # 26-Jan-2026
-        date(2026, 3, 3),    # 03-Mar-2026
-        date(2026, 3, 26),   # 26-Mar-2026
-        date(2026, 3, 31),   # 31-Mar-2026
-        date(2026, 4, 3),    # 03-Apr-2026
-        date(2026, 4, 14),   # 14-Apr-2026
-        date(2026, 5, 1),    # 01-May-2026
-        date(2026, 5, 28),   # 28-May-2026
-        date(2026, 6, 26),   # 26-Jun-2026
-        date(2026, 9, 14),   # 14-Sep-2026
-        date(2026, 10, 2),   # 02-Oct-2026
-        date(2026, 10, 20),  # 20-Oct-2026
-        date(2026, 11, 10),  # 10-Nov-2026
-        date(2026, 11, 24),  # 24-Nov-2026
-        date(2026, 12, 25),  # 25-Dec-2026
-    ]
-    today = date.today()
-    return today in holiday_dates
-
 async def main():
     # Setup logging first
     setup_logging()
@@ -49,7 +23,7 @@ async def main():
     asyncio.create_task(slack.send_message("Updating Range for the Day"))
     
     try:
-        if today_holiday():
+        if not trading_calendar.is_trading_day():
             logger.info("Today is a holiday. Skipping trading session.")
             await slack.send_message("Today is a holiday.")
             return 0        
@@ -75,11 +49,8 @@ async def main():
         if range_val is not None:
             await range.update_range(range_val)       
                  
-        # dotenv_path = find_dotenv(filename="/mnt/LibertyFlow/LibertyFlow_v002/.env")
-        dotenv_path = "/mnt/LibertyFlow/LibertyFlow_v002/.env"
-        load_dotenv(dotenv_path, override=True)       
-        set_key(dotenv_path, 'NIFTY_BUY_SYMBOL', "")
-        set_key(dotenv_path, 'NIFTY_SELL_SYMBOL', "")
+        symbol_registry.clear("nifty")
+        await write_behind.flush()
         logger.info("Cleared Nifty Buy and Sell Symbols")
     except Exception as e:
         logger.error(f"Error in main function: {str(e)}", exc_info=True)
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS nifty.session_features (
+    date date NOT NULL,
+    symbol text NOT NULL,
+    pdo double precision NOT NULL,
+    pdh double precision NOT NULL,
+    pdl double precision NOT NULL,
+    pdc double precision NOT NULL,
+    avg_body_10 double precision NOT NULL,
+    computed_at timestamp NOT NULL,
+    PRIMARY KEY (date, symbol)
+);
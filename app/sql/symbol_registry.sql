@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS nifty.symbol_registry (
+    date date NOT NULL,
+    strategy text NOT NULL,
+    side text NOT NULL,
+    symbol text NOT NULL,
+    selected_at timestamp NOT NULL,
+    PRIMARY KEY (date, strategy, side)
+);
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS nifty.trade_latency (
+    date date NOT NULL,
+    strategy text NOT NULL,
+    started_at timestamp NOT NULL,
+    symbol text,
+    order_id text,
+    stages jsonb NOT NULL,
+    PRIMARY KEY (date, strategy, started_at)
+);
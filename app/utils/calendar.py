@@ -0,0 +1,109 @@
+import json
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+from app.utils.logging import get_logger
+
+CALENDAR_FILE = Path(__file__).with_name("nse_calendar.json")
+
+class LibertyCalendar:
+    """
+        NSE trading calendar from nse_calendar.json (holidays and special sessions, one block per year).
+        Every day of the covered years is indexed once at load: session days get their position in the
+        session list, other days point at the next session, so previous / next trading day and session
+        open / close are dict look-ups. Days outside the covered years fall back to weekdays with a warning,
+        add the new year's holidays to the file before it starts.
+    """
+    def __init__(self, path=CALENDAR_FILE):
+        self.logger = get_logger("Calendar")
+        self._warned = set()
+        self.load(path)
+
+    def load(self, path=CALENDAR_FILE):
+        with open(path) as f:
+            data = json.load(f)
+        self.open = time.fromisoformat(data["session"]["open"])
+        self.close = time.fromisoformat(data["session"]["close"])
+        self.holidays = {date.fromisoformat(day): name for day, name in data["holidays"].items()}
+        self.special = {} # date -> (open, close) for sessions off the usual hours / on weekends
+        for day, session in data.get("special_sessions", {}).items():
+            self.special[date.fromisoformat(day)] = (time.fromisoformat(session["open"]), time.fromisoformat(session["close"]))
+        self.first = date(min(data["years"]), 1, 1)
+        self.last = date(max(data["years"]), 12, 31)
+        self._sessions = [] # Session days in order
+        self._index = {} # day -> index of its session, or of the next session for non trading days
+        self._trading = set()
+        day = self.first
+        while day <= self.last:
+            if self._is_session(day):
+                self._trading.add(day)
+                self._sessions.append(day)
+            self._index[day] = len(self._sessions) - 1 if day in self._trading else len(self._sessions)
+            day += timedelta(days=1)
+
+    def _is_session(self, day):
+        if day in self.special:
+            return True
+        return day.weekday() < 5 and day not in self.holidays
+
+    def _covered(self, day):
+        if self.first <= day <= self.last:
+            return True
+        if day.year not in self._warned:
+            self._warned.add(day.year)
+            self.logger.warning(f"_covered(): {day.year} is not in nse_calendar.json, treating weekdays as sessions")
+        return False
+
+    def is_trading_day(self, day=None):
+        day = day or date.today()
+        if self._covered(day):
+            return day in self._trading
+        return self._is_session(day)
+
+    def prev_trading_day(self, day=None):
+        """Last session before day (default today)"""
+        day = day or date.today()
+        if self._covered(day):
+            i = self._index[day] - 1
+            if i >= 0:
+                return self._sessions[i]
+        day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def next_trading_day(self, day=None):
+        """First session after day (default today)"""
+        day = day or date.today()
+        if self._covered(day):
+            i = self._index[day] + (1 if day in self._trading else 0)
+            if i < len(self._sessions):
+                return self._sessions[i]
+        day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def trading_days(self, start, end):
+        """Sessions from start to end, both included"""
+        if self._covered(start) and self._covered(end):
+            return self._sessions[self._index[start]:self._index[end] + (1 if end in self._trading else 0)]
+        days = []
+        day = start
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def session_open(self, day=None):
+        """datetime of day's open, usual hours unless it's a special session"""
+        day = day or date.today()
+        return datetime.combine(day, self.special.get(day, (self.open, self.close))[0])
+
+    def session_close(self, day=None):
+        day = day or date.today()
+        return datetime.combine(day, self.special.get(day, (self.open, self.close))[1])
+
+
+trading_calendar = LibertyCalendar()
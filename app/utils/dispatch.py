@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from app.utils.logging import get_logger
+from app.utils.metrics import metrics
+
+class LibertyDispatcher:
+    """
+        Hands work from other threads (socket callbacks) over to the event loop.
+        dispatch() is thread safe and never blocks the caller: the job goes on the loop's own
+        thread-safe call queue and its coroutine is started as a task on the next loop iteration.
+        The delay between dispatch and start goes to metrics as dispatch.<name>.delay_ms.
+    """
+    def __init__(self):
+        self.logger = get_logger("Dispatcher")
+        self._loop = None
+        self._tasks = set() # Keep running jobs referenced
+
+    def bind(self):
+        """Run jobs on the current loop, call from the event loop"""
+        self._loop = asyncio.get_running_loop()
+
+    def dispatch(self, name, func, *args):
+        """Run func(*args) (a coroutine function) on the loop. False if there's no loop to run it on."""
+        try:
+            self._loop.call_soon_threadsafe(self._start, name, time.monotonic(), func, args)
+            return True
+        except Exception as e: # Not bound / loop closed
+            metrics.incr(f"dispatch.{name}.dropped")
+            self.logger.error(f"dispatch(): Couldn't hand {name} to the event loop: {e}")
+            return False
+
+    def _start(self, name, queued_at, func, args):
+        """Runs on the loop"""
+        metrics.observe(f"dispatch.{name}.delay_ms", (time.monotonic() - queued_at) * 1000)
+        task = self._loop.create_task(func(*args))
+        self._tasks.add(task)
+        task.add_done_callback(lambda task: self._finished(name, task))
+
+    def _finished(self, name, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"_finished(): {name} failed: {task.exception()}")
+
+
+dispatcher = LibertyDispatcher()
@@ -0,0 +1,84 @@
+import json
+import time
+from datetime import datetime
+
+from app.utils.logging import get_logger
+from app.utils.metrics import metrics
+from app.db.write_behind import write_behind
+
+# Stages of a trade, in the order they happen
+STAGES = ("tick", "decision", "wakeup", "build", "submit", "ack", "fill", "sl_armed")
+
+class TradeTimeline:
+    """time.monotonic() of each stage of one trade, the first mark of a stage wins"""
+    def __init__(self, tracker, strategy):
+        self._tracker = tracker
+        self.strategy = strategy
+        self.started_at = datetime.now()
+        self.symbol = None
+        self.order_id = None
+        self.stamps = {}
+        self.closed = False
+
+    def mark(self, stage, at=None):
+        if stage not in self.stamps:
+            self.stamps[stage] = time.monotonic() if at is None else at
+        if stage == STAGES[-1]:
+            self.close()
+
+    def elapsed(self):
+        """{stage: ms since the tick (or the first stage we have)} in stage order"""
+        stamps = [(stage, self.stamps[stage]) for stage in STAGES if stage in self.stamps]
+        if not stamps:
+            return {}
+        start = stamps[0][1]
+        return {stage: round((at - start) * 1000, 3) for stage, at in stamps}
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._tracker._record(self)
+
+class LibertyTradeLatency:
+    """
+        Breaking tick to SL armed, per trade.
+        The market feed stamps every tick with received_at on the socket thread, the breakout watcher
+        starts a timeline from it, and the strategy / execution engine / SL monitor mark their stages.
+        A trade is recorded once the SL is armed (or at close_all() at the end of the run): ms since
+        the tick per stage goes to metrics as latency.<strategy>.<stage> (percentiles in log_summary),
+        and the trade's row is written behind to nifty.trade_latency (app/sql/trade_latency.sql).
+    """
+    def __init__(self):
+        self.logger = get_logger("TradeLatency")
+        self._open = []
+
+    def begin(self, strategy, tick_at=None):
+        timeline = TradeTimeline(self, strategy)
+        if tick_at is not None:
+            timeline.mark("tick", tick_at)
+        self._open.append(timeline)
+        return timeline
+
+    def _record(self, timeline):
+        if timeline in self._open:
+            self._open.remove(timeline)
+        elapsed = timeline.elapsed()
+        for stage, ms in elapsed.items():
+            metrics.observe(f"latency.{timeline.strategy}.{stage}", ms)
+        self.logger.info(f"{timeline.strategy} {timeline.symbol} {timeline.order_id}: " + " ".join(f"{stage}=+{ms}ms" for stage, ms in elapsed.items()))
+        write_behind.submit(
+            ("trade_latency", timeline.strategy, timeline.started_at),
+            '''
+            INSERT INTO nifty.trade_latency (date, strategy, started_at, symbol, order_id, stages)
+            VALUES (CURRENT_DATE, $1, $2, $3, $4, $5::jsonb)
+            ''',
+            timeline.strategy, timeline.started_at, timeline.symbol, timeline.order_id, json.dumps(elapsed)
+        )
+
+    def close_all(self):
+        """Record trades that never got to the SL, call at the end of the run"""
+        for timeline in list(self._open):
+            timeline.close()
+
+
+trade_latency = LibertyTradeLatency()
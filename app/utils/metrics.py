@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+
+from app.utils.logging import get_logger
+
+class LibertyMetrics:
+    """
+        Process wide in-memory counters and samples.
+        incr() for counts, observe() for values we want percentiles of (last max_samples kept).
+        Nothing is exported, log_summary() writes everything to the log at the end of a run.
+    """
+    def __init__(self, max_samples=10000):
+        self.logger = get_logger("Metrics")
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._samples = {}
+        self.max_samples = max_samples
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+            samples.append(value)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentiles(self, name, pcts=(50, 90, 99)):
+        """{pct: value} over the kept samples of name (nearest rank), empty if none"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return {}
+        return {p: samples[min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))] for p in pcts}
+
+    def summary(self, name):
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+        if not samples:
+            return None
+        summary = {"count": len(samples), "mean": sum(samples) / len(samples), "max": max(samples)}
+        summary.update({f"p{p}": v for p, v in self.percentiles(name).items()})
+        return summary
+
+    def log_summary(self):
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._samples)
+        for name, value in sorted(counters.items()):
+            self.logger.info(f"log_summary(): {name} = {value}")
+        for name in sorted(names):
+            summary = self.summary(name)
+            self.logger.info(f"log_summary(): {name} " + " ".join(f"{k}={round(v, 3)}" for k, v in summary.items()))
+
+
+metrics = LibertyMetrics()
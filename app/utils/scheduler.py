@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import itertools
+from datetime import date, datetime, time as dtime, timedelta
+
+from app.utils.logging import get_logger
+from app.utils.calendar import trading_calendar
+from app.utils.metrics import metrics
+
+class LibertyScheduler:
+    """
+        Process wide timer service, everything that waits for a time of day or a fixed delay registers here.
+        Timers sit in one heap on the loop's monotonic clock with a single call_at armed for the earliest,
+        so waking up doesn't depend on sleep() chains or naive wall clock arithmetic.
+        Wall clock targets (at(), every()) are converted once to a monotonic deadline and re-checked
+        against the wall clock at least every resync seconds, in case NTP steps the clock.
+        How late each timer woke is observed as scheduler.jitter_ms.<label> (see jitter(), log_summary()).
+    """
+    def __init__(self):
+        self.logger = get_logger("Scheduler")
+        self._loop = None
+        self._heap = [] # (monotonic deadline, seq, future, label, wall clock target or None)
+        self._seq = itertools.count()
+        self._handle = None
+        self._armed_for = None
+        self.resync = 60 # Longest a wall clock timer goes without looking at the wall clock
+        self.tolerance = 0.001 # Seconds early a timer may fire (loop clock resolution)
+
+    def _attach(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._heap = []
+            self._handle = None
+            self._armed_for = None
+
+    def _push(self, deadline, label, target=None):
+        waiter = self._loop.create_future()
+        heapq.heappush(self._heap, (deadline, next(self._seq), waiter, label, target))
+        self._arm()
+        return waiter
+
+    def _arm(self):
+        """Point the loop timer at the earliest live deadline"""
+        while self._heap and self._heap[0][2].done():
+            heapq.heappop(self._heap) # Cancelled waiters
+        if not self._heap:
+            if self._handle is not None:
+                self._handle.cancel()
+            self._handle = None
+            self._armed_for = None
+            return
+        deadline = self._heap[0][0]
+        if self._handle is not None and self._armed_for == deadline:
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed_for = deadline
+        self._handle = self._loop.call_at(deadline, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        self._armed_for = None
+        now = self._loop.time()
+        while self._heap and self._heap[0][0] <= now + self.tolerance:
+            deadline, _, waiter, label, target = heapq.heappop(self._heap)
+            if waiter.done():
+                continue
+            if target is not None:
+                left = (target - datetime.now()).total_seconds()
+                if left > self.tolerance:
+                    # Not there yet on the wall clock (long wait or the clock was stepped)
+                    heapq.heappush(self._heap, (now + min(left, self.resync), next(self._seq), waiter, label, target))
+                    continue
+            late = now - deadline
+            metrics.observe(f"scheduler.jitter_ms.{label}", late * 1000)
+            waiter.set_result(late)
+        self._arm()
+
+    async def sleep(self, seconds, label="sleep"):
+        """Sleep seconds on the monotonic clock, returns how late we woke in seconds"""
+        self._attach()
+        return await self._push(self._loop.time() + max(seconds, 0), label)
+
+    async def at(self, when, label="at"):
+        """Sleep until when (a datetime, or a time today), returns how late we woke in seconds (0 if it's already past)"""
+        self._attach()
+        if isinstance(when, dtime):
+            when = datetime.combine(date.today(), when)
+        left = (when - datetime.now()).total_seconds()
+        if left <= 0:
+            return 0.0
+        return await self._push(self._loop.time() + min(left, self.resync), label, when)
+
+    def next_boundary(self, minutes, after=None):
+        """First minutes-minute mark of the session (aligned to its open) after after (default now), the open itself before it"""
+        after = after or datetime.now()
+        start = trading_calendar.session_open(after.date())
+        if after < start:
+            return start
+        step = minutes * 60
+        return start + timedelta(seconds=(int((after - start).total_seconds() // step) + 1) * step)
+
+    async def wait_next(self, minutes, label="boundary"):
+        """Sleep until the next minutes-minute mark of the session, returns the mark"""
+        boundary = self.next_boundary(minutes)
+        await self.at(boundary, label)
+        return boundary
+
+    async def every(self, minutes, label="every", until=None):
+        """Async iterator over the session's minutes-minute marks from the next one on, stops after until (a datetime or time today)"""
+        if isinstance(until, dtime):
+            until = datetime.combine(date.today(), until)
+        last = None
+        while True:
+            now = datetime.now()
+            boundary = self.next_boundary(minutes, now if last is None else max(now, last))
+            if until is not None and boundary > until:
+                return
+            await self.at(boundary, label)
+            last = boundary
+            yield boundary
+
+    def seconds_until(self, when):
+        """Seconds from now to when (a datetime, or a time today), 0 if it's past. For asyncio.wait_for timeouts."""
+        if isinstance(when, dtime):
+            when = datetime.combine(date.today(), when)
+        return max((when - datetime.now()).total_seconds(), 0)
+
+    def jitter(self, label):
+        """count / mean / max / percentiles of label's wake-up lateness in ms, None if it never fired"""
+        return metrics.summary(f"scheduler.jitter_ms.{label}")
+
+    def pending(self):
+        """Labels of the timers waiting, soonest first"""
+        return [entry[3] for entry in sorted(self._heap) if not entry[2].done()]
+
+
+scheduler = LibertyScheduler()
@@ -0,0 +1,42 @@
+import asyncio
+
+from app.utils.logging import get_logger
+from app.utils.metrics import metrics
+
+class LibertySingleFlight:
+    """
+        Coalesces concurrent identical async calls.
+        The first caller for a key starts the call, anyone asking for the same key while it's
+        in flight awaits that same call and gets the same result (or exception).
+        Once it lands the key is forgotten, the next caller starts a fresh call.
+        Keys are tuples, key[0] names the call for metrics:
+        - singleflight.<name>.fan_in: callers served per call
+        - singleflight.<name>.saved: calls that didn't have to be made
+        Results are shared, so only coalesce calls returning values nobody mutates.
+    """
+    def __init__(self):
+        self.logger = get_logger("SingleFlight")
+        self._flights = {} # key -> {"task": asyncio.Task, "callers": int}
+
+    async def do(self, key, func, *args, **kwargs):
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            flight = self._flights[key] = {"task": task, "callers": 1}
+            task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            flight["callers"] += 1
+        # Shielded so one caller being cancelled doesn't cancel the call for the others
+        return await asyncio.shield(flight["task"])
+
+    def _land(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        name = key[0]
+        metrics.observe(f"singleflight.{name}.fan_in", flight["callers"])
+        if flight["callers"] > 1:
+            metrics.incr(f"singleflight.{name}.saved", flight["callers"] - 1)
+            self.logger.info(f"_land(): {key} served {flight['callers']} callers with one call")
+
+
+singleflight = LibertySingleFlight()